@@ -1,15 +1,19 @@
-
 from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_from_directory
-import os
-import json
 import time
 from werkzeug.utils import secure_filename
 from config import Config
-from modules.api_client import DeepSeekClient
-from modules.content_processor import ContentProcessor
-from modules.generators import MindMapGenerator, NoteGenerator, QuizGenerator
-from modules.security import SecurityManager
-from modules.file_handler import FileHandler
+from modules.api_client import DeepSeekClient, SYSTEM_PROMPT
+from modules.result_cache import ResultCache
+from modules.stream_session import StreamSession, format_sse
+from modules.coalescer import StreamCoalescer
+from modules.map_reduce import MapReduceRunner
+from modules.chunked_upload import UploadError
+from services import (
+    content_processor, security_manager, file_handler, chunked_uploads, extraction_jobs, mindmap_generator,
+    result_cache, render_queue, storage_janitor, start_background_tasks, select_task, content_budget,
+    prepare_mindmap_outline, build_chunk_prompts, lookup_cache, extract_uploaded, submit_extraction,
+    extraction_event
+)
 import logging
 
 # 配置日志
@@ -21,16 +25,10 @@ app.config.from_object(Config)
 
 # 初始化模块
 api_client = DeepSeekClient(Config.API_KEY, Config.API_BASE_URL)
-content_processor = ContentProcessor()
-security_manager = SecurityManager()
-file_handler = FileHandler(Config.UPLOAD_FOLDER)
-mindmap_generator = MindMapGenerator()
-note_generator = NoteGenerator()
-quiz_generator = QuizGenerator()
-
-# 确保上传文件夹存在
-os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(Config.OUTPUT_FOLDER, exist_ok=True)
+# 长文档分块并发生成
+map_reduce = MapReduceRunner(api_client, content_processor.budget) if Config.LONG_DOC_ENABLED else None
+# 相同内容的并发生成请求共享一次上游调用
+coalescer = StreamCoalescer() if Config.COALESCE_ENABLED else None
 
 @app.route('/')
 def index():
@@ -56,19 +54,104 @@ def upload_file():
         # 保存文件
         file_path = file_handler.save_file(file)
         
-        # 提取文件内容
-        content = file_handler.extract_content(file_path)
+        # 提取文件内容（异步模式下立即返回任务ID）
+        budgeted = request.form.get('budget', str(Config.UPLOAD_BUDGETED_TEXT)).lower() == 'true'
+        if request.form.get('async', str(Config.UPLOAD_ASYNC_EXTRACTION)).lower() == 'true':
+            body, status_code = submit_extraction(file_path, file.filename, budgeted)
+            return jsonify(body), status_code
+        content = extract_uploaded(file_path, budgeted)
         
         return jsonify({
             'success': True,
             'content': content,
-            'filename': file.filename
+            'filename': file.filename,
+            'budgeted': budgeted
         })
     
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         logger.error(f"文件上传错误: {str(e)}")
         return jsonify({'error': f'文件处理失败: {str(e)}'}), 500
 
+@app.route('/upload/sessions', methods=['POST'])
+def create_upload():
+    """创建分片上传会话（大文件按 chunk_size 分片上传，可断点续传）"""
+    data = request.json or {}
+    try:
+        return jsonify(chunked_uploads.create(data.get('filename', ''), int(data.get('size', 0))))
+    except (TypeError, ValueError):
+        return jsonify({'error': '文件大小无效'}), 400
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@app.route('/upload/sessions/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """查询已接收的字节数（续传时从该偏移量继续）"""
+    status = chunked_uploads.get(upload_id)
+    if status is None:
+        return jsonify({'error': '上传会话不存在或已过期'}), 404
+    return jsonify(status)
+
+@app.route('/upload/sessions/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """接收一个分片（请求体为原始字节，Upload-Offset 头给出分片起始位置），最后一片完成后提取内容"""
+    try:
+        offset = int(request.headers.get('Upload-Offset', '0'))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset 无效'}), 400
+    
+    try:
+        status = chunked_uploads.write(upload_id, offset, request.stream)
+        if not status['complete']:
+            return jsonify(status)
+        
+        budgeted = request.args.get('budget', str(Config.UPLOAD_BUDGETED_TEXT)).lower() == 'true'
+        if request.args.get('async', str(Config.UPLOAD_ASYNC_EXTRACTION)).lower() == 'true':
+            body, status_code = submit_extraction(chunked_uploads.file_path(upload_id), status['filename'], budgeted)
+            status.update(body)
+            return jsonify(status), status_code
+        status.update({
+            'success': True,
+            'content': extract_uploaded(chunked_uploads.file_path(upload_id), budgeted),
+            'budgeted': budgeted
+        })
+        return jsonify(status)
+    
+    except UploadError as e:
+        status = chunked_uploads.get(upload_id) or {}
+        return jsonify(dict(status, error=str(e))), e.status_code
+    except Exception as e:
+        logger.error(f"分片上传错误: {str(e)}")
+        return jsonify({'error': f'文件处理失败: {str(e)}'}), 500
+
+@app.route('/extract/<job_id>')
+def extraction_status(job_id):
+    """查询提取任务状态（完成后包含提取的文本）"""
+    job = extraction_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
+
+@app.route('/extract/<job_id>/events')
+def extraction_events(job_id):
+    """以SSE推送提取进度，任务结束时推送提取的文本"""
+    if extraction_jobs.get(job_id) is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    def generate():
+        for job in extraction_jobs.follow(job_id):
+            yield format_sse(extraction_event(job))
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @app.route('/process', methods=['POST'])
 def process_content():
     """处理内容并生成结果"""
@@ -79,53 +162,92 @@ def process_content():
         difficulty = data.get('difficulty', 'medium')  # easy, medium, hard, mixed
         
         # 安全检查
-        if not security_manager.validate_input(content):
-            return jsonify({'error': '输入内容包含不允许的内容'}), 400
+        rejected = security_manager.check_input(content)
+        if rejected is not None:
+            message, status_code = rejected
+            return jsonify({'error': message}), status_code
+        
+        # 预处理内容（长文档切分为多块，否则超出token预算的部分被截断）
+        limit = content_budget(task_type, difficulty)
+        # 思维导图：文档自带大纲时作为骨架，大纲覆盖全部内容时不调用模型；
+        # 骨架加正文超出预算时改走长文档分块
+        outline_plan = prepare_mindmap_outline(content, limit, allow_trim=map_reduce is None) \
+            if task_type == 'mindmap' and Config.MINDMAP_OUTLINE_ENABLED else None
+        chunks = []
+        trimmed = False
+        if outline_plan is not None:
+            processed_content, outline_prompt, trimmed = outline_plan
+        else:
+            chunks = content_processor.split_chunks(content, limit) if map_reduce is not None else []
+            if len(chunks) > 1:
+                processed_content = '\n\n'.join(chunks)
+            else:
+                chunks = []
+                processed_content, trimmed = content_processor.prepare(content, limit)
+        
+        cache_key, cached_events = lookup_cache(processed_content, task_type, difficulty)
         
-        # 预处理内容
-        processed_content = content_processor.preprocess(content)
+        def replay():
+            """回放缓存的事件序列"""
+            logger.info("命中结果缓存，回放事件")
+            for event in cached_events:
+                yield format_sse(event)
+        
+        def generate_chunked(session, prompts, processor):
+            """长文档：各分块并发生成，报告进度，全部完成后合并输出"""
+            results = [None] * len(prompts)
+            yield format_sse({'type': 'progress', 'done': 0, 'total': len(prompts)})
+            for done, (index, result) in enumerate(map_reduce.run(prompts), 1):
+                results[index] = result
+                yield format_sse({'type': 'progress', 'done': done, 'total': len(prompts)})
+            yield from session.feed(processor.merge_results(results))
         
         def generate():
             """生成流式响应"""
             try:
                 # 根据任务类型构建提示词
-                if task_type == 'mindmap':
-                    prompt = mindmap_generator.build_prompt(processed_content)
-                    processor = mindmap_generator
-                elif task_type == 'quiz':
-                    prompt = quiz_generator.build_prompt(processed_content, difficulty)
-                    processor = quiz_generator
-                else:  # notes
-                    prompt = note_generator.build_prompt(processed_content)
-                    processor = note_generator
-                
-                # 存储完整响应（用于思维导图）
-                full_response = ""
+                if outline_plan is not None:
+                    prompt, processor = outline_prompt, mindmap_generator
+                    prompts = [prompt] if prompt else []
+                elif chunks:
+                    prompts, processor = build_chunk_prompts(task_type, chunks, difficulty)
+                else:
+                    prompt, processor = select_task(task_type, processed_content, difficulty)
+                    prompts = [prompt]
+                budget = content_processor.budget
+                if prompts:
+                    yield format_sse(budget.usage_event(prompts, SYSTEM_PROMPT, budget.count(processed_content), trimmed))
+                output_filter = security_manager.create_stream_filter() if Config.OUTPUT_FILTER_ENABLED else None
+                session = StreamSession(task_type, processor, result_cache, cache_key, render_queue, output_filter)
                 
-                # 获取流式响应
-                for chunk in api_client.stream_completion(prompt):
-                    if chunk:
-                        full_response += chunk
-                        yield f"data: {json.dumps({'content': chunk})}\n\n"
+                if not prompts:
+                    # 文档大纲即为思维导图，直接输出骨架
+                    logger.info("文档大纲已覆盖全部内容，本地生成思维导图")
+                    yield from session.feed(processed_content)
+                elif chunks:
+                    yield from generate_chunked(session, prompts, processor)
+                else:
+                    # 获取流式响应
+                    max_tokens = budget.completion_budget(prompt, SYSTEM_PROMPT)
+                    for chunk in api_client.stream_completion(prompt, max_tokens=max_tokens):
+                        yield from session.feed(chunk)
                 
                 # 生成最终结果
-                if task_type == 'mindmap':
-                    # 生成思维导图图片
-                    logger.info("开始生成思维导图图片")
-                    image_path = processor.generate_mindmap_image(full_response)
-                    if image_path:
-                        yield f"data: {json.dumps({'type': 'mindmap_complete', 'image_url': image_path})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type': 'mindmap_error', 'message': '思维导图生成失败'})}\n\n"
-                
-                yield f"data: {json.dumps({'type': 'complete'})}\n\n"
+                yield from session.finish()
                 
             except Exception as e:
-                logger.error(f"生成过程错误: {str(e)}")
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                yield StreamSession.error(e)
+        
+        if cached_events is not None:
+            stream = replay()
+        elif coalescer is not None:
+            flight_key = cache_key or ResultCache.make_key(processed_content, task_type, difficulty, Config.MODEL_NAME)
+            stream = coalescer.subscribe(flight_key, generate)
+        else:
+            stream = generate()
         
         return Response(
-            stream_with_context(generate()),
+            stream_with_context(stream),
             mimetype='text/event-stream',
             headers={
                 'Cache-Control': 'no-cache',
@@ -137,12 +259,38 @@ def process_content():
         logger.error(f"处理请求错误: {str(e)}")
         return jsonify({'error': f'处理失败: {str(e)}'}), 500
 
+@app.route('/mindmap/<job_id>')
+def mindmap_status(job_id):
+    """查询思维导图渲染任务状态"""
+    if render_queue is None:
+        return jsonify({'error': '未启用渲染队列'}), 404
+    job = render_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
+
 @app.route('/health')
 def health_check():
     """健康检查"""
     return jsonify({'status': 'healthy', 'timestamp': time.time()})
 
+@app.route('/stats')
+def stats():
+    """运行统计"""
+    return jsonify({
+        'result_cache': result_cache.stats() if result_cache is not None else None,
+        'mindmap_render': render_queue.stats() if render_queue is not None else None,
+        'api_transport': api_client.stats(),
+        'coalescer': coalescer.stats() if coalescer is not None else None,
+        'storage': storage_janitor.stats() if storage_janitor is not None else None,
+        'ocr': file_handler.ocr_stats(),
+        'chunked_uploads': chunked_uploads.stats(),
+        'extraction_jobs': extraction_jobs.stats()
+    })
+
 if __name__ == '__main__':
+    # 后台任务只在服务入口启动，导入模块（如测试）时不启动
+    start_background_tasks()
     # 从环境变量读取调试模式
     debug_mode = Config.DEBUG
     app.run(debug=debug_mode, host='0.0.0.0', port=5000)
\ No newline at end of file
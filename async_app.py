@@ -0,0 +1,390 @@
+import os
+import io
+import time
+import asyncio
+import logging
+from aiohttp import web
+from config import Config
+from modules.async_api_client import AsyncDeepSeekClient
+from modules.api_client import SYSTEM_PROMPT
+from modules.stream_session import StreamSession, format_sse
+from modules.chunked_upload import UploadError
+from concurrent.futures import ThreadPoolExecutor
+from services import (
+    content_processor, security_manager, file_handler, result_cache, render_queue,
+    select_task, lookup_cache, content_budget, storage_janitor, start_background_tasks, chunked_uploads,
+    extract_uploaded, extraction_jobs, submit_extraction, extraction_event, mindmap_generator,
+    prepare_mindmap_outline, build_chunk_prompts
+)
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+async_api_client = AsyncDeepSeekClient(Config.API_KEY, Config.API_BASE_URL)
+# 生成收尾（等待思维导图渲染最多 MINDMAP_RENDER_WAIT 秒）使用独立的线程池，不占用默认线程池
+finish_executor = ThreadPoolExecutor(max_workers=Config.ASYNC_FINISH_WORKERS, thread_name_prefix='finish')
+# 长文档分块：所有请求共享，限制同时发往API的分块请求数
+map_reduce_slots = asyncio.Semaphore(Config.MAP_REDUCE_WORKERS)
+
+
+class _UploadedFile:
+    """适配 FileHandler.save_file 所需的文件对象接口"""
+
+    def __init__(self, filename: str, data: bytes):
+        self.filename = filename
+        self.stream = io.BytesIO(data)
+
+
+async def index(request):
+    """主页"""
+    return web.FileResponse(os.path.join(BASE_DIR, 'templates', 'index.html'))
+
+
+async def serve_output(request):
+    """提供输出文件（如思维导图图片）"""
+    filename = os.path.basename(request.match_info['filename'])
+    file_path = os.path.join(Config.OUTPUT_FOLDER, filename)
+    if not os.path.isfile(file_path):
+        raise web.HTTPNotFound()
+    return web.FileResponse(file_path)
+
+
+async def upload_file(request):
+    """处理文件上传（解析在线程池中执行，不阻塞事件循环）"""
+    try:
+        form = await request.post()
+        file = form.get('file')
+        if file is None or not hasattr(file, 'file'):
+            return web.json_response({'error': '没有上传文件'}, status=400)
+        if not file.filename:
+            return web.json_response({'error': '未选择文件'}, status=400)
+
+        uploaded = _UploadedFile(file.filename, file.file.read())
+        loop = asyncio.get_running_loop()
+        file_path = await loop.run_in_executor(None, file_handler.save_file, uploaded)
+        budgeted = str(form.get('budget', Config.UPLOAD_BUDGETED_TEXT)).lower() == 'true'
+        if str(form.get('async', Config.UPLOAD_ASYNC_EXTRACTION)).lower() == 'true':
+            body, status_code = submit_extraction(file_path, file.filename, budgeted)
+            return web.json_response(body, status=status_code)
+        content = await loop.run_in_executor(None, extract_uploaded, file_path, budgeted)
+
+        return web.json_response({
+            'success': True,
+            'content': content,
+            'filename': file.filename,
+            'budgeted': budgeted
+        })
+
+    except UploadError as e:
+        return web.json_response({'error': str(e)}, status=e.status_code)
+    except Exception as e:
+        logger.error(f"文件上传错误: {str(e)}")
+        return web.json_response({'error': f'文件处理失败: {str(e)}'}, status=500)
+
+
+async def create_upload(request):
+    """创建分片上传会话"""
+    data = await request.json()
+    try:
+        return web.json_response(chunked_uploads.create(data.get('filename', ''), int(data.get('size', 0))))
+    except (TypeError, ValueError):
+        return web.json_response({'error': '文件大小无效'}, status=400)
+    except UploadError as e:
+        return web.json_response({'error': str(e)}, status=e.status_code)
+
+
+async def upload_status(request):
+    """查询已接收的字节数（续传时从该偏移量继续）"""
+    status = chunked_uploads.get(request.match_info['upload_id'])
+    if status is None:
+        return web.json_response({'error': '上传会话不存在或已过期'}, status=404)
+    return web.json_response(status)
+
+
+async def upload_chunk(request):
+    """接收一个分片（写入和内容提取在线程池中执行）"""
+    upload_id = request.match_info['upload_id']
+    try:
+        offset = int(request.headers.get('Upload-Offset', '0'))
+    except ValueError:
+        return web.json_response({'error': 'Upload-Offset 无效'}, status=400)
+
+    try:
+        body = await request.read()
+        loop = asyncio.get_running_loop()
+        status = await loop.run_in_executor(None, chunked_uploads.write, upload_id, offset, io.BytesIO(body))
+        if not status['complete']:
+            return web.json_response(status)
+
+        budgeted = request.query.get('budget', str(Config.UPLOAD_BUDGETED_TEXT)).lower() == 'true'
+        if request.query.get('async', str(Config.UPLOAD_ASYNC_EXTRACTION)).lower() == 'true':
+            body, status_code = submit_extraction(chunked_uploads.file_path(upload_id), status['filename'], budgeted)
+            status.update(body)
+            return web.json_response(status, status=status_code)
+        content = await loop.run_in_executor(None, extract_uploaded, chunked_uploads.file_path(upload_id), budgeted)
+        status.update({'success': True, 'content': content, 'budgeted': budgeted})
+        return web.json_response(status)
+
+    except UploadError as e:
+        status = chunked_uploads.get(upload_id) or {}
+        return web.json_response(dict(status, error=str(e)), status=e.status_code)
+    except Exception as e:
+        logger.error(f"分片上传错误: {str(e)}")
+        return web.json_response({'error': f'文件处理失败: {str(e)}'}, status=500)
+
+
+async def extraction_status(request):
+    """查询提取任务状态（完成后包含提取的文本）"""
+    job = extraction_jobs.get(request.match_info['job_id'])
+    if job is None:
+        return web.json_response({'error': '任务不存在'}, status=404)
+    return web.json_response(job)
+
+
+async def extraction_events(request):
+    """以SSE推送提取进度（提取线程通过 call_soon_threadsafe 唤醒，不占用线程池）"""
+    job_id = request.match_info['job_id']
+    if extraction_jobs.get(job_id) is None:
+        return web.json_response({'error': '任务不存在'}, status=404)
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    unsubscribe = extraction_jobs.subscribe(job_id, lambda: loop.call_soon_threadsafe(changed.set))
+    last = None
+    heartbeat = True
+    try:
+        while True:
+            changed.clear()
+            job = extraction_jobs.get(job_id)
+            if job is None:
+                break
+            # 状态未变化时只在等待超时后重发一次（作心跳）
+            if job != last or heartbeat:
+                await response.write(format_sse(extraction_event(job)).encode('utf-8'))
+                last = job
+            if job['status'] in ('done', 'failed'):
+                break
+            try:
+                await asyncio.wait_for(changed.wait(), 15)
+                heartbeat = False
+            except asyncio.TimeoutError:
+                heartbeat = True
+    except ConnectionResetError:
+        logger.info("客户端已断开连接")
+    finally:
+        unsubscribe()
+    return response
+
+
+class _InputRejected(Exception):
+    """输入未通过安全检查"""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+def _prepare_request(content, task_type, difficulty):
+    """安全检查、预处理内容并查询缓存（阻塞，在线程池中执行）
+
+    返回 (大纲方案, 长文档分块, 预处理后的内容, 提示词, 是否截断, cache_key, cached_events)，
+    输入不允许时抛出 _InputRejected。
+    """
+    rejected = security_manager.check_input(content)
+    if rejected is not None:
+        raise _InputRejected(*rejected)
+    # 预处理内容（长文档切分为多块，否则超出token预算的部分被截断）
+    limit = content_budget(task_type, difficulty)
+    # 思维导图：文档自带大纲时作为骨架，大纲覆盖全部内容时不调用模型；
+    # 骨架加正文超出预算时改走长文档分块
+    outline_plan = prepare_mindmap_outline(content, limit, allow_trim=not Config.LONG_DOC_ENABLED) \
+        if task_type == 'mindmap' and Config.MINDMAP_OUTLINE_ENABLED else None
+    chunks = []
+    prompt = None
+    trimmed = False
+    if outline_plan is not None:
+        processed_content, prompt, trimmed = outline_plan
+    else:
+        chunks = content_processor.split_chunks(content, limit) if Config.LONG_DOC_ENABLED else []
+        if len(chunks) > 1:
+            processed_content = '\n\n'.join(chunks)
+        else:
+            chunks = []
+            processed_content, trimmed = content_processor.prepare(content, limit)
+    cache_key, cached_events = lookup_cache(processed_content, task_type, difficulty)
+    return outline_plan, chunks, processed_content, prompt, trimmed, cache_key, cached_events
+
+
+async def _complete_chunk(index, prompt):
+    """流式生成长文档的一个分块并收集结果，返回 (分块序号, 结果)"""
+    async with map_reduce_slots:
+        max_tokens = content_processor.budget.completion_budget(prompt, SYSTEM_PROMPT)
+        parts = []
+        async for chunk in async_api_client.stream_completion(prompt, max_tokens=max_tokens):
+            parts.append(chunk)
+        return index, ''.join(parts)
+
+
+async def _generate_chunked(prompts, send):
+    """长文档：各分块并发生成并报告进度，返回按原文顺序排列的结果"""
+    results = [None] * len(prompts)
+    tasks = [asyncio.ensure_future(_complete_chunk(index, prompt)) for index, prompt in enumerate(prompts)]
+    try:
+        await send(format_sse({'type': 'progress', 'done': 0, 'total': len(prompts)}))
+        for done, future in enumerate(asyncio.as_completed(tasks), 1):
+            index, result = await future
+            results[index] = result
+            await send(format_sse({'type': 'progress', 'done': done, 'total': len(prompts)}))
+    finally:
+        # 失败或客户端断开时取消其余分块，正在生成的分块关闭连接
+        for task in tasks:
+            task.cancel()
+    return results
+
+
+async def process_content(request):
+    """处理内容并以SSE流式返回结果"""
+    loop = asyncio.get_running_loop()
+    try:
+        data = await request.json()
+        content = data.get('content', '')
+        task_type = data.get('task_type', 'notes')  # notes, mindmap, quiz
+        difficulty = data.get('difficulty', 'medium')  # easy, medium, hard, mixed
+
+        prepared = await loop.run_in_executor(None, _prepare_request, content, task_type, difficulty)
+        outline_plan, chunks, processed_content, prompt, trimmed, cache_key, cached_events = prepared
+    except _InputRejected as e:
+        return web.json_response({'error': str(e)}, status=e.status)
+    except Exception as e:
+        logger.error(f"处理请求错误: {str(e)}")
+        return web.json_response({'error': f'处理失败: {str(e)}'}, status=500)
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+
+    async def send(message: str):
+        await response.write(message.encode('utf-8'))
+
+    if cached_events is not None:
+        logger.info("命中结果缓存，回放事件")
+        for event in cached_events:
+            await send(format_sse(event))
+        return response
+
+    try:
+        if outline_plan is not None:
+            processor = mindmap_generator
+            prompts = [prompt] if prompt else []
+        elif chunks:
+            prompts, processor = build_chunk_prompts(task_type, chunks, difficulty)
+        else:
+            prompt, processor = select_task(task_type, processed_content, difficulty)
+            prompts = [prompt]
+        budget = content_processor.budget
+        output_filter = security_manager.create_stream_filter() if Config.OUTPUT_FILTER_ENABLED else None
+        session = StreamSession(task_type, processor, result_cache, cache_key, render_queue, output_filter)
+
+        if not prompts:
+            # 文档大纲即为思维导图，直接输出骨架
+            logger.info("文档大纲已覆盖全部内容，本地生成思维导图")
+            for message in session.feed(processed_content):
+                await send(message)
+        elif chunks:
+            await send(format_sse(budget.usage_event(prompts, SYSTEM_PROMPT, budget.count(processed_content), trimmed)))
+            results = await _generate_chunked(prompts, send)
+            for message in session.feed(processor.merge_results(results)):
+                await send(message)
+        else:
+            await send(format_sse(budget.usage_event(prompts, SYSTEM_PROMPT, budget.count(processed_content), trimmed)))
+            max_tokens = budget.completion_budget(prompt, SYSTEM_PROMPT)
+            async for chunk in async_api_client.stream_completion(prompt, max_tokens=max_tokens):
+                for message in session.feed(chunk):
+                    await send(message)
+
+        # 思维导图渲染等收尾工作是阻塞的，逐条在收尾线程池中取出消息
+        finish = session.finish()
+        while True:
+            message = await loop.run_in_executor(finish_executor, next, finish, None)
+            if message is None:
+                break
+            await send(message)
+
+    except ConnectionResetError:
+        logger.info("客户端已断开连接")
+    except Exception as e:
+        await send(StreamSession.error(e))
+
+    return response
+
+
+async def mindmap_status(request):
+    """查询思维导图渲染任务状态"""
+    if render_queue is None:
+        return web.json_response({'error': '未启用渲染队列'}, status=404)
+    job = render_queue.get(request.match_info['job_id'])
+    if job is None:
+        return web.json_response({'error': '任务不存在'}, status=404)
+    return web.json_response(job)
+
+
+async def health_check(request):
+    """健康检查"""
+    return web.json_response({'status': 'healthy', 'timestamp': time.time()})
+
+
+async def stats(request):
+    """运行统计"""
+    return web.json_response({
+        'result_cache': result_cache.stats() if result_cache is not None else None,
+        'mindmap_render': render_queue.stats() if render_queue is not None else None,
+        'api_endpoints': async_api_client.stats(),
+        'storage': storage_janitor.stats() if storage_janitor is not None else None,
+        'ocr': file_handler.ocr_stats(),
+        'chunked_uploads': chunked_uploads.stats(),
+        'extraction_jobs': extraction_jobs.stats()
+    })
+
+
+async def _start_background_tasks(app):
+    start_background_tasks()
+
+
+async def _close_client(app):
+    await async_api_client.close()
+    finish_executor.shutdown(wait=False)
+
+
+def create_app() -> web.Application:
+    """创建异步应用"""
+    aio_app = web.Application(client_max_size=Config.MAX_CONTENT_LENGTH)
+    aio_app.router.add_get('/', index)
+    aio_app.router.add_get('/outputs/{filename}', serve_output)
+    aio_app.router.add_post('/upload', upload_file)
+    aio_app.router.add_post('/upload/sessions', create_upload)
+    aio_app.router.add_get('/upload/sessions/{upload_id}', upload_status)
+    aio_app.router.add_put('/upload/sessions/{upload_id}', upload_chunk)
+    aio_app.router.add_get('/extract/{job_id}', extraction_status)
+    aio_app.router.add_get('/extract/{job_id}/events', extraction_events)
+    aio_app.router.add_post('/process', process_content)
+    aio_app.router.add_get('/mindmap/{job_id}', mindmap_status)
+    aio_app.router.add_get('/health', health_check)
+    aio_app.router.add_get('/stats', stats)
+    aio_app.on_startup.append(_start_background_tasks)
+    aio_app.on_cleanup.append(_close_client)
+    return aio_app
+
+
+if __name__ == '__main__':
+    web.run_app(create_app(), host='0.0.0.0', port=Config.ASYNC_PORT)
@@ -0,0 +1,73 @@
+"""指令注入检测基准测试：逐条正则 vs 单遍关键词扫描
+
+构造让 .* 连接的正则大量回溯的最坏输入（反复出现前缀词但缺少结尾词），
+输入长度翻倍时观察两种实现的耗时增长。
+
+用法：python benchmarks/bench_injection.py
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.injection_detector import InjectionDetector
+
+LEGACY_PATTERNS = [
+    r'(?i)(ignore|forget|disregard).*previous.*instructions',
+    r'(?i)you.*are.*now',
+    r'(?i)pretend.*to.*be',
+    r'(?i)act.*as.*if',
+    r'(?i)system.*prompt',
+    r'(?i)reveal.*instructions',
+    r'(?i)<script.*?>.*?</script>',
+    r'(?i)(javascript|eval|exec)\s*\(',
+]
+
+SIZES = [1000, 2000, 4000, 8000, 16000, 50000]
+# 原实现单次超过该时间后不再测试更大的输入
+LEGACY_LIMIT = 1.0
+
+WORST_CASES = {
+    '前缀词反复出现': 'ignore previous ',
+    '代词反复出现': 'you are ',
+    '标签未闭合': '<script> ',
+    '普通英文': 'the quick brown fox jumps over the lazy dog. ',
+}
+
+
+def legacy_detect(content):
+    """原实现：每条规则一次 re.search"""
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, content):
+            return True
+    return False
+
+
+def timed(func, content):
+    start = time.perf_counter()
+    result = func(content)
+    return time.perf_counter() - start, result
+
+
+def run():
+    detector = InjectionDetector()
+    for title, unit in WORST_CASES.items():
+        print(f"\n{title}：{unit!r}")
+        print(f"  {'长度':>8}{'逐条正则(ms)':>16}{'单遍扫描(ms)':>16}")
+        legacy_skipped = False
+        for size in SIZES:
+            content = (unit * (size // len(unit) + 1))[:size]
+            new_seconds, new_result = timed(detector.detect, content)
+            if legacy_skipped:
+                old_text = '跳过'
+            else:
+                old_seconds, _ = timed(legacy_detect, content)
+                old_text = f"{old_seconds * 1000:.2f}"
+                legacy_skipped = old_seconds > LEGACY_LIMIT
+            print(f"  {size:>8}{old_text:>16}{new_seconds * 1000:>16.2f}  命中: {new_result}")
+
+
+if __name__ == '__main__':
+    run()
@@ -11,15 +11,52 @@ class Config:
     API_BASE_URL = os.getenv('API_BASE_URL', 'https://api.siliconflow.cn/v1')
     MODEL_NAME = os.getenv('MODEL_NAME', 'deepseek-ai/DeepSeek-R1')
     
+    # 多端点配置（JSON数组），例如：
+    # [{"base_url": "https://api.siliconflow.cn/v1", "api_key": "sk-...", "model": "deepseek-ai/DeepSeek-R1",
+    #   "weight": 2, "tpm_limit": 100000}]
+    API_ENDPOINTS = os.getenv('API_ENDPOINTS', '')
+    API_LB_STRATEGY = os.getenv('API_LB_STRATEGY', 'least-outstanding')  # least-outstanding 或 ewma
+    
     # 验证API Key是否存在
-    if not API_KEY:
-        raise ValueError("请设置环境变量 DEEPSEEK_API_KEY")
+    if not API_KEY and not API_ENDPOINTS:
+        raise ValueError("请设置环境变量 DEEPSEEK_API_KEY 或 API_ENDPOINTS")
     
     # 文件上传配置
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
     OUTPUT_FOLDER = os.getenv('OUTPUT_FOLDER', 'outputs')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx', 'pptx', 'png', 'jpg', 'jpeg'}
+    # 分片上传（可续传）：每个分片请求的大小、整个文件的上限、未完成会话的保留时间
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(4 * 1024 * 1024)))  # 4MB
+    UPLOAD_MAX_FILE_SIZE = int(os.getenv('UPLOAD_MAX_FILE_SIZE', str(200 * 1024 * 1024)))  # 200MB
+    UPLOAD_SESSION_TTL = float(os.getenv('UPLOAD_SESSION_TTL', '3600'))  # 秒
+    # 异步提取：上传后立即返回任务ID，提取在独立线程池中执行（进度通过 /extract/<job_id>/events 推送）
+    UPLOAD_ASYNC_EXTRACTION = os.getenv('UPLOAD_ASYNC_EXTRACTION', 'False').lower() == 'true'
+    EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '2'))  # 同时进行的提取任务数
+    EXTRACTION_QUEUE_SIZE = int(os.getenv('EXTRACTION_QUEUE_SIZE', '32'))  # 排队任务上限，超出时返回503
+    # 上传/输出目录的后台清理：超过保留时间或目录总大小超出配额时删除最久未使用的文件
+    STORAGE_JANITOR_ENABLED = os.getenv('STORAGE_JANITOR_ENABLED', 'True').lower() == 'true'
+    STORAGE_SWEEP_INTERVAL = float(os.getenv('STORAGE_SWEEP_INTERVAL', '300'))  # 秒
+    STORAGE_MIN_AGE = float(os.getenv('STORAGE_MIN_AGE', '300'))  # 秒，新文件至少保留这么久
+    UPLOAD_MAX_AGE_HOURS = float(os.getenv('UPLOAD_MAX_AGE_HOURS', '24'))
+    UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(1024 * 1024 * 1024)))  # 1GB
+    OUTPUT_MAX_AGE_HOURS = float(os.getenv('OUTPUT_MAX_AGE_HOURS', '24'))
+    OUTPUT_MAX_BYTES = int(os.getenv('OUTPUT_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))  # 2GB
+    # Word/PPT提取表格、组合形状、演讲者备注，并以 # 标题 / - 列表项 标记结构
+    STRUCTURED_EXTRACTION = os.getenv('STRUCTURED_EXTRACTION', 'True').lower() == 'true'
+    EXTRACTION_CACHE_SIZE = int(os.getenv('EXTRACTION_CACHE_SIZE', '128'))  # 缓存的提取结果数量
+    # /upload 是否只返回预处理会保留的文本（达到长度预算即停止解析）
+    UPLOAD_BUDGETED_TEXT = os.getenv('UPLOAD_BUDGETED_TEXT', 'False').lower() == 'true'
+    
+    # PDF并行提取配置
+    PDF_PARALLEL_ENABLED = os.getenv('PDF_PARALLEL_ENABLED', 'True').lower() == 'true'
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '20'))  # 超过该页数才并行
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(os.cpu_count() or 2)))
+    PDF_PAGE_TIMEOUT = float(os.getenv('PDF_PAGE_TIMEOUT', '10'))  # 每页超时（秒）
+    # 扫描版PDF：文本层不足该字符数且含图片的页面改为OCR识别
+    PDF_OCR_ENABLED = os.getenv('PDF_OCR_ENABLED', 'True').lower() == 'true'
+    PDF_OCR_MIN_TEXT = int(os.getenv('PDF_OCR_MIN_TEXT', '20'))
+    OCR_PAGE_CACHE_SIZE = int(os.getenv('OCR_PAGE_CACHE_SIZE', '1024'))  # 缓存的扫描页OCR结果数量
     
     # 安全配置 - 敏感词列表
     SENSITIVE_WORDS = [
@@ -54,22 +91,89 @@ class Config:
         '个人隐私', '身份证号', '银行卡号', '密码', '泄露隐私'
     ]
     
+    # 外部敏感词文件（每行一个词），修改后自动重新加载
+    SENSITIVE_WORDS_FILE = os.getenv('SENSITIVE_WORDS_FILE', '')
+    SENSITIVE_WORDS_RELOAD_INTERVAL = float(os.getenv('SENSITIVE_WORDS_RELOAD_INTERVAL', '10'))  # 秒
+    # 对模型流式输出做敏感词过滤
+    OUTPUT_FILTER_ENABLED = os.getenv('OUTPUT_FILTER_ENABLED', 'True').lower() == 'true'
+    
     # 流式响应配置
-    STREAM_TIMEOUT = int(os.getenv('STREAM_TIMEOUT', '60'))  # 秒
+    STREAM_TIMEOUT = int(os.getenv('STREAM_TIMEOUT', '60'))  # 秒（流式读取间隔）
+    
+    # API连接配置
+    API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', '5'))  # 秒
+    API_READ_TIMEOUT = float(os.getenv('API_READ_TIMEOUT', '30'))  # 秒（非流式请求）
+    API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', '32'))  # 每个主机的连接数
+    API_POOL_BLOCK = os.getenv('API_POOL_BLOCK', 'False').lower() == 'true'  # 连接池满时等待而不是新建连接
+    API_KEEPALIVE_EXPIRY = float(os.getenv('API_KEEPALIVE_EXPIRY', '60'))  # 空闲连接保留时间（秒，HTTP/2）
+    API_HTTP2 = os.getenv('API_HTTP2', 'False').lower() == 'true'  # 需要安装 httpx[http2]
     RETRY_TIMES = int(os.getenv('RETRY_TIMES', '3'))
-    RETRY_DELAY = int(os.getenv('RETRY_DELAY', '1'))  # 秒
+    RETRY_DELAY = float(os.getenv('RETRY_DELAY', '1'))  # 秒（指数退避的初始值）
+    RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '20'))  # 秒（单次等待上限）
+    RETRY_DEADLINE = float(os.getenv('RETRY_DEADLINE', '120'))  # 秒（一次请求含重试的总时限）
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))  # 连续失败多少次后熔断
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))  # 熔断持续时间（秒）
+    STREAM_RESUME_ENABLED = os.getenv('STREAM_RESUME_ENABLED', 'True').lower() == 'true'  # 流中断后续写
+    
+    # 长文档模式：超过长度上限的内容分块并行生成后合并，而不是截断
+    LONG_DOC_ENABLED = os.getenv('LONG_DOC_ENABLED', 'True').lower() == 'true'
+    LONG_DOC_CHUNK_TOKENS = int(os.getenv('LONG_DOC_CHUNK_TOKENS', '3500'))  # 每块token数
+    LONG_DOC_MAX_CHUNKS = int(os.getenv('LONG_DOC_MAX_CHUNKS', '12'))
+    MAP_REDUCE_WORKERS = int(os.getenv('MAP_REDUCE_WORKERS', '4'))  # 同时处理的分块数
+    # 输入内容长度上限（字符）：长文档模式下使用 LONG_DOC_MAX_CHARS，否则使用 MAX_INPUT_CHARS；
+    # LONG_DOC_MAX_CHARS 默认按全部分块的token数（每token约4个字符）估算，超出部分本来也不会被处理
+    MAX_INPUT_CHARS = int(os.getenv('MAX_INPUT_CHARS', '50000'))
+    LONG_DOC_MAX_CHARS = int(os.getenv('LONG_DOC_MAX_CHARS', str(LONG_DOC_CHUNK_TOKENS * LONG_DOC_MAX_CHUNKS * 4)))
+    
+    # 相同内容的并发生成请求合并为一次上游调用
+    COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'True').lower() == 'true'
+    
+    # 异步服务配置（python async_app.py）
+    ASYNC_PORT = int(os.getenv('ASYNC_PORT', '5000'))
+    ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', '200'))  # 到API的最大并发连接数
+    ASYNC_FINISH_WORKERS = int(os.getenv('ASYNC_FINISH_WORKERS', '16'))  # 生成收尾（等待思维导图渲染）的线程数
+    
+    # 结果缓存配置
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+    RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))  # 64MB
+    RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', '86400'))  # 秒
+    RESULT_CACHE_DISK = os.getenv('RESULT_CACHE_DISK', 'False').lower() == 'true'
+    RESULT_CACHE_DB = os.path.join(OUTPUT_FOLDER, 'cache', 'results.sqlite3')
+    RESULT_CACHE_DISK_MAX_BYTES = int(os.getenv('RESULT_CACHE_DISK_MAX_BYTES', str(512 * 1024 * 1024)))  # 512MB，0表示不限
     
     # 生成配置
     MAX_TOKENS = int(os.getenv('MAX_TOKENS', '2000'))
+    # token预算：模型上下文窗口、单次请求内容的token上限，可选的分词器文件（tokenizer.json，需安装 tokenizers）
+    MODEL_CONTEXT_WINDOW = int(os.getenv('MODEL_CONTEXT_WINDOW', '65536'))
+    PROMPT_CONTENT_MAX_TOKENS = int(os.getenv('PROMPT_CONTENT_MAX_TOKENS', '6000'))
+    TOKENIZER_FILE = os.getenv('TOKENIZER_FILE', '')
     TEMPERATURE = float(os.getenv('TEMPERATURE', '0.7'))
     
     # 思维导图配置
     MINDMAP_WIDTH = int(os.getenv('MINDMAP_WIDTH', '1200'))
     MINDMAP_HEIGHT = int(os.getenv('MINDMAP_HEIGHT', '800'))
     MINDMAP_FONT = os.getenv('MINDMAP_FONT', 'SimHei')  # 中文字体
+    MINDMAP_LAYOUT = os.getenv('MINDMAP_LAYOUT', 'top-down').lower()  # top-down、left-right 或 radial
+    MINDMAP_RENDERER = os.getenv('MINDMAP_RENDERER', 'png').lower()  # png（matplotlib）或 svg（轻量）
+    MINDMAP_RENDER_POOL = os.getenv('MINDMAP_RENDER_POOL', 'True').lower() == 'true'  # 在独立进程池中渲染
+    MINDMAP_RENDER_WORKERS = int(os.getenv('MINDMAP_RENDER_WORKERS', '2'))
+    MINDMAP_RENDER_WAIT = float(os.getenv('MINDMAP_RENDER_WAIT', '30'))  # SSE流中等待渲染结果的秒数
+    # 文档自带大纲（标题、列表）时在本地构建思维导图骨架；大纲覆盖了几乎全部文字时不调用模型
+    MINDMAP_OUTLINE_ENABLED = os.getenv('MINDMAP_OUTLINE_ENABLED', 'True').lower() == 'true'
+    MINDMAP_OUTLINE_SKIP_COVERAGE = float(os.getenv('MINDMAP_OUTLINE_SKIP_COVERAGE', '0.85'))
+    MINDMAP_OUTLINE_MIN_NODES = int(os.getenv('MINDMAP_OUTLINE_MIN_NODES', '5'))
+    MINDMAP_OUTLINE_MAX_NODES = int(os.getenv('MINDMAP_OUTLINE_MAX_NODES', '120'))
+    MINDMAP_OUTLINE_MAX_SHARE = float(os.getenv('MINDMAP_OUTLINE_MAX_SHARE', '0.5'))  # 提示词中骨架最多占内容预算的比例
     
     # Tesseract OCR配置
     TESSERACT_CMD = os.getenv('TESSERACT_CMD', r'D:\tessera ocr\tesseract.exe')
+    OCR_LANG = os.getenv('OCR_LANG', 'chi_sim+eng')
+    OCR_BACKEND = os.getenv('OCR_BACKEND', 'auto').lower()  # auto、tesserocr（常驻实例，需安装）或 tesseract（命令行批量）
+    OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(min(4, os.cpu_count() or 1))))
+    OCR_TARGET_DPI = int(os.getenv('OCR_TARGET_DPI', '300'))  # 识别前缩放到的分辨率
+    OCR_BINARIZE = os.getenv('OCR_BINARIZE', 'True').lower() == 'true'
+    OCR_TILE_HEIGHT = int(os.getenv('OCR_TILE_HEIGHT', '2400'))  # 长图切分的条带高度（像素），0表示不切分
+    OCR_TIMEOUT = float(os.getenv('OCR_TIMEOUT', '30'))  # 每个条带的识别超时（秒）
     
     # Flask配置
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
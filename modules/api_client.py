@@ -1,104 +1,179 @@
-import requests
 import json
 import time
 import logging
-from typing import Generator, Optional
+from typing import Dict, Generator, Optional
 from config import Config
+from modules.transport import TransportError, create_transport
+from modules.retry_policy import RetryPolicy, ResumeTrimmer
+from modules.endpoint_pool import EndpointPool
+from modules.token_budget import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "你是一个专业的学习助手，帮助学生整理知识、创建思维导图和生成复习题。"
+
+# parse_stream_line 遇到 [DONE] 时的返回值
+STREAM_DONE = object()
+
+def build_payload(prompt: str, stream: bool = False, assistant_prefix: Optional[str] = None,
+                  model: Optional[str] = None, max_tokens: Optional[int] = None) -> dict:
+    """构建chat/completions请求体
+
+    assistant_prefix 不为空时附加一条带 prefix 标记的assistant消息，让模型从该文本之后续写。
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    if assistant_prefix:
+        messages.append({"role": "assistant", "content": assistant_prefix, "prefix": True})
+    data = {
+        "model": model or Config.MODEL_NAME,
+        "messages": messages,
+        "temperature": Config.TEMPERATURE,
+        "max_tokens": max_tokens or Config.MAX_TOKENS
+    }
+    if stream:
+        data["stream"] = True
+    return data
+
+def parse_stream_line(line: str):
+    """解析一行SSE数据，返回文本片段、None（无内容）或 STREAM_DONE"""
+    if not line.startswith('data: '):
+        return None
+    line = line[6:]
+    if line == '[DONE]':
+        return STREAM_DONE
+    try:
+        chunk = json.loads(line)
+    except json.JSONDecodeError:
+        logger.warning(f"无法解析JSON: {line}")
+        return None
+    if 'choices' in chunk and chunk['choices']:
+        delta = chunk['choices'][0].get('delta', {})
+        return delta.get('content', '')
+    return None
+
 class DeepSeekClient:
-    """DeepSeek API客户端"""
+    """DeepSeek API客户端
+
+    配置了 API_ENDPOINTS 时在多个端点（服务商/密钥/模型）之间负载均衡，
+    某个端点限流或出错时切换到其他端点重试。
+    """
     
     def __init__(self, api_key: str, base_url: str):
         self.api_key = api_key
         self.base_url = base_url
         self.headers = {
-            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
+        # 连接池、超时和HTTP版本由传输层负责，认证头按端点附加
+        self.transport = create_transport(self.headers)
+        self.endpoints = EndpointPool.from_config(api_key, base_url)
+        self.retry_policy = RetryPolicy()
     
-    def stream_completion(self, prompt: str, retry_times: int = 3) -> Generator[str, None, None]:
-        """流式获取补全结果"""
-        url = f"{self.base_url}/chat/completions"
-        
-        data = {
-            "model": Config.MODEL_NAME,
-            "messages": [
-                {"role": "system", "content": "你是一个专业的学习助手，帮助学生整理知识、创建思维导图和生成复习题。"},
-                {"role": "user", "content": prompt}
-            ],
-            "stream": True,
-            "temperature": Config.TEMPERATURE,
-            "max_tokens": Config.MAX_TOKENS
-        }
+    def _begin(self, retry_times: Optional[int]):
+        # 每个端点至少尝试一次
+        return self.retry_policy.begin(max(retry_times or self.retry_policy.max_attempts, len(self.endpoints)))
+    
+    def stream_completion(self, prompt: str, retry_times: Optional[int] = None,
+                          max_tokens: Optional[int] = None) -> Generator[str, None, None]:
+        """流式获取补全结果
+
+        已输出部分内容后连接中断时，开启续传（STREAM_RESUME_ENABLED）则以已输出文本为前缀续写，
+        并去掉与已输出文本重复的部分；否则直接报错，避免客户端收到重复内容。
+        """
+        emitted = []
+        failed = []
+        retry = self._begin(retry_times)
         
-        for attempt in range(retry_times):
+        while True:
+            endpoint = self.endpoints.acquire(exclude=failed)
+            retry.next_attempt()
+            prefix = ''.join(emitted)
+            data = build_payload(prompt, stream=True, assistant_prefix=prefix or None, model=endpoint.model,
+                                 max_tokens=max_tokens)
+            trimmer = ResumeTrimmer(prefix) if prefix else None
+            output = []
+            start = time.time()
             try:
-                response = self.session.post(
-                    url, 
-                    json=data, 
-                    stream=True,
-                    timeout=Config.STREAM_TIMEOUT
-                )
-                response.raise_for_status()
+                for line in self.transport.stream_lines(f"{endpoint.base_url}/chat/completions", data,
+                                                        Config.STREAM_TIMEOUT, headers=endpoint.headers):
+                    if start is not None:
+                        self.endpoints.record_latency(endpoint, time.time() - start)
+                        start = None
+                    content = parse_stream_line(line)
+                    if content is STREAM_DONE:
+                        break
+                    if content and trimmer is not None:
+                        content = trimmer.feed(content)
+                    if content:
+                        output.append(content)
+                        emitted.append(content)
+                        yield content
+                if trimmer is not None:
+                    tail = trimmer.flush()
+                    if tail:
+                        output.append(tail)
+                        emitted.append(tail)
+                        yield tail
                 
-                for line in response.iter_lines():
-                    if line:
-                        line = line.decode('utf-8')
-                        if line.startswith('data: '):
-                            line = line[6:]
-                            if line == '[DONE]':
-                                break
-                            try:
-                                chunk = json.loads(line)
-                                if 'choices' in chunk and chunk['choices']:
-                                    delta = chunk['choices'][0].get('delta', {})
-                                    content = delta.get('content', '')
-                                    if content:
-                                        yield content
-                            except json.JSONDecodeError:
-                                logger.warning(f"无法解析JSON: {line}")
-                                continue
-                break
-                
-            except requests.exceptions.RequestException as e:
-                logger.error(f"API请求失败 (尝试 {attempt + 1}/{retry_times}): {str(e)}")
-                if attempt < retry_times - 1:
-                    time.sleep(Config.RETRY_DELAY * (attempt + 1))
-                else:
+            except TransportError as e:
+                delay = self.endpoints.handle_failure(endpoint, e, retry, failed)
+                if delay is None:
                     raise Exception(f"API请求失败: {str(e)}")
+                if emitted and not Config.STREAM_RESUME_ENABLED:
+                    raise Exception(f"API连接中断: {str(e)}")
+                if emitted:
+                    logger.info(f"已输出 {sum(len(c) for c in emitted)} 字符，{delay:.1f} 秒后续传")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # 客户端断开（GeneratorExit）等情况也要释放端点，半开状态的试探请求作废，否则熔断器不会再放行请求
+                endpoint.breaker.abandon_probe()
+                self.endpoints.release(endpoint, tokens=estimate_tokens(prompt + prefix + ''.join(output)))
+                raise
+            
+            retry.succeeded(endpoint.breaker)
+            self.endpoints.release(endpoint, tokens=estimate_tokens(prompt + prefix + ''.join(output)))
+            return
     
-    def get_completion(self, prompt: str, retry_times: int = 3) -> str:
+    def get_completion(self, prompt: str, retry_times: Optional[int] = None, max_tokens: Optional[int] = None) -> str:
         """获取完整的补全结果"""
-        url = f"{self.base_url}/chat/completions"
-        
-        data = {
-            "model": Config.MODEL_NAME,
-            "messages": [
-                {"role": "system", "content": "你是一个专业的学习助手，帮助学生整理知识、创建思维导图和生成复习题。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": Config.TEMPERATURE,
-            "max_tokens": Config.MAX_TOKENS
-        }
+        failed = []
+        retry = self._begin(retry_times)
         
-        for attempt in range(retry_times):
+        while True:
+            endpoint = self.endpoints.acquire(exclude=failed)
+            retry.next_attempt()
+            data = build_payload(prompt, model=endpoint.model, max_tokens=max_tokens)
+            start = time.time()
             try:
-                response = self.session.post(url, json=data, timeout=30)
-                response.raise_for_status()
-                
-                result = response.json()
-                if 'choices' in result and result['choices']:
-                    return result['choices'][0]['message']['content']
-                else:
-                    raise Exception("API返回格式错误")
-                    
-            except requests.exceptions.RequestException as e:
-                logger.error(f"API请求失败 (尝试 {attempt + 1}/{retry_times}): {str(e)}")
-                if attempt < retry_times - 1:
-                    time.sleep(Config.RETRY_DELAY * (attempt + 1))
-                else:
-                    raise Exception(f"API请求失败: {str(e)}")
\ No newline at end of file
+                result = self.transport.post_json(f"{endpoint.base_url}/chat/completions", data,
+                                                  Config.API_READ_TIMEOUT, headers=endpoint.headers)
+            except TransportError as e:
+                delay = self.endpoints.handle_failure(endpoint, e, retry, failed)
+                if delay is None:
+                    raise Exception(f"API请求失败: {str(e)}")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                endpoint.breaker.abandon_probe()
+                self.endpoints.release(endpoint)
+                raise
+            
+            self.endpoints.record_latency(endpoint, time.time() - start)
+            retry.succeeded(endpoint.breaker)
+            if 'choices' in result and result['choices']:
+                content = result['choices'][0]['message']['content']
+                usage = result.get('usage') or {}
+                self.endpoints.release(endpoint, tokens=usage.get('total_tokens') or estimate_tokens(prompt + content))
+                return content
+            self.endpoints.release(endpoint)
+            raise Exception("API返回格式错误")
+    
+    def stats(self) -> Dict:
+        """连接池和各端点统计"""
+        stats = self.transport.stats()
+        stats['endpoints'] = self.endpoints.stats()
+        return stats
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from typing import AsyncGenerator, Optional
+import aiohttp
+from config import Config
+from modules.api_client import build_payload, parse_stream_line, STREAM_DONE
+from modules.transport import TransportError, parse_retry_after
+from modules.retry_policy import RetryPolicy, ResumeTrimmer
+from modules.endpoint_pool import EndpointPool
+from modules.token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+class AsyncDeepSeekClient:
+    """DeepSeek API异步客户端（asyncio + aiohttp）
+
+    单个事件循环即可同时维持大量流式请求；同步接口仍由 DeepSeekClient 提供。
+    """
+
+    def __init__(self, api_key: str, base_url: str):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.headers = {
+            "Content-Type": "application/json"
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.endpoints = EndpointPool.from_config(api_key, base_url)
+        self.retry_policy = RetryPolicy()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取会话（必须在事件循环内创建）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=Config.ASYNC_MAX_CONNECTIONS)
+            self._session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+        return self._session
+
+    async def close(self):
+        """关闭会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def stream_completion(self, prompt: str, retry_times: Optional[int] = None,
+                                max_tokens: Optional[int] = None) -> AsyncGenerator[str, None]:
+        """流式获取补全结果（端点选择、重试与续传逻辑同 DeepSeekClient.stream_completion）"""
+        # 流式响应的总时长不设上限，只限制两次读取之间的间隔
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=Config.API_CONNECT_TIMEOUT,
+                                        sock_read=Config.STREAM_TIMEOUT)
+        emitted = []
+        failed = []
+        retry = self.retry_policy.begin(max(retry_times or self.retry_policy.max_attempts, len(self.endpoints)))
+
+        while True:
+            endpoint = self.endpoints.acquire(exclude=failed)
+            retry.next_attempt()
+            prefix = ''.join(emitted)
+            data = build_payload(prompt, stream=True, assistant_prefix=prefix or None, model=endpoint.model,
+                                 max_tokens=max_tokens)
+            trimmer = ResumeTrimmer(prefix) if prefix else None
+            output = []
+            start = asyncio.get_running_loop().time()
+            try:
+                async with self._get_session().post(f"{endpoint.base_url}/chat/completions", json=data,
+                                                    headers=endpoint.headers, timeout=timeout) as response:
+                    if response.status >= 400:
+                        raise TransportError(f"HTTP {response.status}: {response.reason}",
+                                             status_code=response.status,
+                                             retry_after=parse_retry_after(response.headers.get('Retry-After')))
+                    self.endpoints.record_latency(endpoint, asyncio.get_running_loop().time() - start)
+
+                    async for line in response.content:
+                        line = line.strip()
+                        if line:
+                            content = parse_stream_line(line.decode('utf-8'))
+                            if content is STREAM_DONE:
+                                break
+                            if content and trimmer is not None:
+                                content = trimmer.feed(content)
+                            if content:
+                                output.append(content)
+                                emitted.append(content)
+                                yield content
+                if trimmer is not None:
+                    tail = trimmer.flush()
+                    if tail:
+                        output.append(tail)
+                        emitted.append(tail)
+                        yield tail
+
+            except (TransportError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not isinstance(e, TransportError):
+                    e = TransportError(str(e) or type(e).__name__)
+                delay = self.endpoints.handle_failure(endpoint, e, retry, failed)
+                if delay is None:
+                    raise Exception(f"API请求失败: {str(e)}")
+                if emitted and not Config.STREAM_RESUME_ENABLED:
+                    raise Exception(f"API连接中断: {str(e)}")
+                if emitted:
+                    logger.info(f"已输出 {sum(len(c) for c in emitted)} 字符，{delay:.1f} 秒后续传")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # 客户端断开（GeneratorExit、取消）等情况也要释放端点，半开状态的试探请求作废，否则熔断器不会再放行请求
+                endpoint.breaker.abandon_probe()
+                self.endpoints.release(endpoint, tokens=estimate_tokens(prompt + prefix + ''.join(output)))
+                raise
+
+            retry.succeeded(endpoint.breaker)
+            self.endpoints.release(endpoint, tokens=estimate_tokens(prompt + prefix + ''.join(output)))
+            return
+
+    def stats(self):
+        """各端点统计"""
+        return self.endpoints.stats()
@@ -0,0 +1,236 @@
+import os
+import time
+import uuid
+import codecs
+import hashlib
+import logging
+import zipfile
+import threading
+from typing import BinaryIO, Dict, Optional
+from werkzeug.utils import secure_filename
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 各扩展名对应的文件头（magic number）
+MAGIC_NUMBERS = {
+    '.pdf': (b'%PDF-',),
+    '.docx': (b'PK\x03\x04',),
+    '.pptx': (b'PK\x03\x04',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+}
+# Office文档（zip容器）中必须存在的条目
+CONTAINER_ENTRIES = {
+    '.docx': 'word/document.xml',
+    '.pptx': 'ppt/presentation.xml',
+}
+# 检查文件头时读取的字节数
+SNIFF_SIZE = 512
+
+
+class UploadError(Exception):
+    """上传请求无效（status_code 为返回给客户端的HTTP状态码）"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def check_file_header(ext: str, head: bytes):
+    """按文件开头的字节校验文件类型与扩展名是否一致，不一致时抛出 UploadError"""
+    if ext == '.txt':
+        # 文本文件没有文件头：不能含NUL字节，且必须是UTF-8（末尾可能截断在多字节字符中间）
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        except UnicodeDecodeError:
+            raise UploadError("文本文件必须是UTF-8编码", 415)
+        if b'\x00' in head:
+            raise UploadError("文件内容不是文本", 415)
+        return
+    magics = MAGIC_NUMBERS.get(ext)
+    if magics is None:
+        raise UploadError(f"不支持的文件类型: {ext}", 415)
+    if not any(head.startswith(magic) for magic in magics):
+        raise UploadError(f"文件内容与扩展名 {ext} 不符", 415)
+
+
+def check_container(file_path: str, ext: str):
+    """校验Word/PPT文档的zip结构（只读取中央目录）"""
+    entry = CONTAINER_ENTRIES.get(ext)
+    if entry is None:
+        return
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            names = set(archive.namelist())
+    except zipfile.BadZipFile:
+        raise UploadError(f"文件已损坏或不是有效的 {ext} 文档", 415)
+    if entry not in names:
+        raise UploadError(f"文件内容与扩展名 {ext} 不符", 415)
+
+
+class _UploadSession:
+    """一次分片上传：临时文件、已接收的字节数和增量计算的哈希"""
+
+    def __init__(self, upload_id: str, filename: str, ext: str, size: int, temp_path: str):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.ext = ext
+        self.size = size
+        self.temp_path = temp_path
+        self.offset = 0
+        self.hasher = hashlib.sha256()
+        self.head = b''
+        self.file_path = None
+        self.updated_at = time.time()
+        self.lock = threading.Lock()
+
+    def status(self) -> Dict:
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'size': self.size,
+            'offset': self.offset,
+            'complete': self.file_path is not None
+        }
+
+
+class ChunkedUploadManager:
+    """可续传的分片上传
+
+    客户端先创建上传会话，再按顺序 PUT 各分片（每个请求体不超过 chunk_size，
+    不受 MAX_CONTENT_LENGTH 限制整个文件）。服务端按固定大小的块边读边写入临时文件并计算哈希，
+    收到开头的字节后立即按文件头校验类型；连接中断后客户端查询已接收的偏移量并从该处继续。
+    全部接收后交给 FileHandler 按内容哈希存储。
+    """
+
+    READ_SIZE = 64 * 1024  # 读取请求体时每次读取的字节数
+
+    def __init__(self, file_handler, chunk_size: int = Config.UPLOAD_CHUNK_SIZE,
+                 max_size: int = Config.UPLOAD_MAX_FILE_SIZE, ttl: float = Config.UPLOAD_SESSION_TTL):
+        self.file_handler = file_handler
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sessions: Dict[str, _UploadSession] = {}
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.bytes_received = 0
+
+    def create(self, filename: str, size: int) -> Dict:
+        """创建上传会话"""
+        if not filename or not self.file_handler.allowed_file(filename):
+            raise UploadError(f"不支持的文件类型: {filename}", 415)
+        if size <= 0:
+            raise UploadError("文件大小无效")
+        if size > self.max_size:
+            raise UploadError(f"文件过大（上限 {self.max_size // 1024 // 1024} MB）", 413)
+
+        self._expire()
+        _, ext = os.path.splitext(secure_filename(filename).lower())
+        upload_id = uuid.uuid4().hex
+        temp_path = os.path.join(self.file_handler.upload_folder, f".upload_{upload_id}")
+        open(temp_path, 'wb').close()
+        session = _UploadSession(upload_id, filename, ext, size, temp_path)
+        with self._lock:
+            self._sessions[upload_id] = session
+        status = session.status()
+        status['chunk_size'] = self.chunk_size
+        return status
+
+    def get(self, upload_id: str) -> Optional[Dict]:
+        """查询上传进度（用于断点续传）"""
+        session = self._sessions.get(upload_id)
+        return session.status() if session is not None else None
+
+    def write(self, upload_id: str, offset: int, stream: BinaryIO) -> Dict:
+        """写入从 offset 开始的一个分片
+
+        offset 必须等于已接收的字节数，否则返回409和当前偏移量，由客户端从正确位置重发。
+        """
+        session = self._sessions.get(upload_id)
+        if session is None:
+            raise UploadError("上传会话不存在或已过期", 404)
+        if not session.lock.acquire(blocking=False):
+            raise UploadError("该上传会话正在接收其他分片", 409)
+        try:
+            if session.file_path is not None:
+                return session.status()
+            if offset != session.offset:
+                raise UploadError(f"偏移量不匹配，应从 {session.offset} 继续", 409)
+
+            received = 0
+            try:
+                with open(session.temp_path, 'ab') as f:
+                    while True:
+                        block = stream.read(self.READ_SIZE)
+                        if not block:
+                            break
+                        received += len(block)
+                        if received > self.chunk_size or session.offset + len(block) > session.size:
+                            raise UploadError("分片超出声明的大小", 413)
+                        if len(session.head) < SNIFF_SIZE:
+                            session.head += block[:SNIFF_SIZE - len(session.head)]
+                            if len(session.head) >= SNIFF_SIZE or session.offset + len(block) == session.size:
+                                check_file_header(session.ext, session.head)
+                        # 写入和哈希逐块同步推进，连接中断时 offset 与文件内容保持一致
+                        f.write(block)
+                        session.hasher.update(block)
+                        session.offset += len(block)
+            except UploadError as e:
+                if e.status_code == 415:
+                    self._discard(session)
+                raise
+            finally:
+                session.updated_at = time.time()
+                with self._lock:
+                    self.bytes_received += received
+
+            if session.offset == session.size:
+                self._finalize(session)
+            return session.status()
+        finally:
+            session.lock.release()
+
+    def file_path(self, upload_id: str) -> Optional[str]:
+        """已完成上传的文件路径"""
+        session = self._sessions.get(upload_id)
+        return session.file_path if session is not None else None
+
+    def _finalize(self, session: _UploadSession):
+        try:
+            check_container(session.temp_path, session.ext)
+        except UploadError:
+            self._discard(session)
+            raise
+        session.file_path = self.file_handler.store_file(session.temp_path, session.hasher.hexdigest(), session.ext)
+        with self._lock:
+            self.completed += 1
+        logger.info(f"分片上传完成: {session.filename} ({session.size} 字节)")
+
+    def _discard(self, session: _UploadSession):
+        with self._lock:
+            self._sessions.pop(session.upload_id, None)
+        if os.path.exists(session.temp_path):
+            os.remove(session.temp_path)
+
+    def _expire(self):
+        """移除超过 ttl 未活动的会话及其临时文件"""
+        now = time.time()
+        with self._lock:
+            expired = [s for s in self._sessions.values() if now - s.updated_at > self.ttl]
+        for session in expired:
+            if session.lock.acquire(blocking=False):
+                try:
+                    self._discard(session)
+                finally:
+                    session.lock.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'active_sessions': sum(1 for s in self._sessions.values() if s.file_path is None),
+                'completed': self.completed,
+                'bytes_received': self.bytes_received
+            }
@@ -0,0 +1,118 @@
+import logging
+import threading
+from typing import Callable, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """一次进行中的生成：驱动线程写入消息，订阅者按各自进度读取"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.messages: List[str] = []
+        self.done = False
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+
+class StreamCoalescer:
+    """相同请求合并（single-flight）
+
+    同一个键的第一个请求启动后台线程驱动上游生成，期间到达的相同请求订阅同一份
+    消息缓冲：先回放已收到的消息，再实时跟随后续消息。上游只调用一次，
+    所有订阅者都断开后停止生成。
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.flights = 0
+        self.coalesced = 0
+
+    def subscribe(self, key: str, factory: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """订阅 key 对应的消息流，没有进行中的生成时用 factory() 启动一个"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight(key)
+                self._flights[key] = flight
+                self.flights += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+            with flight.cond:
+                flight.subscribers += 1
+
+        if leader:
+            threading.Thread(target=self._drive, args=(flight, factory), daemon=True).start()
+        else:
+            logger.info(f"合并相同的生成请求，当前订阅者 {flight.subscribers} 个")
+        return self._tail(flight)
+
+    def _drive(self, flight: _Flight, factory: Callable[[], Iterator[str]]):
+        """后台线程：把上游消息写入缓冲，所有订阅者都断开时停止"""
+        messages = factory()
+        try:
+            for message in messages:
+                with flight.cond:
+                    flight.messages.append(message)
+                    flight.cond.notify_all()
+                    abandoned = flight.subscribers == 0
+                if abandoned and self._abandon(flight):
+                    logger.info("所有订阅者已断开，停止生成")
+                    break
+        except Exception as e:
+            logger.error(f"合并生成过程错误: {str(e)}")
+        finally:
+            close = getattr(messages, 'close', None)
+            if close is not None:
+                close()
+            # 先移除再标记完成，之后到达的请求会重新查询缓存或发起新的生成
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def _abandon(self, flight: _Flight) -> bool:
+        """在与 subscribe 相同的锁内确认没有订阅者并移除该生成，此后到达的请求会发起新的生成
+
+        确认期间有新订阅者加入时返回False，继续生成。
+        """
+        with self._lock:
+            with flight.cond:
+                if flight.subscribers != 0:
+                    return False
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            return True
+
+    @staticmethod
+    def _tail(flight: _Flight) -> Iterator[str]:
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index >= len(flight.messages) and not flight.done:
+                        flight.cond.wait()
+                    messages = flight.messages[index:]
+                    done = flight.done
+                index += len(messages)
+                for message in messages:
+                    yield message
+                if done and index >= len(flight.messages):
+                    return
+        finally:
+            with flight.cond:
+                flight.subscribers -= 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'flights': self.flights,
+                'coalesced_requests': self.coalesced
+            }
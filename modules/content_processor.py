@@ -1,39 +1,151 @@
 import re
 import logging
-from typing import List
+from typing import List, Optional, Tuple
+from config import Config
+from modules.token_budget import PromptBudget
 
 logger = logging.getLogger(__name__)
 
+# 标题行：Markdown标题、“第X章/节”、“一、”、“1.2 ”等编号
+HEADING_RE = re.compile(
+    r'^\s*(?:#{1,6}\s+\S|第[一二三四五六七八九十百零\d]+[章节部分篇讲]|[一二三四五六七八九十]+、|\d+(?:\.\d+)*[.、\s]\s*\S)'
+)
+# 句末位置（用于切分超长段落）
+SENTENCE_END_RE = re.compile(r'(?<=[。！？!?；;])|(?<=\.)\s')
+
+# 文本清理用到的模式（均为常量替换，不回调Python函数）
+CONTROL_CHARS_RE = re.compile(r'[\x00-\x08\x0E-\x1B\x7F]+')
+# 换行和普通空格以外的空白：制表符、换页符、不换行空格、全角空格等
+OTHER_SPACE_RE = re.compile(r'[\t\x0B\x0C\x1C-\x1F\x85\xA0\u1680\u2000-\u200A\u2028\u2029\u202F\u205F\u3000]')
+# 行内（非行首）的连续空格；以空格开头，便于正则引擎快速定位候选位置
+MULTI_SPACE_RE = re.compile(r' (?<=\S ) +')
+# 行首缩进，列表项（- * + • 或 1. 1)）的缩进除外，保留嵌套层级
+LEADING_SPACE_RE = re.compile(r'\n +(?! |[-*+•] |\d+[.)] )')
+BLANK_LINES_RE = re.compile(r'\n\n+')
+
+
 class ContentProcessor:
     """内容预处理器"""
     
     def __init__(self):
-        self.max_length = 10000  # 最大字符长度
+        # 内容长度按token计算（中英文的token密度不同，按字符截断会浪费或超出上下文）
+        self.budget = PromptBudget()
+        self.max_tokens = self.budget.content_cap  # 未指定时的内容token上限
     
-    def preprocess(self, content: str) -> str:
-        """预处理内容"""
+    def preprocess(self, content: str, max_tokens: Optional[int] = None) -> str:
+        """预处理内容，超出token预算时在句子边界截断
+
+        max_tokens 一般由 PromptBudget.content_budget 根据任务模板计算。
+        """
+        return self.prepare(content, max_tokens)[0]
+    
+    def prepare(self, content: str, max_tokens: Optional[int] = None) -> Tuple[str, bool]:
+        """同 preprocess，同时返回内容是否被截断"""
         # 清理内容
         content = self.clean_text(content)
         
         # 截断过长内容
-        if len(content) > self.max_length:
-            logger.warning(f"内容过长，截断至 {self.max_length} 字符")
-            content = content[:self.max_length] + "..."
+        limit = self.max_tokens if max_tokens is None else max_tokens
+        content, trimmed = self.budget.trim(content, limit)
+        if trimmed:
+            logger.warning(f"内容过长，截断至约 {limit} tokens（{len(content)} 字符）")
+            content += "..."
+        
+        return content, trimmed
+    
+    def count_tokens(self, text: str) -> int:
+        """估算文本的token数"""
+        return self.budget.count(text)
+    
+    def split_chunks(self, content: str, max_tokens: Optional[int] = None,
+                     chunk_tokens: int = Config.LONG_DOC_CHUNK_TOKENS,
+                     max_chunks: int = Config.LONG_DOC_MAX_CHUNKS) -> List[str]:
+        """把长文档按段落和标题切分为语义连贯的分块
+
+        内容不超过 max_tokens 时返回单个分块（与 preprocess 结果一致）。
+        分块优先在标题处断开，段落不会被拆散，超长段落按句子切分。
+        """
+        limit = self.max_tokens if max_tokens is None else max_tokens
+        chunk_tokens = min(chunk_tokens, limit) if limit else chunk_tokens
+        text = content.replace('\r\n', '\n').replace('\r', '\n')
+        paragraphs = [self.clean_text(p) for p in re.split(r'\n\s*\n', text)]
+        if len(paragraphs) == 1:
+            # 没有空行分隔时按单个换行分段
+            paragraphs = [self.clean_text(p) for p in text.split('\n')]
+        paragraphs = [p for p in paragraphs if p]
+        sizes = [self.count_tokens(p) for p in paragraphs]
+        if sum(sizes) <= limit:
+            return [self.preprocess(content, limit)]
         
-        return content
+        chunks = []
+        current = []
+        current_tokens = 0
+        for para, size in zip(paragraphs, sizes):
+            pieces = [(para, size)] if size <= chunk_tokens else self._split_paragraph(para, chunk_tokens)
+            for piece, piece_tokens in pieces:
+                is_heading = len(piece) < 80 and HEADING_RE.match(piece) is not None
+                # 新章节开始且当前分块已有一定篇幅时另起一块
+                if current and (current_tokens + piece_tokens > chunk_tokens or
+                                (is_heading and current_tokens >= chunk_tokens * 0.3)):
+                    chunks.append('\n\n'.join(current))
+                    current = []
+                    current_tokens = 0
+                current.append(piece)
+                current_tokens += piece_tokens + 1
+        if current:
+            chunks.append('\n\n'.join(current))
+        
+        if len(chunks) > max_chunks:
+            logger.warning(f"文档分块过多（{len(chunks)}），只处理前 {max_chunks} 块")
+            chunks = chunks[:max_chunks]
+        logger.info(f"长文档切分为 {len(chunks)} 块")
+        return chunks
+    
+    def _split_paragraph(self, para: str, chunk_tokens: int) -> List[tuple]:
+        """把超过 chunk_tokens 的段落按句子切分，返回 [(文本, token数)]"""
+        pieces = []
+        current = ''
+        current_tokens = 0
+        for sentence in SENTENCE_END_RE.split(para):
+            if not sentence:
+                continue
+            sentence_tokens = self.count_tokens(sentence)
+            if sentence_tokens > chunk_tokens:
+                # 没有句末标点的超长文本直接截断切分
+                if current:
+                    pieces.append((current, current_tokens))
+                    current, current_tokens = '', 0
+                while sentence_tokens > chunk_tokens:
+                    head, _ = self.budget.trim(sentence, chunk_tokens)
+                    head = head or sentence[:1]
+                    pieces.append((head, self.count_tokens(head)))
+                    sentence = sentence[len(head):].lstrip()
+                    sentence_tokens = self.count_tokens(sentence)
+            if current and current_tokens + sentence_tokens > chunk_tokens:
+                pieces.append((current, current_tokens))
+                current, current_tokens = '', 0
+            current += sentence
+            current_tokens += sentence_tokens
+        if current:
+            pieces.append((current, current_tokens))
+        return pieces
     
     def clean_text(self, text: str) -> str:
-        """清理文本"""
-        # 移除多余的空白字符
-        text = re.sub(r'\s+', ' ', text)
+        """清理文本：移除控制字符、合并空白，保留换行和段落（空行）结构"""
+        # 规范化换行
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
         
         # 移除特殊控制字符
-        text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', text)
+        text = CONTROL_CHARS_RE.sub('', text)
         
-        # 规范化换行
-        text = re.sub(r'\r\n', '\n', text)
-        text = re.sub(r'\r', '\n', text)
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        # 行内空白合并为一个空格，去掉行尾空格和行首缩进（列表项的缩进保留）
+        text = OTHER_SPACE_RE.sub(' ', text)
+        text = MULTI_SPACE_RE.sub(' ', text)
+        text = text.replace(' \n', '\n')
+        text = LEADING_SPACE_RE.sub('\n', text)
+        
+        # 多个空行合并为一个段落分隔
+        text = BLANK_LINES_RE.sub('\n\n', text)
         
         return text.strip()
     
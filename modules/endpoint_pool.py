@@ -0,0 +1,194 @@
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+from config import Config
+from modules.retry_policy import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# 未给出 Retry-After 的429响应，暂停使用该端点的时间（秒）
+DEFAULT_RATE_LIMIT_COOLDOWN = 5.0
+
+
+class Endpoint:
+    """一个API端点（服务地址 + 密钥 + 模型）及其运行状态"""
+
+    def __init__(self, base_url: str, api_key: str, model: str, weight: float = 1.0,
+                 name: Optional[str] = None, tpm_limit: int = 0):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.weight = max(float(weight), 0.01)
+        self.name = name or f"{self.base_url}#{api_key[-4:]}"
+        self.tpm_limit = tpm_limit  # 每分钟token上限，0表示不限
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.breaker = CircuitBreaker()
+
+        self.outstanding = 0
+        self.ewma_latency = None  # 首字节延迟的指数加权平均（秒）
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.tokens = 0
+        self._token_window = deque()  # 最近60秒的 (时间, token数)
+
+    def tokens_per_minute(self, now: float) -> int:
+        while self._token_window and now - self._token_window[0][0] > 60:
+            self._token_window.popleft()
+        return sum(count for _, count in self._token_window)
+
+    def available(self, now: float) -> bool:
+        """熔断器未打开、不在限流冷却期、未超出每分钟token上限"""
+        if self.breaker.state == 'open' or now < self.cooldown_until:
+            return False
+        return not self.tpm_limit or self.tokens_per_minute(now) < self.tpm_limit
+
+    def stats(self, now: float) -> Dict:
+        return {
+            'name': self.name,
+            'model': self.model,
+            'weight': self.weight,
+            'outstanding': self.outstanding,
+            'ewma_latency': round(self.ewma_latency, 4) if self.ewma_latency is not None else None,
+            'requests': self.requests,
+            'failures': self.failures,
+            'tokens': self.tokens,
+            'tokens_per_minute': self.tokens_per_minute(now),
+            'cooling_down': now < self.cooldown_until,
+            'circuit': self.breaker.stats()
+        }
+
+
+class EndpointPool:
+    """多端点负载均衡
+
+    按“进行中请求数 / 权重”（least-outstanding）或“延迟EWMA × 进行中请求数 / 权重”（ewma）
+    选择端点；429/5xx 时把端点置入冷却或计入熔断，由调用方换下一个端点重试。
+    """
+
+    STRATEGIES = ('least-outstanding', 'ewma')
+
+    def __init__(self, endpoints: List[Endpoint], strategy: str = 'least-outstanding', ewma_alpha: float = 0.3):
+        if not endpoints:
+            raise ValueError("至少需要一个API端点")
+        if strategy not in self.STRATEGIES:
+            logger.warning(f"未知的负载均衡策略 {strategy}，使用 least-outstanding")
+            strategy = 'least-outstanding'
+        self.endpoints = endpoints
+        self.strategy = strategy
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, api_key: str = Config.API_KEY, base_url: str = Config.API_BASE_URL) -> 'EndpointPool':
+        """从 Config.API_ENDPOINTS（JSON数组）创建，未配置时只使用 api_key/base_url"""
+        endpoints = []
+        if Config.API_ENDPOINTS:
+            try:
+                for item in json.loads(Config.API_ENDPOINTS):
+                    endpoints.append(Endpoint(
+                        base_url=item.get('base_url', base_url),
+                        api_key=item['api_key'],
+                        model=item.get('model', Config.MODEL_NAME),
+                        weight=item.get('weight', 1.0),
+                        name=item.get('name'),
+                        tpm_limit=int(item.get('tpm_limit', 0))
+                    ))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"API_ENDPOINTS 配置无效: {str(e)}")
+                endpoints = []
+        if not endpoints:
+            endpoints.append(Endpoint(base_url, api_key, Config.MODEL_NAME))
+        logger.info(f"已配置 {len(endpoints)} 个API端点，策略 {Config.API_LB_STRATEGY}")
+        return cls(endpoints, Config.API_LB_STRATEGY)
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def _score(self, endpoint: Endpoint) -> float:
+        load = (endpoint.outstanding + 1) / endpoint.weight
+        if self.strategy == 'ewma':
+            # 没有延迟数据的端点优先试用
+            return load * (endpoint.ewma_latency if endpoint.ewma_latency is not None else 0.0)
+        return load
+
+    def acquire(self, exclude: Iterable[Endpoint] = ()) -> Endpoint:
+        """选择一个端点并占用，用完后必须调用 release()
+
+        优先选择可用且本次请求未失败过的端点；都不可用时抛出 CircuitOpenError。
+        """
+        excluded = set(id(e) for e in exclude)
+        with self._lock:
+            now = time.time()
+            candidates = [e for e in self.endpoints if e.available(now)]
+            fresh = [e for e in candidates if id(e) not in excluded]
+            for endpoint in sorted(fresh or candidates, key=self._score):
+                # 半开状态的熔断器只放行一个试探请求
+                if endpoint.breaker.allow():
+                    endpoint.outstanding += 1
+                    endpoint.requests += 1
+                    return endpoint
+        raise CircuitOpenError("所有API端点暂时不可用，请稍后重试")
+
+    def has_alternative(self, exclude: Iterable[Endpoint]) -> bool:
+        """是否还有未尝试过的可用端点（有则无需退避等待，直接切换）"""
+        excluded = set(id(e) for e in exclude)
+        with self._lock:
+            now = time.time()
+            return any(e.available(now) and id(e) not in excluded for e in self.endpoints)
+
+    def cooldown_remaining(self) -> float:
+        """最早结束限流冷却的端点还需等待的秒数"""
+        now = time.time()
+        return max(0.0, min(e.cooldown_until for e in self.endpoints) - now)
+
+    def record_latency(self, endpoint: Endpoint, latency: float):
+        with self._lock:
+            if endpoint.ewma_latency is None:
+                endpoint.ewma_latency = latency
+            else:
+                endpoint.ewma_latency += self.ewma_alpha * (latency - endpoint.ewma_latency)
+
+    def release(self, endpoint: Endpoint, error: Optional[Exception] = None, tokens: int = 0):
+        """请求结束，记录失败和token用量"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if tokens:
+                now = time.time()
+                endpoint.tokens += tokens
+                endpoint._token_window.append((now, tokens))
+            if error is not None:
+                endpoint.failures += 1
+                status_code = getattr(error, 'status_code', None)
+                retry_after = getattr(error, 'retry_after', None)
+                if status_code == 429 or retry_after is not None:
+                    cooldown = retry_after if retry_after is not None else DEFAULT_RATE_LIMIT_COOLDOWN
+                    endpoint.cooldown_until = time.time() + cooldown
+                    logger.warning(f"端点 {endpoint.name} 被限流，暂停 {cooldown:.1f} 秒")
+
+    def handle_failure(self, endpoint: Endpoint, error: Exception, retry, failed: List[Endpoint]) -> Optional[float]:
+        """释放失败的端点并记入 failed，返回重试前的等待秒数（None表示放弃）
+
+        retry 为 RetryState；还有其他可用端点时不等待，立即切换。
+        """
+        logger.error(f"API请求失败 [{endpoint.name}] (尝试 {retry.attempt}/{retry.max_attempts}): {str(error)}")
+        self.release(endpoint, error=error)
+        failed.append(endpoint)
+        delay = retry.failed(error, endpoint.breaker)
+        if delay is None:
+            return None
+        if self.has_alternative(failed):
+            return 0.0
+        # 所有端点都在冷却中时，至少等到其中一个恢复
+        return max(delay, self.cooldown_remaining())
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            return {
+                'strategy': self.strategy,
+                'endpoints': [e.stats(now) for e in self.endpoints]
+            }
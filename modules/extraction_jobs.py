@@ -0,0 +1,172 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ('done', 'failed')
+
+
+class ExtractionJobManager:
+    """后台文件内容提取任务
+
+    上传请求保存文件后立即返回任务ID，提取在固定大小的线程池中执行，
+    PDF/OCR等重量级解析的并发数与请求线程数无关；排队任务超过 max_pending 时拒绝新任务。
+    客户端轮询 get() 或通过 follow() 订阅逐页进度和最终文本；
+    不能阻塞线程的调用方（如asyncio）用 subscribe() 登记状态变化的通知回调。
+    """
+
+    def __init__(self, max_workers: int = Config.EXTRACTION_WORKERS,
+                 max_pending: int = Config.EXTRACTION_QUEUE_SIZE, max_jobs: int = 200):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='extract')
+        self._jobs = OrderedDict()  # job_id -> 任务信息
+        self._max_pending = max_pending
+        self._max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._listeners = {}  # job_id -> [状态变化回调]
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_extract_time = 0.0
+        self.total_wait_time = 0.0
+
+    def submit(self, filename: str, extract: Callable[[Callable[[int, Optional[int]], None]], str]) -> Optional[str]:
+        """提交提取任务，队列已满时返回None
+
+        extract(progress) 执行提取并返回文本，每处理完一页（块）调用 progress(已完成数, 总数)。
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'filename': filename,
+            'status': 'pending',
+            'done': 0,
+            'total': None,
+            'content': None,
+            'error': None,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'extract_time': None,
+            'version': 0
+        }
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j['status'] == 'pending')
+            if pending >= self._max_pending:
+                self.rejected += 1
+                return None
+            self._jobs[job_id] = job
+            self.submitted += 1
+            self._trim()
+        self._executor.submit(self._run, job, extract)
+        return job_id
+
+    def _trim(self):
+        """只保留最近的任务记录：从最早的记录开始删除已结束的任务，跳过未结束的任务"""
+        excess = len(self._jobs) - self._max_jobs
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] in FINISHED][:excess]
+        for job_id in finished:
+            del self._jobs[job_id]
+            self._listeners.pop(job_id, None)
+
+    def _update(self, job: Dict, **changes):
+        with self._changed:
+            job.update(changes)
+            job['version'] += 1
+            self._changed.notify_all()
+            listeners = list(self._listeners.get(job['job_id'], ()))
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"提取任务通知回调执行失败: {str(e)}")
+
+    def _run(self, job: Dict, extract: Callable):
+        started = time.time()
+        self._update(job, status='running', started_at=started)
+
+        def progress(done: int, total: Optional[int]):
+            self._update(job, done=done, total=total)
+
+        try:
+            content = extract(progress)
+        except Exception as e:
+            logger.error(f"文件内容提取任务失败 {job['filename']}: {str(e)}")
+            with self._lock:
+                self.failed += 1
+            self._update(job, status='failed', error=str(e))
+            return
+        elapsed = time.time() - started
+        with self._lock:
+            self.completed += 1
+            self.total_extract_time += elapsed
+            self.total_wait_time += started - job['submitted_at']
+        self._update(job, status='done', content=content, extract_time=elapsed)
+
+    @staticmethod
+    def _snapshot(job: Dict, include_content: bool = True) -> Dict:
+        return {key: value for key, value in job.items()
+                if key != 'version' and (include_content or key != 'content')}
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """查询任务状态（完成后包含提取的文本）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job is not None else None
+
+    def follow(self, job_id: str, timeout: float = 15.0) -> Iterator[Dict]:
+        """逐个产出任务状态的变化，直到任务结束；超过 timeout 秒无变化时产出一次当前状态（可作心跳）"""
+        version = -1
+        while True:
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                if job['version'] == version:
+                    self._changed.wait_for(lambda: job['version'] != version, timeout)
+                version = job['version']
+                finished = job['status'] in FINISHED
+                snapshot = self._snapshot(job, include_content=finished)
+            yield snapshot
+            if finished:
+                return
+
+    def subscribe(self, job_id: str, listener: Callable[[], None]) -> Callable[[], None]:
+        """任务状态每次变化后（在提取线程中）调用 listener()，返回取消订阅的函数
+
+        listener 应立即返回，例如用 loop.call_soon_threadsafe 唤醒事件循环中的等待者。
+        """
+        with self._lock:
+            self._listeners.setdefault(job_id, []).append(listener)
+
+        def unsubscribe():
+            with self._lock:
+                listeners = self._listeners.get(job_id)
+                if listeners is not None and listener in listeners:
+                    listeners.remove(listener)
+                    if not listeners:
+                        del self._listeners[job_id]
+
+        return unsubscribe
+
+    def stats(self) -> Dict:
+        """任务统计信息"""
+        with self._lock:
+            return {
+                'queue_depth': sum(1 for job in self._jobs.values() if job['status'] == 'pending'),
+                'running': sum(1 for job in self._jobs.values() if job['status'] == 'running'),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_extract_time': self.total_extract_time / self.completed if self.completed else 0.0,
+                'avg_queue_wait': self.total_wait_time / self.completed if self.completed else 0.0
+            }
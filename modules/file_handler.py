@@ -1,23 +1,62 @@
+import io
 import os
+import hashlib
 import logging
+import threading
+import uuid
+from collections import OrderedDict
+import multiprocessing
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 import PyPDF2
 import docx
 from pptx import Presentation
 from PIL import Image
-import pytesseract
-from typing import Optional
+from typing import Callable, Iterator, List, Optional
 from config import Config
+from modules.ocr import OCREngine
+from modules.structured_extract import iter_docx_blocks, iter_pptx_slides
+from modules.chunked_upload import SNIFF_SIZE, check_container, check_file_header
 
 logger = logging.getLogger(__name__)
 
+OCR_FAILED_MESSAGE = "图片文字识别失败，请确保已安装Tesseract OCR"
+
+# PDF并行提取子进程中打开的文档（每个进程只打开一次）
+_worker_pdf_reader = None
+
+def _init_pdf_worker(file_path: str):
+    """PDF提取子进程初始化：打开文档，失败时留空，由提取任务报错"""
+    global _worker_pdf_reader
+    try:
+        _worker_pdf_reader = PyPDF2.PdfReader(open(file_path, 'rb'))
+    except Exception as e:
+        logger.error(f"PDF提取进程打开文件失败: {str(e)}")
+
+def _extract_pdf_page(page_num: int) -> str:
+    """在子进程中提取PDF单页文本"""
+    if _worker_pdf_reader is None:
+        raise RuntimeError("PDF提取进程未能打开文件")
+    return _worker_pdf_reader.pages[page_num].extract_text() or ''
+
 class FileHandler:
     """文件处理器"""
     
-    def __init__(self, upload_folder: str):
+    CHUNK_SIZE = 64 * 1024  # 保存文件时每次读取的字节数
+    
+    def __init__(self, upload_folder: str, cache_size: int = Config.EXTRACTION_CACHE_SIZE):
         self.upload_folder = upload_folder
         os.makedirs(upload_folder, exist_ok=True)
+        # 文件路径 -> 内容哈希
+        self._path_digests = {}
+        # 内容哈希 -> 提取的文本（LRU）
+        self._extraction_cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        # OCR引擎（按需创建，工作线程常驻）
+        self._ocr = None
+        # 扫描页图片哈希 -> OCR文本（LRU），相同页面重复上传时不再识别
+        self._ocr_page_cache = OrderedDict()
     
     def allowed_file(self, filename: str) -> bool:
         """检查文件类型是否允许"""
@@ -29,69 +68,340 @@ class FileHandler:
         if not self.allowed_file(file.filename):
             raise ValueError(f"不支持的文件类型: {file.filename}")
         
-        filename = secure_filename(file.filename)
-        # 添加时间戳避免文件名冲突
-        import time
-        timestamp = str(int(time.time()))
-        filename = f"{timestamp}_{filename}"
+        _, ext = os.path.splitext(secure_filename(file.filename).lower())
+        
+        # 边写临时文件边计算SHA-256，内容相同的上传共用同一个文件
+        temp_path = os.path.join(self.upload_folder, f".upload_{uuid.uuid4().hex}")
+        hasher = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as f:
+                first = True
+                while True:
+                    chunk = file.stream.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if first:
+                        # 按文件头校验类型，不一致时不再读取剩余内容
+                        check_file_header(ext, chunk[:SNIFF_SIZE])
+                        first = False
+                    hasher.update(chunk)
+                    f.write(chunk)
+            check_container(temp_path, ext)
+            return self.store_file(temp_path, hasher.hexdigest(), ext)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def store_file(self, temp_path: str, digest: str, ext: str) -> str:
+        """把已写完的临时文件按内容哈希存储，返回文件路径"""
+        file_path = os.path.join(self.upload_folder, f"{digest}{ext}")
+        if os.path.exists(file_path):
+            logger.info(f"文件内容已存在，复用: {file_path}")
+            os.remove(temp_path)
+            # 刷新修改时间，避免存储清理把刚复用的文件当作旧文件删除
+            os.utime(file_path, None)
+        else:
+            os.replace(temp_path, file_path)
         
-        file_path = os.path.join(self.upload_folder, filename)
-        file.save(file_path)
+        with self._lock:
+            self._path_digests[file_path] = digest
         
         return file_path
     
-    def extract_content(self, file_path: str) -> str:
-        """从文件中提取内容"""
+    def file_digest(self, file_path: str) -> str:
+        """获取文件内容的SHA-256哈希"""
+        with self._lock:
+            digest = self._path_digests.get(file_path)
+        if digest:
+            return digest
+        
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        with self._lock:
+            self._path_digests[file_path] = digest
+        return digest
+    
+    def extract_content(self, file_path: str, max_length: Optional[int] = None,
+                        length_fn: Callable[[str], int] = len,
+                        progress: Optional[Callable[[int, Optional[int]], None]] = None) -> str:
+        """从文件中提取内容（按内容哈希缓存）
+
+        指定 max_length 时，累计长度（单位由 length_fn 决定，如字符数或token数）达到预算后立即停止解析，
+        只返回已读取的部分。指定 progress 时每提取一块调用 progress(已提取块数, 总页数或None)。
+        """
         _, ext = os.path.splitext(file_path.lower())
+        digest = self.file_digest(file_path)
+        cache_key = f"{digest}{ext}"
+        
+        with self._lock:
+            cached = self._extraction_cache.get(cache_key)
+            if cached is not None:
+                self._extraction_cache.move_to_end(cache_key)
+                logger.info(f"命中提取缓存: {file_path}")
+        
+        if cached is not None:
+            if max_length is None:
+                if progress is not None:
+                    progress(1, 1)
+                return cached
+            chunks = iter(cached.split('\n\n'))
+        else:
+            chunks = self.iter_extract(file_path)
+        total = self.count_pages(file_path) if progress is not None and cached is None else None
         
+        content = []
+        length = 0
+        complete = True
         try:
-            if ext == '.txt':
-                return self._extract_from_txt(file_path)
-            elif ext == '.pdf':
-                return self._extract_from_pdf(file_path)
-            elif ext == '.docx':
-                return self._extract_from_docx(file_path)
-            elif ext == '.pptx':
-                return self._extract_from_pptx(file_path)
-            elif ext in ['.png', '.jpg', '.jpeg']:
-                return self._extract_from_image(file_path)
-            else:
-                raise ValueError(f"不支持的文件类型: {ext}")
+            for chunk in chunks:
+                content.append(chunk)
+                length += length_fn(chunk)
+                if progress is not None:
+                    progress(len(content), total)
+                if max_length is not None and length >= max_length:
+                    complete = False
+                    break
         except Exception as e:
             logger.error(f"提取文件内容失败: {str(e)}")
             raise
+        finally:
+            # 提前结束时关闭生成器，释放文件句柄和未完成的任务
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        
+        text = '\n\n'.join(content)
+        
+        # 只缓存完整的提取结果；含OCR失败提示的结果不缓存，便于安装Tesseract后重试
+        if cached is None and complete and OCR_FAILED_MESSAGE not in text:
+            with self._lock:
+                self._extraction_cache[cache_key] = text
+                while len(self._extraction_cache) > self._cache_size:
+                    self._extraction_cache.popitem(last=False)
+        
+        return text
+    
+    def count_pages(self, file_path: str) -> Optional[int]:
+        """PDF页数（图片为1），用于报告提取进度；其他格式无法预知块数，返回None"""
+        _, ext = os.path.splitext(file_path.lower())
+        if ext in ['.png', '.jpg', '.jpeg']:
+            return 1
+        if ext != '.pdf':
+            return None
+        try:
+            with open(file_path, 'rb') as f:
+                return len(PyPDF2.PdfReader(f).pages)
+        except Exception:
+            return None
     
-    def _extract_from_txt(self, file_path: str) -> str:
-        """从文本文件提取内容"""
+    def iter_extract(self, file_path: str) -> Iterator[str]:
+        """逐块提取文件内容（按页/幻灯片/段落），调用方可随时停止读取"""
+        _, ext = os.path.splitext(file_path.lower())
+        
+        if ext == '.txt':
+            return self._iter_txt(file_path)
+        elif ext == '.pdf':
+            return self._iter_pdf(file_path)
+        elif ext == '.docx':
+            return self._iter_docx(file_path)
+        elif ext == '.pptx':
+            return self._iter_pptx(file_path)
+        elif ext in ['.png', '.jpg', '.jpeg']:
+            return self._iter_image(file_path)
+        else:
+            raise ValueError(f"不支持的文件类型: {ext}")
+    
+    def _iter_txt(self, file_path: str) -> Iterator[str]:
+        """按空行逐块读取文本文件
+
+        在第一个空行处切分（块之间以 '\n\n' 连接即还原原文），其余空白行和行内空白原样保留。
+        """
         with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+            block = []
+            for line in f:
+                if line == '\n' and block and block[-1].endswith('\n'):
+                    block[-1] = block[-1][:-1]
+                    yield ''.join(block)
+                    block = []
+                else:
+                    block.append(line)
+            if block:
+                yield ''.join(block)
     
-    def _extract_from_pdf(self, file_path: str) -> str:
-        """从PDF提取内容"""
-        content = []
+    def _iter_pdf(self, file_path: str) -> Iterator[str]:
+        """逐页提取PDF文本，没有文本层的扫描页改为OCR识别"""
         with open(file_path, 'rb') as f:
             pdf_reader = PyPDF2.PdfReader(f)
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                content.append(page.extract_text())
+            texts = self._iter_pdf_text(file_path, pdf_reader)
+            try:
+                if Config.PDF_OCR_ENABLED:
+                    yield from self._ocr_scanned_pages(pdf_reader, texts)
+                else:
+                    yield from texts
+            finally:
+                texts.close()
+    
+    def _iter_pdf_text(self, file_path: str, pdf_reader: PyPDF2.PdfReader) -> Iterator[str]:
+        """逐页提取PDF的文本层"""
+        num_pages = len(pdf_reader.pages)
+        emitted = 0
+        if Config.PDF_PARALLEL_ENABLED and num_pages >= Config.PDF_PARALLEL_MIN_PAGES:
+            try:
+                for page_text in self._iter_pdf_parallel(file_path, num_pages):
+                    emitted += 1
+                    yield page_text
+                return
+            except Exception as e:
+                logger.error(f"PDF并行提取失败，从第 {emitted + 1} 页起改为顺序提取: {str(e)}")
         
-        return '\n\n'.join(content)
+        for page_num in range(emitted, num_pages):
+            page = pdf_reader.pages[page_num]
+            yield page.extract_text() or ''
     
-    def _extract_from_docx(self, file_path: str) -> str:
-        """从Word文档提取内容"""
+    def _ocr_scanned_pages(self, pdf_reader: PyPDF2.PdfReader, texts: Iterator[str]) -> Iterator[str]:
+        """文本层（几乎）为空且含图片的页面改为OCR识别，按页序产出
+
+        连续的扫描页攒成一批交给OCR引擎并行识别；识别结果按页面图片的哈希缓存。
+        """
+        pending = []  # [(页码, 页面哈希, 文本层)]
+        batch_size = Config.OCR_WORKERS * 2
+        for page_num, text in enumerate(texts):
+            digest = None
+            if len(text.strip()) < Config.PDF_OCR_MIN_TEXT:
+                digest = self._page_digest(pdf_reader.pages[page_num])
+            if digest is None:
+                yield from self._ocr_pages(pdf_reader, pending)
+                pending = []
+                yield text
+                continue
+            
+            with self._lock:
+                cached = self._ocr_page_cache.get(digest)
+                if cached is not None:
+                    self._ocr_page_cache.move_to_end(digest)
+            if cached is not None:
+                yield from self._ocr_pages(pdf_reader, pending)
+                pending = []
+                yield cached or text
+                continue
+            
+            pending.append((page_num, digest, text))
+            if len(pending) >= batch_size:
+                yield from self._ocr_pages(pdf_reader, pending)
+                pending = []
+        yield from self._ocr_pages(pdf_reader, pending)
+    
+    def _ocr_pages(self, pdf_reader: PyPDF2.PdfReader, pages: List[tuple]) -> List[str]:
+        """OCR识别一批扫描页中的图片，返回各页文本"""
+        if not pages:
+            return []
+        images = []
+        owners = []
+        for index, (page_num, _, _) in enumerate(pages):
+            try:
+                for image_file in pdf_reader.pages[page_num].images:
+                    images.append(Image.open(io.BytesIO(image_file.data)))
+                    owners.append(index)
+            except Exception as e:
+                logger.error(f"提取PDF第 {page_num + 1} 页图片失败: {str(e)}")
+        
+        try:
+            recognized = self._get_ocr().recognize_many(images)
+        except Exception as e:
+            logger.error(f"PDF扫描页OCR识别失败: {str(e)}")
+            return [text if text.strip() else OCR_FAILED_MESSAGE for _, _, text in pages]
+        
+        page_texts = [[] for _ in pages]
+        for index, text in zip(owners, recognized):
+            if text:
+                page_texts[index].append(text)
+        
+        results = []
+        with self._lock:
+            for (page_num, digest, text), parts in zip(pages, page_texts):
+                ocr_text = '\n'.join(parts)
+                # 只缓存识别出文字的页面：空结果可能是图片提取或识别的临时失败，下次重试
+                if ocr_text.strip():
+                    self._ocr_page_cache[digest] = ocr_text
+                    self._ocr_page_cache.move_to_end(digest)
+                results.append(ocr_text or text)
+            while len(self._ocr_page_cache) > Config.OCR_PAGE_CACHE_SIZE:
+                self._ocr_page_cache.popitem(last=False)
+        logger.info(f"PDF扫描页OCR：第 {pages[0][0] + 1}-{pages[-1][0] + 1} 页中的 {len(pages)} 页")
+        return results
+    
+    @staticmethod
+    def _page_digest(page) -> Optional[str]:
+        """页面所含图片的哈希（用作OCR结果的缓存键），页面没有图片时返回None"""
+        try:
+            resources = page.get('/Resources')
+            xobjects = resources.get_object().get('/XObject') if resources is not None else None
+            if xobjects is None:
+                return None
+            xobjects = xobjects.get_object()
+            hasher = hashlib.sha256(Config.OCR_LANG.encode('utf-8'))
+            found = False
+            for name in sorted(xobjects):
+                xobject = xobjects[name].get_object()
+                if xobject.get('/Subtype') == '/Image':
+                    hasher.update(xobject.get_data())
+                    found = True
+            return hasher.hexdigest() if found else None
+        except Exception as e:
+            logger.error(f"读取PDF页面图片失败: {str(e)}")
+            return None
+    
+    def _iter_pdf_parallel(self, file_path: str, num_pages: int) -> Iterator[str]:
+        """用本文档专用的进程池逐页并行提取，按页序产出
+
+        每页单独作为一个任务，页面产出后下一页必然已在执行，等待超过 PDF_PAGE_TIMEOUT 秒时
+        终止整个进程池（连同卡住的子进程），该页留空，从下一页起用新的进程池继续。
+        调用方提前停止时同样终止进程池。
+        """
+        page_num = 0
+        while page_num < num_pages:
+            pool = multiprocessing.Pool(min(Config.PDF_WORKERS, num_pages - page_num),
+                                        initializer=_init_pdf_worker, initargs=(file_path,))
+            stuck = False
+            try:
+                results = pool.imap(_extract_pdf_page, range(page_num, num_pages))
+                while page_num < num_pages:
+                    try:
+                        page_text = results.next(timeout=Config.PDF_PAGE_TIMEOUT)
+                    except multiprocessing.TimeoutError:
+                        stuck = True
+                        break
+                    page_num += 1
+                    yield page_text
+            finally:
+                pool.terminate()
+            if stuck:
+                # 超时的页面留空，避免单个异常页面拖住整个上传
+                logger.warning(f"PDF第 {page_num + 1} 页提取超时，已跳过")
+                page_num += 1
+                yield ''
+    
+    def _iter_docx(self, file_path: str) -> Iterator[str]:
+        """逐段落提取Word文档内容"""
+        if Config.STRUCTURED_EXTRACTION:
+            # 按文档顺序提取标题、列表、表格，保留层级
+            yield from iter_docx_blocks(file_path)
+            return
         doc = docx.Document(file_path)
-        content = []
         
         for paragraph in doc.paragraphs:
             if paragraph.text.strip():
-                content.append(paragraph.text)
-        
-        return '\n\n'.join(content)
+                yield paragraph.text
     
-    def _extract_from_pptx(self, file_path: str) -> str:
-        """从PPT提取内容"""
+    def _iter_pptx(self, file_path: str) -> Iterator[str]:
+        """逐张幻灯片提取PPT内容"""
+        if Config.STRUCTURED_EXTRACTION:
+            # 包括组合形状、表格和演讲者备注，要点按段落级别缩进
+            yield from iter_pptx_slides(file_path)
+            return
         prs = Presentation(file_path)
-        content = []
         
         for slide_num, slide in enumerate(prs.slides):
             slide_content = [f"幻灯片 {slide_num + 1}:"]
@@ -101,18 +411,21 @@ class FileHandler:
                     slide_content.append(shape.text)
             
             if len(slide_content) > 1:
-                content.append('\n'.join(slide_content))
-        
-        return '\n\n'.join(content)
+                yield '\n'.join(slide_content)
+    
+    def _get_ocr(self) -> OCREngine:
+        """获取OCR引擎"""
+        with self._lock:
+            if self._ocr is None:
+                self._ocr = OCREngine()
+            return self._ocr
     
     def _extract_from_image(self, file_path: str) -> str:
         """从图片提取内容（OCR）"""
         try:
-            # 打开图片
-            image = Image.open(file_path)
-            
-            # 使用OCR提取文字
-            text = pytesseract.image_to_string(image, lang='chi_sim+eng')
+            # 预处理、切分和识别由OCR引擎完成
+            with Image.open(file_path) as image:
+                text = self._get_ocr().recognize(image)
             
             if not text.strip():
                 return "图片中未检测到文字内容"
@@ -120,20 +433,17 @@ class FileHandler:
             return text
         except Exception as e:
             logger.error(f"OCR识别失败: {str(e)}")
-            return "图片文字识别失败，请确保已安装Tesseract OCR"
-    
-    def cleanup_old_files(self, max_age_hours: int = 24):
-        """清理旧文件"""
-        import time
-        current_time = time.time()
-        
-        for filename in os.listdir(self.upload_folder):
-            file_path = os.path.join(self.upload_folder, filename)
-            if os.path.isfile(file_path):
-                file_age = current_time - os.path.getmtime(file_path)
-                if file_age > max_age_hours * 3600:
-                    try:
-                        os.remove(file_path)
-                        logger.info(f"删除旧文件: {filename}")
-                    except Exception as e:
-                        logger.error(f"删除文件失败: {str(e)}")
\ No newline at end of file
+            return OCR_FAILED_MESSAGE
+    
+    def _iter_image(self, file_path: str) -> Iterator[str]:
+        """图片整体作为一个块"""
+        yield self._extract_from_image(file_path)
+    
+    def ocr_stats(self) -> Optional[dict]:
+        """OCR各阶段耗时统计（尚未使用OCR时为None）"""
+        return self._ocr.stats() if self._ocr is not None else None
+    
+    def forget(self, file_path: str):
+        """文件已被删除（由 StorageJanitor 清理），移除其哈希记录"""
+        with self._lock:
+            self._path_digests.pop(file_path, None)
@@ -1,5 +1,6 @@
 
 import os
+import html
 import json
 import logging
 from typing import Dict, List, Optional
@@ -8,6 +9,8 @@ import matplotlib.patches as mpatches
 from matplotlib.font_manager import FontProperties
 import networkx as nx
 from config import Config
+from modules.mindmap_layout import TreeLayout
+from modules.outline import Outline
 import time
 import re
 import matplotlib
@@ -52,6 +55,28 @@ class MindMapGenerator:
     ]
 }}"""
     
+    def build_skeleton(self, content: str) -> Optional[Outline]:
+        """从文档自带的大纲（标题层级、列表缩进）在本地构建思维导图骨架，没有结构时返回None"""
+        return Outline.parse(content)
+    
+    def build_outline_prompt(self, skeleton: str, content: str) -> str:
+        """已有大纲骨架时的提示词：只需补充要点，不必重新推导结构"""
+        return f"""以下思维导图骨架来自文档自带的标题和列表结构，请结合正文补充完善。
+
+思维导图骨架：
+{skeleton}
+
+正文（骨架中已有的标题和列表项已省略）：
+{content}
+
+要求：
+1. 保持骨架的层次结构和节点名称，不要删除或改写已有节点
+2. 根据正文为相应节点补充子节点（关键概念、结论、例子）
+3. 每个节点的文字要简洁明了
+4. 如果涉及数学公式，请保留原始的LaTeX格式（用$符号包围）
+
+请以与骨架相同的JSON格式输出完整的思维导图结构。"""
+    
     def parse_mindmap_structure(self, response: str) -> Dict:
         """解析思维导图结构"""
         try:
@@ -72,6 +97,33 @@ class MindMapGenerator:
             ]
         }
     
+    def merge_results(self, responses: List[str]) -> str:
+        """合并长文档各分块的思维导图：每块作为一个一级分支"""
+        structures = []
+        for response in responses:
+            json_match = re.search(r'\{[\s\S]*\}', response or '')
+            try:
+                structure = json.loads(json_match.group()) if json_match else None
+            except json.JSONDecodeError:
+                structure = None
+            if isinstance(structure, dict):
+                structures.append(structure)
+            else:
+                logger.warning("分块思维导图解析失败，已跳过")
+        
+        if not structures:
+            return responses[0] if responses else ''
+        if len(structures) == 1:
+            return json.dumps(structures[0], ensure_ascii=False, indent=2)
+        merged = {
+            "title": structures[0].get('title', '主题'),
+            "children": [
+                {"name": structure.get('title', f'第{index + 1}部分'), "children": structure.get('children', [])}
+                for index, structure in enumerate(structures)
+            ]
+        }
+        return json.dumps(merged, ensure_ascii=False, indent=2)
+    
     def process_math_text(self, text: str) -> tuple:
         """处理包含数学公式的文本，返回处理后的文本和是否包含数学公式"""
         # 检查是否包含数学公式
@@ -110,98 +162,63 @@ class MindMapGenerator:
                 return '\n'.join([text[i:i+max_width] for i in range(0, len(text), max_width)])
             return text
     
-    def generate_mindmap_image(self, response: str) -> str:
-        """生成思维导图图片"""
+    def generate_mindmap_image(self, response: str, name: Optional[str] = None) -> str:
+        """生成思维导图图片（name 为不含扩展名的文件名）"""
+        if name is None:
+            timestamp = str(int(time.time()))
+            name = f"mindmap_{timestamp}"
+        
+        if Config.MINDMAP_RENDERER == 'svg':
+            return self.generate_mindmap_svg(response, name)
+        
         try:
             # 解析结构
             structure = self.parse_mindmap_structure(response)
             
-            # 创建图形，增大图形尺寸以容纳更多内容
-            fig = plt.figure(figsize=(20, 16))
-            ax = fig.add_subplot(111)
-            
             # 创建有向图
             G = nx.Graph()
             
-            # 递归构建图
+            # 构建图
             node_info = {}  # 存储节点的额外信息
-            self._build_graph(G, structure, node_info)
+            nodes = self._build_graph(G, structure, node_info)
             
-            # 使用分层布局
-            pos = self._hierarchical_layout(G, structure)
+            # 使用整洁树布局（坐标单位为磅）
+            boxes = {node_id: self._node_box(label, level) for node_id, label, level, _ in nodes}
+            pos = self._hierarchical_layout(nodes, boxes)
+            min_x, max_x, min_y, max_y = self._layout_extents(pos, boxes)
             
-            # 设置节点大小和颜色
-            node_sizes = []
-            node_colors = []
-            for node in G.nodes():
-                level = G.nodes[node].get('level', 0)
-                # 根据层级设置大小
-                size = 8000 - level * 1200
-                node_sizes.append(max(size, 3000))
-                # 根据层级设置颜色
-                colors = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#f9ca24', '#6c5ce7', '#fd79a8']
-                node_colors.append(colors[level % len(colors)])
+            # 图形尺寸按内容计算，坐标轴铺满画布，使1个数据单位等于1磅
+            fig = plt.figure(figsize=(max(max_x - min_x, 288) / 72, max(max_y - min_y, 216) / 72))
+            ax = fig.add_axes([0, 0, 1, 1])
             
             # 绘制边
             nx.draw_networkx_edges(G, pos, edge_color='#ddd', width=2, alpha=0.6, ax=ax)
             
-            # 绘制节点
-            nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=node_sizes, alpha=0.9, ax=ax)
-            
-            # 绘制标签（支持数学公式）
-            labels = nx.get_node_attributes(G, 'label')
+            # 绘制标签（支持数学公式），节点用带层级颜色的文本框表示
+            colors = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#f9ca24', '#6c5ce7', '#fd79a8']
             for node, (x, y) in pos.items():
-                label = labels[node]
-                has_math = '$' in label
-                
-                # 智能换行
-                wrapped_label = self.wrap_text(label, max_width=20)
-                
-                # 根据节点层级调整字体大小
                 level = G.nodes[node].get('level', 0)
-                fontsize = 14 - level * 2
-                fontsize = max(fontsize, 8)
-                
-                # 绘制文本
-                if has_math:
-                    # 包含数学公式的文本
-                    ax.text(x, y, wrapped_label, 
-                           horizontalalignment='center',
-                           verticalalignment='center',
-                           fontsize=fontsize,
-                           fontfamily='SimHei',
-                           bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.8),
-                           wrap=True)
-                else:
-                    # 普通文本
-                    ax.text(x, y, wrapped_label,
-                           horizontalalignment='center',
-                           verticalalignment='center',
-                           fontsize=fontsize,
-                           fontfamily='SimHei',
-                           bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.8),
-                           wrap=True)
+                _, _, fontsize, lines = boxes[node]
+                ax.text(x, y, '\n'.join(lines),
+                       horizontalalignment='center',
+                       verticalalignment='center',
+                       fontsize=fontsize,
+                       fontfamily='SimHei',
+                       bbox=dict(boxstyle='round,pad=0.5', facecolor=colors[level % len(colors)], alpha=0.3))
             
             # 设置图形属性
-            ax.set_xlim(min(x for x, y in pos.values()) - 2, max(x for x, y in pos.values()) + 2)
-            ax.set_ylim(min(y for x, y in pos.values()) - 2, max(y for x, y in pos.values()) + 2)
+            ax.set_xlim(min_x, max_x)
+            ax.set_ylim(min_y, max_y)
             ax.axis('off')
             
-            # 添加标题（如果有的话）
-            if 'title' in structure:
-                fig.suptitle(structure['title'], fontsize=20, fontfamily='SimHei', y=0.98)
-            
-            plt.tight_layout()
-            
             # 保存图片
-            timestamp = str(int(time.time()))
-            filename = f"mindmap_{timestamp}.png"
+            filename = f"{name}.png"
             filepath = os.path.join(Config.OUTPUT_FOLDER, filename)
             
             plt.savefig(filepath, dpi=300, bbox_inches='tight', 
                        facecolor='white', edgecolor='none',
                        pad_inches=0.5)
-            plt.close()
+            plt.close(fig)
             
             logger.info(f"思维导图已保存到: {filepath}")
             return f"/outputs/{filename}"
@@ -212,71 +229,166 @@ class MindMapGenerator:
             logger.error(traceback.format_exc())
             return None
     
-    def _build_graph(self, G, node, node_info, parent=None, level=0):
-        """递归构建图"""
-        # 确定节点ID和标签
-        if parent is None:
-            node_id = "root"
-            label = node.get('title', '主题')
-        else:
-            node_id = f"node_{len(G.nodes)}"
-            label = node.get('name', '')
-        
-        # 处理数学公式
-        processed_label, has_math = self.process_math_text(label)
-        
-        # 添加节点
-        G.add_node(node_id, label=processed_label, level=level, has_math=has_math)
-        node_info[node_id] = {'has_math': has_math}
-        
-        # 添加边
-        if parent:
-            G.add_edge(parent, node_id)
-        
-        # 递归处理子节点
-        if 'children' in node and node['children']:
-            for child in node['children']:
-                self._build_graph(G, child, node_info, node_id, level + 1)
+    SVG_COLORS = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#f9ca24', '#6c5ce7', '#fd79a8']
     
-    def _hierarchical_layout(self, G, root_structure):
-        """创建分层布局"""
-        pos = {}
-        
-        def _assign_positions(node_id, structure, x=0, y=0, layer=0, parent_x=0, sibling_index=0, num_siblings=1):
-            pos[node_id] = (x, y)
+    def generate_mindmap_svg(self, response: str, name: str) -> Optional[str]:
+        """直接从结构生成SVG思维导图（不依赖matplotlib）
+
+        数学公式原样保留在 foreignObject 中，由页面上的MathJax排版。
+        """
+        try:
+            structure = self.parse_mindmap_structure(response)
+            nodes = self._flatten_structure(structure)
+            boxes = {node_id: self._node_box(label, level) for node_id, label, level, _ in nodes}
+            pos = self._hierarchical_layout(nodes, boxes)
+            min_x, max_x, min_y, max_y = self._layout_extents(pos, boxes)
             
-            children = structure.get('children', [])
-            if not children:
-                return
+            def _point(node_id):
+                # SVG的y轴向下
+                x, y = pos[node_id]
+                return x - min_x, max_y - y
             
-            # 计算子节点的间距
-            num_children = len(children)
-            if num_children == 0:
-                return
+            width, height = max_x - min_x, max_y - min_y
+            parts = [
+                f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+                f'viewBox="0 0 {width:.0f} {height:.0f}" font-family="{Config.MINDMAP_FONT}, sans-serif">',
+                '<rect width="100%" height="100%" fill="white"/>'
+            ]
             
-            # 根据层级调整水平间距
-            if layer == 0:
-                h_spacing = 6.0
-            elif layer == 1:
-                h_spacing = 3.0
-            else:
-                h_spacing = 1.5
+            # 绘制边
+            for node_id, _, _, parent_id in nodes:
+                if parent_id is None:
+                    continue
+                parts.append(self._svg_edge(_point(parent_id), boxes[parent_id], _point(node_id), boxes[node_id]))
+            
+            # 绘制节点
+            for node_id, label, level, _ in nodes:
+                x, y = _point(node_id)
+                box_width, box_height, fontsize, lines = boxes[node_id]
+                color = self.SVG_COLORS[level % len(self.SVG_COLORS)]
+                left, top = x - box_width / 2, y - box_height / 2
+                parts.append(
+                    f'<rect x="{left:.1f}" y="{top:.1f}" width="{box_width:.1f}" height="{box_height:.1f}" '
+                    f'rx="10" fill="{color}" fill-opacity="0.15" stroke="{color}" stroke-width="2"/>'
+                )
+                if '$' in label:
+                    # 含公式的标签交给MathJax排版
+                    parts.append(
+                        f'<foreignObject x="{left:.1f}" y="{top:.1f}" width="{box_width:.1f}" height="{box_height:.1f}">'
+                        f'<div xmlns="http://www.w3.org/1999/xhtml" style="font-size:{fontsize}px;'
+                        f'text-align:center;padding:8px 12px;">{html.escape(label)}</div></foreignObject>'
+                    )
+                else:
+                    first_y = y - (len(lines) - 1) * fontsize * 1.3 / 2
+                    tspans = ''.join(
+                        f'<tspan x="{x:.1f}" y="{first_y + i * fontsize * 1.3:.1f}">{html.escape(line)}</tspan>'
+                        for i, line in enumerate(lines)
+                    )
+                    parts.append(
+                        f'<text font-size="{fontsize}" text-anchor="middle" dominant-baseline="central">{tspans}</text>'
+                    )
             
-            # 计算子节点的起始x位置
-            total_width = (num_children - 1) * h_spacing
-            start_x = x - total_width / 2
+            parts.append('</svg>')
             
-            # 递归处理子节点
-            for i, child in enumerate(children):
-                child_x = start_x + i * h_spacing
-                child_y = y - 2.0  # 垂直间距
-                child_id = f"node_{len(pos)}"
-                _assign_positions(child_id, child, child_x, child_y, layer + 1, x, i, num_children)
+            filename = f"{name}.svg"
+            filepath = os.path.join(Config.OUTPUT_FOLDER, filename)
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(parts))
+            
+            logger.info(f"思维导图已保存到: {filepath}")
+            return f"/outputs/{filename}"
+        
+        except Exception as e:
+            logger.error(f"生成SVG思维导图失败: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return None
+    
+    def _svg_edge(self, parent_point, parent_box, child_point, child_box) -> str:
+        """生成连接父子节点的SVG路径"""
+        (px, py), (cx, cy) = parent_point, child_point
+        if Config.MINDMAP_LAYOUT == 'radial':
+            # 放射布局用直线连接中心，节点框会覆盖线段端点
+            return f'<path d="M{px:.1f},{py:.1f} L{cx:.1f},{cy:.1f}" stroke="#ccc" stroke-width="2"/>'
+        if Config.MINDMAP_LAYOUT == 'left-right':
+            px += parent_box[0] / 2
+            cx -= child_box[0] / 2
+            mid = (px + cx) / 2
+            return (f'<path d="M{px:.1f},{py:.1f} C{mid:.1f},{py:.1f} {mid:.1f},{cy:.1f} {cx:.1f},{cy:.1f}" '
+                    f'fill="none" stroke="#ccc" stroke-width="2"/>')
+        py += parent_box[1] / 2
+        cy -= child_box[1] / 2
+        mid = (py + cy) / 2
+        return (f'<path d="M{px:.1f},{py:.1f} C{px:.1f},{mid:.1f} {cx:.1f},{mid:.1f} {cx:.1f},{cy:.1f}" '
+                f'fill="none" stroke="#ccc" stroke-width="2"/>')
+    
+    def _node_box(self, label: str, level: int) -> tuple:
+        """测量节点框尺寸，返回 (宽, 高, 字号, 换行后的各行)，单位为磅/像素"""
+        fontsize = max(16 - level * 2, 10)
+        lines = self.wrap_text(label, max_width=12).split('\n')
+        width = max(self._text_width(line) for line in lines) * fontsize + 24
+        height = len(lines) * fontsize * 1.3 + 16
+        return width, height, fontsize, lines
+    
+    @staticmethod
+    def _layout_extents(pos: Dict, boxes: Dict, margin: float = 40) -> tuple:
+        """计算包含所有节点框的坐标范围 (min_x, max_x, min_y, max_y)"""
+        min_x = min(x - boxes[node_id][0] / 2 for node_id, (x, y) in pos.items()) - margin
+        max_x = max(x + boxes[node_id][0] / 2 for node_id, (x, y) in pos.items()) + margin
+        min_y = min(y - boxes[node_id][1] / 2 for node_id, (x, y) in pos.items()) - margin
+        max_y = max(y + boxes[node_id][1] / 2 for node_id, (x, y) in pos.items()) + margin
+        return min_x, max_x, min_y, max_y
+    
+    @staticmethod
+    def _text_width(text: str) -> float:
+        """估算文本宽度（以字号为单位，中文按1个字宽，其他字符按0.6个字宽）"""
+        return sum(1.0 if ord(ch) > 0x2E7F else 0.6 for ch in text)
+    
+    def _flatten_structure(self, structure: Dict) -> List[tuple]:
+        """按前序遍历展开结构，返回 [(node_id, label, level, parent_id)]
+
+        这是节点ID的唯一来源（建图、布局和渲染共用）：根节点为 root，其余为 node_{前序序号}。
+        """
+        nodes = []
         
-        # 从根节点开始分配位置
-        _assign_positions("root", root_structure)
+        def _visit(node, parent_id, level):
+            if parent_id is None:
+                node_id = "root"
+                label = node.get('title', '主题')
+            else:
+                node_id = f"node_{len(nodes)}"
+                label = node.get('name', '')
+            nodes.append((node_id, label, level, parent_id))
+            for child in node.get('children') or []:
+                _visit(child, node_id, level + 1)
         
-        return pos
+        _visit(structure, None, 0)
+        return nodes
+    
+    def _build_graph(self, G, structure, node_info) -> List[tuple]:
+        """构建图，节点ID与布局共用 _flatten_structure 的编号，返回展开的节点列表"""
+        nodes = self._flatten_structure(structure)
+        for node_id, label, level, parent_id in nodes:
+            # 处理数学公式
+            processed_label, has_math = self.process_math_text(label)
+            
+            # 添加节点
+            G.add_node(node_id, label=processed_label, level=level, has_math=has_math)
+            node_info[node_id] = {'has_math': has_math}
+            
+            # 添加边
+            if parent_id is not None:
+                G.add_edge(parent_id, node_id)
+        return nodes
+    
+    def _hierarchical_layout(self, nodes: List[tuple], boxes: Dict) -> Dict:
+        """整洁树布局（线性时间），按节点实际尺寸计算间距
+
+        nodes 来自 _flatten_structure，boxes 来自 _node_box。
+        """
+        sizes = {node_id: boxes[node_id][:2] for node_id, _, _, _ in nodes}
+        layout = TreeLayout(Config.MINDMAP_LAYOUT)
+        return layout.layout([(node_id, parent_id) for node_id, _, _, parent_id in nodes], sizes)
 
 
 class NoteGenerator:
@@ -304,6 +416,10 @@ class NoteGenerator:
 
 请生成结构化的学习笔记。"""
     
+    def merge_results(self, responses: List[str]) -> str:
+        """合并长文档各分块的笔记（按原文顺序）"""
+        return '\n\n---\n\n'.join(response.strip() for response in responses if response and response.strip())
+    
     def format_notes(self, response: str) -> str:
         """格式化笔记内容"""
         # 确保响应使用正确的Markdown格式
@@ -378,6 +494,32 @@ class QuizGenerator:
 
 请生成5-10道高质量的复习题。"""
     
+    def merge_results(self, responses: List[str]) -> str:
+        """合并长文档各分块的复习题：同类题目归入同一节并重新编号"""
+        sections = {}
+        for response in responses:
+            current = None
+            for line in (response or '').splitlines():
+                heading = re.match(r'^##\s+(.+?)\s*$', line)
+                if heading:
+                    current = sections.setdefault(heading.group(1), {'lines': [], 'count': 0})
+                    continue
+                if current is None:
+                    continue
+                number = re.match(r'^\d+\.(\s)', line)
+                if number:
+                    current['count'] += 1
+                    line = f"{current['count']}.{line[number.end() - 1:]}"
+                current['lines'].append(line)
+        
+        if not sections:
+            return '\n\n---\n\n'.join(response.strip() for response in responses if response and response.strip())
+        parts = []
+        for title, section in sections.items():
+            body = '\n'.join(section['lines']).strip()
+            parts.append(f"## {title}\n\n{body}")
+        return '\n\n'.join(parts)
+    
     def format_quiz(self, response: str) -> str:
         """格式化复习题"""
         # 可以添加额外的格式化逻辑
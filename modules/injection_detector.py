@@ -0,0 +1,90 @@
+import re
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 规则：(名称, 各步骤可接受的词, 相邻步骤之间允许的最大字符间隔；None表示同一行内不限)
+INJECTION_RULES = [
+    ('ignore_previous_instructions', [
+        {'ignore', 'ignores', 'ignored', 'ignoring', 'forget', 'forgets', 'forgetting',
+         'disregard', 'disregards', 'disregarded', 'disregarding'},
+        {'previous'},
+        {'instructions', 'instruction'}
+    ], 60),
+    ('you_are_now', [{'you'}, {'are'}, {'now'}], 60),
+    ('pretend_to_be', [{'pretend', 'pretends', 'pretending'}, {'to'}, {'be'}], 60),
+    ('act_as_if', [{'act', 'acts', 'acting'}, {'as'}, {'if'}], 60),
+    ('system_prompt', [{'system'}, {'prompt', 'prompts'}], 60),
+    ('reveal_instructions', [{'reveal', 'reveals', 'revealing'}, {'instructions', 'instruction'}], 60),
+    ('script_tag', [{'<script'}, {'</script'}], None),
+    ('code_call', [{'call('}], None),
+]
+
+
+class InjectionDetector:
+    """指令注入检测器
+
+    所有规则编译为一个只识别关键词的正则（无嵌套量词，不会回溯爆炸），
+    再用每条规则的“最近一次匹配位置”状态单遍推进，耗时与输入长度成线性关系。
+    与原先 .* 连接的正则相比，相邻关键词之间的距离有上限，且不跨行。
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, List[set], Optional[int]]] = INJECTION_RULES):
+        self.rules = list(rules)
+
+        # 关键词 -> [(规则序号, 步骤序号)]，步骤按降序排列，保证一个词不会同时推进同一规则的相邻两步
+        self._index: Dict[str, List[Tuple[int, int]]] = {}
+        words = set()
+        for rule_index, (_, steps, _) in enumerate(self.rules):
+            for step_index, alternatives in enumerate(steps):
+                for word in alternatives:
+                    self._index.setdefault(word, []).append((rule_index, step_index))
+                    if word[0].isalpha():
+                        words.add(word)
+        for entries in self._index.values():
+            entries.sort(key=lambda entry: -entry[1])
+
+        alternation = '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+        self._pattern = re.compile(
+            r'(?P<call>\b(?:javascript|eval|exec)\s*\()'
+            r'|(?P<close></\s*script\b)'
+            r'|(?P<open><\s*script\b)'
+            rf'|\b(?P<word>{alternation})\b'
+            r'|(?P<newline>\n)',
+            re.IGNORECASE
+        )
+
+    def detect(self, content: str) -> Optional[str]:
+        """返回命中的规则名，未命中返回None"""
+        # states[规则][步骤] = 该步骤最近一次完成时的结束位置
+        states = [[None] * len(steps) for _, steps, _ in self.rules]
+        for match in self._pattern.finditer(content):
+            kind = match.lastgroup
+            if kind == 'newline':
+                # 原规则中的 . 不匹配换行，换行后重新开始
+                states = [[None] * len(steps) for _, steps, _ in self.rules]
+                continue
+            if kind == 'call':
+                key = 'call('
+            elif kind == 'open':
+                key = '<script'
+            elif kind == 'close':
+                key = '</script'
+            else:
+                key = match.group().lower()
+
+            start, end = match.span()
+            for rule_index, step_index in self._index.get(key, ()):
+                rule_state = states[rule_index]
+                if step_index > 0:
+                    previous_end = rule_state[step_index - 1]
+                    if previous_end is None:
+                        continue
+                    gap = self.rules[rule_index][2]
+                    if gap is not None and start - previous_end > gap:
+                        continue
+                rule_state[step_index] = end
+                if step_index == len(rule_state) - 1:
+                    return self.rules[rule_index][0]
+        return None
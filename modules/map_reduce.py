@@ -0,0 +1,54 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+from config import Config
+from modules.api_client import SYSTEM_PROMPT
+
+logger = logging.getLogger(__name__)
+
+
+class MapReduceRunner:
+    """长文档分块生成：各分块的提示词在有界线程池中并发调用API
+
+    总耗时约等于最慢的一块，而不是各块之和；合并（reduce）由各生成器的 merge_results 完成。
+    每块使用流式接口收集完整结果：流式读取只限制两次读取之间的间隔，
+    长回复不会因非流式请求的读取超时而被整块重发。
+    """
+
+    def __init__(self, api_client, budget=None, max_workers: int = Config.MAP_REDUCE_WORKERS):
+        self.api_client = api_client
+        # PromptBudget，用于计算每块的输出token上限
+        self.budget = budget
+        # 所有请求共享线程池，限制同时发往API的分块请求数
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='map-reduce')
+
+    def _complete(self, prompt: str, cancelled: threading.Event) -> Optional[str]:
+        """流式生成一个分块并收集结果；cancelled 置位后停止读取并关闭连接，返回None"""
+        max_tokens = self.budget.completion_budget(prompt, SYSTEM_PROMPT) if self.budget is not None else None
+        if cancelled.is_set():
+            return None
+        parts = []
+        stream = self.api_client.stream_completion(prompt, max_tokens=max_tokens)
+        try:
+            for chunk in stream:
+                if cancelled.is_set():
+                    return None
+                parts.append(chunk)
+        finally:
+            stream.close()
+        return ''.join(parts)
+
+    def run(self, prompts: List[str]) -> Iterator[Tuple[int, str]]:
+        """按完成顺序产出 (分块序号, 结果)，任一分块失败时停止其余分块并抛出异常"""
+        cancelled = threading.Event()
+        futures = {self._executor.submit(self._complete, prompt, cancelled): index
+                   for index, prompt in enumerate(prompts)}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # 失败或客户端断开时，尚未开始的分块不再请求，正在生成的分块在读到下一个片段时中止
+            cancelled.set()
+            for future in futures:
+                future.cancel()
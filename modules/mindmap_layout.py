@@ -0,0 +1,213 @@
+import math
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _LayoutNode:
+    """布局计算用的树节点"""
+
+    __slots__ = ('node_id', 'parent', 'children', 'number', 'depth', 'breadth',
+                 'prelim', 'mod', 'shift', 'change', 'thread', 'ancestor', 'x')
+
+    def __init__(self, node_id: str, breadth: float, depth: int, parent=None, number: int = 1):
+        self.node_id = node_id
+        self.parent = parent
+        self.children = []
+        self.number = number  # 在兄弟节点中的序号（从1开始）
+        self.depth = depth
+        self.breadth = breadth  # 节点在兄弟排列方向上的尺寸
+        self.prelim = 0.0
+        self.mod = 0.0
+        self.shift = 0.0
+        self.change = 0.0
+        self.thread = None
+        self.ancestor = self
+        self.x = 0.0
+
+    def left_sibling(self):
+        if self.parent is None or self.number == 1:
+            return None
+        return self.parent.children[self.number - 2]
+
+    def leftmost_sibling(self):
+        if self.parent is None or self.number == 1:
+            return None
+        return self.parent.children[0]
+
+    def next_left(self):
+        return self.children[0] if self.children else self.thread
+
+    def next_right(self):
+        return self.children[-1] if self.children else self.thread
+
+
+class TreeLayout:
+    """整洁树布局（Reingold–Tilford / Walker算法，Buchheim线性时间实现）
+
+    子树间距由节点的实际尺寸决定，支持 top-down（自上而下）、
+    left-right（从左到右）和 radial（放射状）三种模式。
+    """
+
+    MODES = ('top-down', 'left-right', 'radial')
+
+    def __init__(self, mode: str = 'top-down', sibling_gap: float = 20.0, level_gap: float = 60.0):
+        if mode not in self.MODES:
+            logger.warning(f"未知的布局模式 {mode}，使用 top-down")
+            mode = 'top-down'
+        self.mode = mode
+        self.sibling_gap = sibling_gap
+        self.level_gap = level_gap
+
+    def layout(self, nodes: List[Tuple[str, Optional[str]]],
+               sizes: Dict[str, Tuple[float, float]]) -> Dict[str, Tuple[float, float]]:
+        """计算节点中心坐标
+
+        nodes 为前序排列的 (node_id, parent_id) 列表，sizes 为节点的 (宽, 高)。
+        返回 {node_id: (x, y)}，y轴向上为正，根节点位于原点附近。
+        """
+        if not nodes:
+            return {}
+
+        # 兄弟节点沿宽度方向排列（left-right 模式沿高度方向）
+        breadth_index = 1 if self.mode == 'left-right' else 0
+        tree = {}
+        root = None
+        for node_id, parent_id in nodes:
+            breadth = sizes[node_id][breadth_index]
+            if parent_id is None:
+                root = tree[node_id] = _LayoutNode(node_id, breadth, 0)
+            else:
+                parent = tree[parent_id]
+                node = _LayoutNode(node_id, breadth, parent.depth + 1, parent, len(parent.children) + 1)
+                parent.children.append(node)
+                tree[node_id] = node
+
+        self._first_walk(root)
+        self._second_walk(root, -root.prelim)
+
+        # 每层在深度方向上的偏移量取该层节点的最大尺寸
+        depth_index = 0 if self.mode == 'left-right' else 1
+        max_depth = max(node.depth for node in tree.values())
+        level_size = [0.0] * (max_depth + 1)
+        for node_id, node in tree.items():
+            level_size[node.depth] = max(level_size[node.depth], sizes[node_id][depth_index])
+        offsets = [0.0]
+        for depth in range(1, max_depth + 1):
+            offsets.append(offsets[-1] + (level_size[depth - 1] + level_size[depth]) / 2 + self.level_gap)
+
+        if self.mode == 'top-down':
+            return {node_id: (node.x, -offsets[node.depth]) for node_id, node in tree.items()}
+        if self.mode == 'left-right':
+            return {node_id: (offsets[node.depth], -node.x) for node_id, node in tree.items()}
+        return self._radial(tree, level_size, max_depth)
+
+    def _radial(self, tree: Dict[str, _LayoutNode], level_size: List[float], max_depth: int):
+        """把自上而下的布局映射为极坐标：横坐标对应角度，深度对应半径"""
+        if max_depth == 0:
+            return {node_id: (0.0, 0.0) for node_id in tree}
+        xs = [node.x for node in tree.values()]
+        min_x = min(xs)
+        # 首尾节点之间也保留一个间距，避免重叠
+        span = max(xs) - min_x + self.sibling_gap + max(node.breadth for node in tree.values())
+        # 半径保证最外层的周长能容纳所有节点
+        ring = max(max(level_size) + self.level_gap, span / (2 * math.pi * max_depth))
+        pos = {}
+        for node_id, node in tree.items():
+            angle = 2 * math.pi * (node.x - min_x) / span
+            radius = node.depth * ring
+            pos[node_id] = (radius * math.cos(angle), radius * math.sin(angle))
+        return pos
+
+    def _separation(self, left: _LayoutNode, right: _LayoutNode) -> float:
+        return (left.breadth + right.breadth) / 2 + self.sibling_gap
+
+    def _first_walk(self, v: _LayoutNode):
+        """后序遍历确定初步位置（递归深度等于树高）"""
+        w = v.left_sibling()
+        if not v.children:
+            v.prelim = w.prelim + self._separation(w, v) if w is not None else 0.0
+            return
+
+        default_ancestor = v.children[0]
+        for child in v.children:
+            self._first_walk(child)
+            default_ancestor = self._apportion(child, default_ancestor)
+        self._execute_shifts(v)
+
+        midpoint = (v.children[0].prelim + v.children[-1].prelim) / 2
+        if w is not None:
+            v.prelim = w.prelim + self._separation(w, v)
+            v.mod = v.prelim - midpoint
+        else:
+            v.prelim = midpoint
+
+    def _apportion(self, v: _LayoutNode, default_ancestor: _LayoutNode) -> _LayoutNode:
+        """把 v 的子树与左侧兄弟子树的轮廓分开"""
+        w = v.left_sibling()
+        if w is None:
+            return default_ancestor
+
+        vip = vop = v
+        vim = w
+        vom = vip.leftmost_sibling()
+        sip, sop, sim, som = vip.mod, vop.mod, vim.mod, vom.mod
+        while vim.next_right() is not None and vip.next_left() is not None:
+            vim = vim.next_right()
+            vip = vip.next_left()
+            vom = vom.next_left()
+            vop = vop.next_right()
+            vop.ancestor = v
+            shift = (vim.prelim + sim) - (vip.prelim + sip) + self._separation(vim, vip)
+            if shift > 0:
+                self._move_subtree(self._ancestor(vim, v, default_ancestor), v, shift)
+                sip += shift
+                sop += shift
+            sim += vim.mod
+            sip += vip.mod
+            som += vom.mod
+            sop += vop.mod
+
+        if vim.next_right() is not None and vop.next_right() is None:
+            vop.thread = vim.next_right()
+            vop.mod += sim - sop
+        if vip.next_left() is not None and vom.next_left() is None:
+            vom.thread = vip.next_left()
+            vom.mod += sip - som
+            default_ancestor = v
+        return default_ancestor
+
+    @staticmethod
+    def _ancestor(vim: _LayoutNode, v: _LayoutNode, default_ancestor: _LayoutNode) -> _LayoutNode:
+        if vim.ancestor.parent is v.parent:
+            return vim.ancestor
+        return default_ancestor
+
+    @staticmethod
+    def _move_subtree(wm: _LayoutNode, wp: _LayoutNode, shift: float):
+        subtrees = wp.number - wm.number
+        wp.change -= shift / subtrees
+        wp.shift += shift
+        wm.change += shift / subtrees
+        wp.prelim += shift
+        wp.mod += shift
+
+    @staticmethod
+    def _execute_shifts(v: _LayoutNode):
+        shift = 0.0
+        change = 0.0
+        for w in reversed(v.children):
+            w.prelim += shift
+            w.mod += shift
+            change += w.change
+            shift += w.shift + change
+
+    @staticmethod
+    def _second_walk(root: _LayoutNode, m: float):
+        stack = [(root, m)]
+        while stack:
+            node, offset = stack.pop()
+            node.x = node.prelim + offset
+            for child in node.children:
+                stack.append((child, offset + node.mod))
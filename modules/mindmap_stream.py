@@ -0,0 +1,134 @@
+import json
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalMindmapParser:
+    """增量解析流式返回的思维导图JSON
+
+    逐片段喂入模型输出，每当一个节点对象闭合时产出一个节点事件，
+    根对象闭合后即可取得完整结构，无需等待后续的多余输出。
+    JSON之前的说明文字（包括其中的花括号）会被跳过。
+    """
+
+    def __init__(self):
+        self._buffer = []  # 从根对象起始处开始缓存的字符
+        self._stack = []  # 未闭合的容器
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self.structure: Optional[Dict] = None
+
+    @property
+    def done(self) -> bool:
+        """根对象是否已解析完成"""
+        return self.structure is not None
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """喂入一个文本片段，返回本片段中闭合的节点 [{'path': [...], 'name': ...}]"""
+        events = []
+        if self.done:
+            return events
+
+        for ch in chunk:
+            if not self._stack:
+                # 尚未进入JSON，等待根对象的左花括号
+                if ch == '{':
+                    self._buffer = []
+                    self._open('{', path=[])
+                    self._buffer.append(ch)
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._on_string_end()
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = len(self._buffer) - 1
+            elif ch == '{' or ch == '[':
+                self._open(ch)
+            elif ch == '}' or ch == ']':
+                event = self._close(ch)
+                if event is not None:
+                    events.append(event)
+                if self.done:
+                    break
+            elif ch == ':' and self._stack[-1]['type'] == '{':
+                self._stack[-1]['expect_key'] = False
+            elif ch == ',' and self._stack[-1]['type'] == '{':
+                self._stack[-1]['expect_key'] = True
+
+        return events
+
+    def _open(self, ch: str, path: Optional[List[int]] = None):
+        parent = self._stack[-1] if self._stack else None
+        frame = {
+            'type': ch,
+            'start': len(self._buffer) if parent is None else len(self._buffer) - 1,
+            'path': path,
+            'key': None,
+            'expect_key': True,
+            'count': 0,
+            'is_children': False
+        }
+        if parent is not None:
+            if parent['type'] == '{' and ch == '[':
+                # 记录数组属于哪个键，只有 children 数组里的对象才是节点
+                frame['is_children'] = parent['key'] == 'children'
+                frame['path'] = parent['path']
+            elif parent['type'] == '[' and ch == '{' and parent['is_children'] and parent['path'] is not None:
+                frame['path'] = parent['path'] + [parent['count']]
+            if parent['type'] == '[':
+                parent['count'] += 1
+        self._stack.append(frame)
+
+    def _on_string_end(self):
+        frame = self._stack[-1]
+        if frame['type'] == '{' and frame['expect_key']:
+            try:
+                frame['key'] = json.loads(''.join(self._buffer[self._string_start:]))
+            except json.JSONDecodeError:
+                frame['key'] = None
+
+    def _close(self, ch: str) -> Optional[Dict]:
+        frame = self._stack.pop()
+        expected = '}' if frame['type'] == '{' else ']'
+        if ch != expected:
+            # 括号不匹配，放弃当前解析，等待下一个根对象
+            self._reset()
+            return None
+        if frame['type'] != '{' or frame['path'] is None:
+            return None
+
+        text = ''.join(self._buffer[frame['start']:])
+        try:
+            node = json.loads(text)
+        except json.JSONDecodeError:
+            if not self._stack:
+                # 根对象无效（例如说明文字里的花括号），继续寻找下一个
+                self._reset()
+            return None
+        if not isinstance(node, dict):
+            return None
+
+        if not self._stack:
+            self.structure = node
+            self._buffer = []
+            return {'path': [], 'name': node.get('title', '主题')}
+        return {'path': frame['path'], 'name': node.get('name', '')}
+
+    def _reset(self):
+        self._stack = []
+        self._buffer = []
+        self._in_string = False
+        self._escape = False
@@ -0,0 +1,209 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from PIL import Image, ImageOps
+import pytesseract
+from config import Config
+
+try:
+    import tesserocr
+except ImportError:  # 可选：进程内常驻的Tesseract，语言模型只加载一次
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+if Config.TESSERACT_CMD and os.path.exists(Config.TESSERACT_CMD):
+    pytesseract.pytesseract.tesseract_cmd = Config.TESSERACT_CMD
+
+# 图片没有DPI信息时，长边超过该像素数才缩小（约A4纸300DPI的长边）
+MAX_SIDE_WITHOUT_DPI = 3600
+# 行平均亮度不低于该值视为空白行（可以在此处切分）
+BLANK_ROW_LEVEL = 250
+
+STAGES = ('preprocess', 'recognize', 'total')
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    """按灰度直方图计算Otsu二值化阈值"""
+    total = sum(histogram)
+    weighted_total = sum(i * count for i, count in enumerate(histogram))
+    background = 0
+    weighted_background = 0
+    best_threshold, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += level * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+    return best_threshold
+
+
+def prepare_image(image: Image.Image, target_dpi: int = Config.OCR_TARGET_DPI,
+                  binarize: bool = Config.OCR_BINARIZE) -> Image.Image:
+    """OCR前的预处理：校正方向、转灰度、缩放到目标DPI、二值化"""
+    dpi = image.info.get('dpi')
+    image = ImageOps.exif_transpose(image).convert('L')
+
+    scale = 1.0
+    if dpi and dpi[0] and dpi[0] > 1:
+        # 高于目标DPI的扫描件缩小（识别率不变，耗时大幅下降），过低的放大到目标DPI
+        scale = target_dpi / float(dpi[0])
+    elif max(image.size) > MAX_SIDE_WITHOUT_DPI:
+        scale = MAX_SIDE_WITHOUT_DPI / max(image.size)
+    scale = min(scale, 2.0)
+    if abs(scale - 1.0) > 0.05:
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+
+    if binarize:
+        threshold = _otsu_threshold(image.histogram())
+        image = image.point([0] * (threshold + 1) + [255] * (255 - threshold))
+    return image
+
+
+def split_tiles(image: Image.Image, tile_height: int = Config.OCR_TILE_HEIGHT) -> List[Image.Image]:
+    """把长图按水平条带切分，切分位置选在空白行上，避免切断文字行"""
+    if tile_height <= 0 or image.height <= tile_height * 1.5:
+        return [image]
+
+    # 每行的平均亮度（灰度图缩放到1像素宽，每个字节对应一行）
+    rows = image.convert('L').resize((1, image.height), Image.BOX).tobytes()
+    window = tile_height // 4
+    cuts = [0]
+    while image.height - cuts[-1] > tile_height * 1.5:
+        target = cuts[-1] + tile_height
+        low, high = target - window, min(target + window, image.height - 1)
+        # 优先选离目标最近的空白行，没有空白行时选墨迹最少的一行
+        blank = [y for y in range(low, high) if rows[y] >= BLANK_ROW_LEVEL]
+        if blank:
+            cut = min(blank, key=lambda y: abs(y - target))
+        else:
+            cut = max(range(low, high), key=lambda y: rows[y])
+        cuts.append(cut)
+    cuts.append(image.height)
+    return [image.crop((0, top, image.width, bottom)) for top, bottom in zip(cuts, cuts[1:])]
+
+
+class OCREngine:
+    """图片文字识别
+
+    图片先缩放到目标DPI并二值化，长图切成条带后交给线程池识别：
+    - 安装了 tesserocr 时，每个工作线程持有一个常驻的 Tesseract 实例，语言模型只加载一次；
+    - 否则使用 pytesseract，每个工作线程把分到的条带写成列表文件交给一个 tesseract 进程批量识别，
+      模型加载次数为工作线程数而不是条带数。
+    """
+
+    def __init__(self, lang: str = Config.OCR_LANG, workers: int = Config.OCR_WORKERS,
+                 backend: str = Config.OCR_BACKEND, timeout: float = Config.OCR_TIMEOUT):
+        self.lang = lang
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        if backend == 'tesserocr' and tesserocr is None:
+            logger.warning("未安装 tesserocr，使用 tesseract 命令行批量识别")
+        self.backend = 'tesserocr' if tesserocr is not None and backend in ('auto', 'tesserocr') else 'tesseract'
+        if self.workers > 1:
+            # 多个tesseract并行时限制各自的OpenMP线程，避免CPU过度争用
+            os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.images = 0
+        self.tiles = 0
+        self.stage_time = {stage: 0.0 for stage in STAGES}
+
+    def recognize(self, image: Image.Image) -> str:
+        """识别一张图片中的文字"""
+        return self.recognize_many([image])[0]
+
+    def recognize_many(self, images: List[Image.Image]) -> List[str]:
+        """识别多张图片（如扫描PDF的各页），所有条带一起分配给工作线程"""
+        start = time.time()
+        tiles: List[Tuple[int, Image.Image]] = []
+        for index, image in enumerate(images):
+            for tile in split_tiles(prepare_image(image)):
+                tiles.append((index, tile))
+        prepared = time.time()
+
+        if self.backend == 'tesserocr':
+            texts = list(self._executor.map(self._recognize_tile, [tile for _, tile in tiles]))
+        else:
+            texts = self._recognize_batches([tile for _, tile in tiles])
+        finished = time.time()
+
+        results = [[] for _ in images]
+        for (index, _), text in zip(tiles, texts):
+            text = text.strip()
+            if text:
+                results[index].append(text)
+
+        with self._lock:
+            self.images += len(images)
+            self.tiles += len(tiles)
+            self.stage_time['preprocess'] += prepared - start
+            self.stage_time['recognize'] += finished - prepared
+            self.stage_time['total'] += finished - start
+        logger.info(f"OCR完成：{len(images)} 张图片 {len(tiles)} 个条带，"
+                    f"预处理 {prepared - start:.2f}s，识别 {finished - prepared:.2f}s")
+        return ['\n'.join(parts) for parts in results]
+
+    def _recognize_tile(self, tile: Image.Image) -> str:
+        """tesserocr：使用当前线程的常驻实例识别"""
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=self.lang)
+            self._local.api = api
+        api.SetImage(tile)
+        return api.GetUTF8Text()
+
+    def _recognize_batches(self, tiles: List[Image.Image]) -> List[str]:
+        """pytesseract：条带按顺序分成若干批，每批由一个tesseract进程识别"""
+        if not tiles:
+            return []
+        batch_count = min(self.workers, len(tiles))
+        size = -(-len(tiles) // batch_count)
+        batches = [tiles[i:i + size] for i in range(0, len(tiles), size)]
+        texts = []
+        for batch_texts in self._executor.map(self._recognize_batch, batches):
+            texts.extend(batch_texts)
+        return texts
+
+    def _recognize_batch(self, tiles: List[Image.Image]) -> List[str]:
+        timeout = self.timeout * len(tiles) if self.timeout else 0
+        if len(tiles) == 1:
+            return [pytesseract.image_to_string(tiles[0], lang=self.lang, timeout=timeout)]
+        with tempfile.TemporaryDirectory(prefix='ocr_') as workdir:
+            paths = []
+            for i, tile in enumerate(tiles):
+                path = os.path.join(workdir, f"{i}.png")
+                tile.save(path)
+                paths.append(path)
+            list_path = os.path.join(workdir, 'images.txt')
+            with open(list_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(paths) + '\n')
+            # 输入为图片列表文件时，tesseract 逐张识别并以换页符分隔各张的结果
+            output = pytesseract.image_to_string(list_path, lang=self.lang, timeout=timeout)
+        pages = output.split('\f')
+        return (pages + [''] * len(tiles))[:len(tiles)]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'workers': self.workers,
+                'images': self.images,
+                'tiles': self.tiles,
+                'stage_time': {stage: round(value, 4) for stage, value in self.stage_time.items()},
+                'avg_time_per_image': round(self.stage_time['total'] / self.images, 4) if self.images else None
+            }
@@ -0,0 +1,118 @@
+import re
+import json
+from typing import Dict, Optional
+from config import Config
+
+# Markdown标题行：# 一级标题
+HEADING_LINE_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+# 列表项：- 要点 / * 要点 / 1. 要点，缩进表示层级
+BULLET_LINE_RE = re.compile(r'^([ \t]*)(?:[-*+•]|\d{1,3}[.)、])\s+(.+?)\s*$')
+# 列表项比任何标题都深
+BULLET_BASE_LEVEL = 7
+# 思维导图节点文字的最大长度
+MAX_NODE_LENGTH = 40
+
+
+class Outline:
+    """从带结构标记的文本（标题层级、列表缩进）解析出的大纲
+
+    tree 为思维导图结构 {"title", "children": [{"name", "children"}]}；
+    body 为去掉大纲行后剩余的正文；coverage 为大纲文字占全部文字的比例。
+    """
+
+    def __init__(self, tree: Dict, nodes: int, headings: int, outline_chars: int, body: str):
+        self.tree = tree
+        self.nodes = nodes
+        self.headings = headings
+        self.outline_chars = outline_chars
+        self.body = body
+
+    @property
+    def coverage(self) -> float:
+        total = self.outline_chars + len(''.join(self.body.split()))
+        return self.outline_chars / total if total else 0.0
+
+    @property
+    def complete(self) -> bool:
+        """大纲已概括了几乎全部内容，可以直接作为思维导图，无需调用模型"""
+        return (Config.MINDMAP_OUTLINE_MIN_NODES <= self.nodes <= Config.MINDMAP_OUTLINE_MAX_NODES
+                and self.coverage >= Config.MINDMAP_OUTLINE_SKIP_COVERAGE)
+
+    @property
+    def depth(self) -> int:
+        """中心主题以下的层数"""
+        def _depth(node: Dict) -> int:
+            return 1 + max((_depth(child) for child in node.get('children', ())), default=0)
+        return max((_depth(child) for child in self.tree['children']), default=0)
+
+    def to_json(self, max_depth: Optional[int] = None, compact: bool = False) -> str:
+        """序列化为思维导图JSON；max_depth 限制中心主题以下保留的层数，compact 时不缩进（用于提示词）"""
+        tree = self.tree
+        if max_depth is not None:
+            tree = {'title': tree['title'], 'children': [self._prune(child, max_depth) for child in tree['children']]}
+        if compact:
+            return json.dumps(tree, ensure_ascii=False, separators=(',', ':'))
+        return json.dumps(tree, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def _prune(cls, node: Dict, depth: int) -> Dict:
+        if depth <= 1 or 'children' not in node:
+            return {'name': node['name']}
+        return {'name': node['name'], 'children': [cls._prune(child, depth - 1) for child in node['children']]}
+
+    @classmethod
+    def parse(cls, text: str) -> Optional['Outline']:
+        """解析文本中的标题和列表项，没有足够的结构（至少两个标题或三个节点）时返回None"""
+        root = {'name': None, 'children': []}
+        stack = [(0, root)]
+        body = []
+        nodes = headings = outline_chars = 0
+        first_heading = None
+        for line in text.splitlines():
+            heading = HEADING_LINE_RE.match(line)
+            bullet = BULLET_LINE_RE.match(line) if heading is None else None
+            if heading is not None:
+                level, name = len(heading.group(1)), heading.group(2)
+                headings += 1
+            elif bullet is not None:
+                indent = bullet.group(1).expandtabs(4)
+                level, name = BULLET_BASE_LEVEL + len(indent) // 2, bullet.group(2)
+            else:
+                if line.strip():
+                    body.append(line)
+                continue
+
+            outline_chars += len(''.join(name.split()))
+            if len(name) > MAX_NODE_LENGTH:
+                name = name[:MAX_NODE_LENGTH - 1] + '…'
+            if heading is not None and first_heading is None:
+                first_heading = name
+            node = {'name': name, 'children': []}
+            while stack[-1][0] >= level:
+                stack.pop()
+            stack[-1][1]['children'].append(node)
+            stack.append((level, node))
+            nodes += 1
+
+        if headings < 2 and nodes < 3:
+            return None
+
+        # 唯一的顶层节点或开头没有子节点的标题（文档标题）作为中心主题，否则以第一个标题（如PPT封面页）为主题
+        children = root['children']
+        if len(children) == 1 and children[0]['children']:
+            title, children = children[0]['name'], children[0]['children']
+            nodes -= 1
+        elif len(children) > 1 and not children[0]['children']:
+            title, children = children[0]['name'], children[1:]
+            nodes -= 1
+        else:
+            title = first_heading or '主题'
+        tree = {'title': title, 'children': [cls._compact(child) for child in children]}
+        return cls(tree, nodes, headings, outline_chars, '\n'.join(body))
+
+    @classmethod
+    def _compact(cls, node: Dict) -> Dict:
+        """去掉空的 children，缩小JSON"""
+        if not node['children']:
+            return {'name': node['name']}
+        return {'name': node['name'], 'children': [cls._compact(child) for child in node['children']]}
@@ -0,0 +1,162 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _render_mindmap(response: str, name: str):
+    """在子进程中渲染思维导图，返回 (图片URL, 渲染耗时)"""
+    from modules.generators import MindMapGenerator
+    start = time.time()
+    image_url = MindMapGenerator().generate_mindmap_image(response, name=name)
+    return image_url, time.time() - start
+
+
+class MindmapRenderQueue:
+    """思维导图渲染任务队列
+
+    渲染在独立的进程池中执行，避免matplotlib占用请求线程
+    （pyplot的全局状态也不是线程安全的）。
+    """
+
+    def __init__(self, max_workers: int, max_jobs: int = 1000):
+        self._max_workers = max_workers
+        self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        self._jobs = OrderedDict()  # job_id -> 任务信息
+        self._callbacks = {}  # job_id -> [回调]
+        self._max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_render_time = 0.0
+        self.total_wait_time = 0.0
+
+    def submit(self, response: str) -> str:
+        """提交渲染任务，立即返回任务ID"""
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'status': 'pending',
+            'image_url': None,
+            'error': None,
+            'submitted_at': time.time(),
+            'render_time': None,
+            'event': threading.Event()
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self.submitted += 1
+            self._trim()
+        try:
+            future = self._submit(response, f"mindmap_{job_id}")
+        except Exception as e:
+            logger.error(f"提交思维导图渲染任务失败: {str(e)}")
+            with self._lock:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                self.failed += 1
+            job['event'].set()
+            return job_id
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+        return job_id
+
+    def _submit(self, response: str, name: str):
+        """提交到进程池；进程池损坏（子进程异常退出）时换一个新的进程池重试一次"""
+        executor = self._executor
+        try:
+            return executor.submit(_render_mindmap, response, name)
+        except BrokenProcessPool:
+            logger.error("思维导图渲染进程池已损坏，重新创建")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+                executor = self._executor
+            return executor.submit(_render_mindmap, response, name)
+
+    def _trim(self):
+        """只保留最近的任务记录：从最早的记录开始删除已完成的任务，跳过未完成的任务"""
+        excess = len(self._jobs) - self._max_jobs
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] != 'pending'][:excess]
+        for job_id in finished:
+            del self._jobs[job_id]
+
+    def _on_done(self, job_id: str, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            elapsed = time.time() - job['submitted_at']
+            try:
+                image_url, render_time = future.result()
+            except Exception as e:
+                logger.error(f"思维导图渲染任务失败: {str(e)}")
+                image_url, render_time = None, None
+                job['error'] = str(e)
+            if image_url:
+                job['status'] = 'done'
+                job['image_url'] = image_url
+                job['render_time'] = render_time
+                self.completed += 1
+                self.total_render_time += render_time
+                self.total_wait_time += max(elapsed - render_time, 0.0)
+            else:
+                job['status'] = 'failed'
+                job['error'] = job['error'] or '思维导图生成失败'
+                self.failed += 1
+            callbacks = self._callbacks.pop(job_id, [])
+        job['event'].set()
+        for callback in callbacks:
+            try:
+                callback(self.get(job_id))
+            except Exception as e:
+                logger.error(f"渲染回调执行失败: {str(e)}")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """查询任务状态"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {key: value for key, value in job.items() if key != 'event'}
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """等待任务完成（最多 timeout 秒），返回任务状态"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job['event'].wait(timeout)
+        return self.get(job_id)
+
+    def add_done_callback(self, job_id: str, callback: Callable[[Dict], None]):
+        """任务完成后调用 callback(任务状态)；已完成的任务立即调用"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if job['status'] == 'pending':
+                self._callbacks.setdefault(job_id, []).append(callback)
+                return
+        callback(self.get(job_id))
+
+    def stats(self) -> Dict:
+        """队列统计信息"""
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job['status'] == 'pending')
+            return {
+                'queue_depth': pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'avg_render_time': self.total_render_time / self.completed if self.completed else 0.0,
+                'avg_queue_wait': self.total_wait_time / self.completed if self.completed else 0.0
+            }
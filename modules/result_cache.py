@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheTier:
+    """内存缓存层（按字节预算做LRU淘汰）"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, payload, size)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        """返回 (过期时间, 内容)，未命中或已过期返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload, _ = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return expires_at, payload
+
+    def set(self, key: str, payload: str, expires_at: float):
+        size = len(payload.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, payload, size)
+            self.current_bytes += size
+            # 超出字节预算时淘汰最久未使用的条目
+            while self.current_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteCacheTier:
+    """磁盘缓存层（SQLite）
+
+    打开时和每写入 purge_every 条时清理一次：删除过期条目，总大小超过 max_bytes 时删除最早过期的条目。
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 0, purge_every: int = 100):
+        self.db_path = db_path
+        self.max_bytes = max_bytes  # 0表示不限
+        self.purge_every = purge_every
+        self.purged = 0
+        self._writes = 0
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, expires_at REAL NOT NULL, payload TEXT NOT NULL)'
+        )
+        self._conn.commit()
+        # 清理上次运行留下的过期条目
+        with self._lock:
+            self._purge()
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        """返回 (过期时间, 内容)，未命中或已过期返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT expires_at, payload FROM results WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] < time.time():
+                self._conn.execute('DELETE FROM results WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+            return row[0], row[1]
+
+    def set(self, key: str, payload: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results (key, expires_at, payload) VALUES (?, ?, ?)',
+                (key, expires_at, payload)
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self._purge()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM results WHERE key = ?', (key,))
+            self._conn.commit()
+
+    def _purge(self) -> int:
+        """删除过期条目和超出大小上限的条目，返回删除数量（调用方持有锁）"""
+        removed = self._conn.execute('DELETE FROM results WHERE expires_at < ?', (time.time(),)).rowcount
+        if self.max_bytes:
+            # 从最晚过期的条目开始累计，超出上限的部分（最早过期的）删除
+            total = 0
+            stale = []
+            for key, size in self._conn.execute(
+                    'SELECT key, length(CAST(payload AS BLOB)) FROM results ORDER BY expires_at DESC'):
+                total += size
+                if total > self.max_bytes:
+                    stale.append((key,))
+            if stale:
+                self._conn.executemany('DELETE FROM results WHERE key = ?', stale)
+                removed += len(stale)
+        self._conn.commit()
+        self.purged += removed
+        return removed
+
+
+class ResultCache:
+    """生成结果缓存
+
+    以（预处理内容、任务类型、难度、模型）为键，缓存完整的SSE事件序列，
+    命中时可原样回放，无需再次调用API。
+    """
+
+    def __init__(self, max_bytes: int, ttl: int, disk_path: Optional[str] = None, disk_max_bytes: int = 0):
+        self.ttl = ttl
+        self.tiers = [MemoryCacheTier(max_bytes)]
+        if disk_path:
+            try:
+                self.tiers.append(SqliteCacheTier(disk_path, disk_max_bytes))
+            except sqlite3.Error as e:
+                logger.error(f"磁盘缓存初始化失败: {str(e)}")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(content: str, task_type: str, difficulty: str, model: str) -> str:
+        """生成内容寻址的缓存键"""
+        raw = json.dumps([content, task_type, difficulty, model], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, validator: Optional[Callable[[List[Dict]], bool]] = None) -> Optional[List[Dict]]:
+        """读取缓存的事件序列，未命中返回None
+
+        validator 用于校验条目是否仍然可用（例如引用的图片已被删除），
+        校验失败的条目会被删除并计为未命中。
+        """
+        for index, tier in enumerate(self.tiers):
+            try:
+                entry = tier.get(key)
+            except sqlite3.Error as e:
+                logger.error(f"读取缓存失败: {str(e)}")
+                continue
+            if entry is None:
+                continue
+            expires_at, payload = entry
+            events = json.loads(payload)
+            if validator is not None and not validator(events):
+                self.invalidate(key)
+                break
+            # 回填更快的缓存层（保留原过期时间）
+            if index > 0:
+                self.tiers[0].set(key, payload, expires_at)
+            with self._lock:
+                self.hits += 1
+            return events
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, events: List[Dict]):
+        """写入事件序列"""
+        payload = json.dumps(events, ensure_ascii=False)
+        expires_at = time.time() + self.ttl
+        for tier in self.tiers:
+            try:
+                tier.set(key, payload, expires_at)
+            except sqlite3.Error as e:
+                logger.error(f"写入缓存失败: {str(e)}")
+
+    def invalidate(self, key: str):
+        """删除指定缓存"""
+        for tier in self.tiers:
+            try:
+                tier.delete(key)
+            except sqlite3.Error as e:
+                logger.error(f"删除缓存失败: {str(e)}")
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        memory = self.tiers[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': memory.evictions,
+            'entries': len(memory),
+            'bytes': memory.current_bytes,
+            'max_bytes': memory.max_bytes,
+            'ttl': self.ttl,
+            'disk_enabled': len(self.tiers) > 1,
+            'disk_purged': self.tiers[1].purged if len(self.tiers) > 1 else 0
+        }
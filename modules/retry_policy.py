@@ -0,0 +1,211 @@
+import time
+import random
+import logging
+import threading
+from typing import Dict, Optional
+from config import Config
+from modules.transport import TransportError
+
+logger = logging.getLogger(__name__)
+
+# 可重试的HTTP状态码（连接失败、超时等 status_code 为None，同样重试）
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开期间拒绝请求"""
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败达到阈值后打开，reset_timeout 秒内直接拒绝请求；
+    到期后进入半开状态，只放行一个试探请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold: int = Config.CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = Config.CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.opened_count = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.time() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """是否允许发起请求"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def abandon_probe(self):
+        """试探请求未得出结果就结束（如客户端断开）时调用，让后续请求可以重新试探"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                # 试探请求失败，重新打开
+                self._probing = False
+            elif self._opened_at is not None or self._failures < self.failure_threshold:
+                return
+            self._opened_at = time.time()
+            self.opened_count += 1
+            logger.warning(f"API连续失败 {self._failures} 次，熔断 {self.reset_timeout} 秒")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'state': self._state(),
+                'consecutive_failures': self._failures,
+                'opened_count': self.opened_count
+            }
+
+
+class RetryPolicy:
+    """重试策略：指数退避 + 全抖动，遵循 Retry-After，受总时限约束（熔断器按端点设置）"""
+
+    def __init__(self, max_attempts: int = Config.RETRY_TIMES, base_delay: float = Config.RETRY_DELAY,
+                 max_delay: float = Config.RETRY_MAX_DELAY, deadline: float = Config.RETRY_DEADLINE):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def begin(self, max_attempts: Optional[int] = None) -> 'RetryState':
+        """开始一次请求的重试计时"""
+        return RetryState(self, max_attempts or self.max_attempts)
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        if isinstance(error, TransportError):
+            return error.status_code is None or error.status_code in RETRYABLE_STATUS
+        return False
+
+    def backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """第 attempt 次失败（从1开始）后的等待时间"""
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            # 服务端明确给出的等待时间优先
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class RetryState:
+    """单次请求的重试状态"""
+
+    def __init__(self, policy: RetryPolicy, max_attempts: int):
+        self.policy = policy
+        self.max_attempts = max_attempts
+        self.attempt = 0
+        self.started_at = time.time()
+
+    def next_attempt(self):
+        """开始下一次尝试（端点的熔断检查由 EndpointPool.acquire 完成）"""
+        self.attempt += 1
+
+    def succeeded(self, breaker: CircuitBreaker):
+        breaker.record_success()
+
+    def failed(self, error: Exception, breaker: CircuitBreaker) -> Optional[float]:
+        """记录一次失败（计入所用端点的熔断器），返回重试前的等待秒数；不应再重试时返回None"""
+        retryable = self.policy.is_retryable(error)
+        if retryable:
+            breaker.record_failure()
+        else:
+            # 请求参数错误等说明服务可达，不计入熔断
+            breaker.record_success()
+        if not retryable or self.attempt >= self.max_attempts:
+            return None
+        delay = self.policy.backoff(self.attempt, error)
+        if time.time() - self.started_at + delay > self.policy.deadline:
+            logger.warning("重试将超出总时限，放弃重试")
+            return None
+        return delay
+
+
+class ResumeTrimmer:
+    """续传时去掉新响应中与已输出文本重复的部分
+
+    以已输出文本作为assistant前缀续写时，模型可能重复末尾的若干字符，
+    也可能（服务端不支持前缀续写时）从头重新生成。先缓存新响应的开头，
+    足够判断后去掉重叠部分再输出。
+    """
+
+    MIN_OVERLAP = 4  # 短于此长度的末尾重叠视为巧合
+
+    def __init__(self, emitted: str, window: int = 200):
+        self.emitted = emitted
+        self.window = min(window, len(emitted))
+        self._buffer = ''
+        self._decided = False
+        self._restart_pos = None  # 从头重新生成时，已跳过的字符数
+
+    def feed(self, chunk: str) -> str:
+        if self._restart_pos is not None:
+            return self._skip_restart(chunk)
+        if self._decided:
+            return chunk
+        self._buffer += chunk
+        if len(self._buffer) < self.window:
+            return ''
+        return self._decide()
+
+    def flush(self) -> str:
+        if self._decided or self._restart_pos is not None:
+            return ''
+        return self._decide()
+
+    def _decide(self) -> str:
+        self._decided = True
+        buffer, self._buffer = self._buffer, ''
+        head = self.emitted[:self.window]
+        if self.window and buffer.startswith(head):
+            self._restart_pos = 0
+            return self._skip_restart(buffer)
+
+        # 已输出文本的末尾与新响应开头的最长重叠
+        for k in range(min(len(buffer), len(self.emitted)), self.MIN_OVERLAP - 1, -1):
+            if self.emitted.endswith(buffer[:k]):
+                return buffer[k:]
+        return buffer
+
+    def _skip_restart(self, chunk: str) -> str:
+        """跳过与已输出文本逐字相同的部分，出现分歧后原样输出"""
+        i = 0
+        pos = self._restart_pos
+        while i < len(chunk) and pos < len(self.emitted) and chunk[i] == self.emitted[pos]:
+            i += 1
+            pos += 1
+        if i < len(chunk) or pos >= len(self.emitted):
+            self._restart_pos = None
+            self._decided = True
+        else:
+            self._restart_pos = pos
+        return chunk[i:]
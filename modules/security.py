@@ -1,7 +1,12 @@
 import re
+import os
+import time
 import logging
-from typing import List
+import threading
+from typing import List, Optional, Tuple
 from config import Config
+from modules.text_matcher import AhoCorasick, StreamingReplacer
+from modules.injection_detector import InjectionDetector
 
 logger = logging.getLogger(__name__)
 
@@ -9,54 +14,121 @@ class SecurityManager:
     """安全管理器"""
     
     def __init__(self):
-        self.sensitive_words = Config.SENSITIVE_WORDS
-        self.injection_patterns = [
-            r'(?i)(ignore|forget|disregard).*previous.*instructions',
-            r'(?i)you.*are.*now',
-            r'(?i)pretend.*to.*be',
-            r'(?i)act.*as.*if',
-            r'(?i)system.*prompt',
-            r'(?i)reveal.*instructions',
-            r'(?i)<script.*?>.*?</script>',
-            r'(?i)(javascript|eval|exec)\s*\(',
-        ]
+        self.sensitive_words = list(Config.SENSITIVE_WORDS)
+        self.words_file = Config.SENSITIVE_WORDS_FILE
+        self._words_mtime = None
+        self._last_reload_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._reloading = False
+        self.word_matcher = AhoCorasick(self.sensitive_words)
+        if self.words_file:
+            self.reload_sensitive_words()
+        self.injection_detector = InjectionDetector()
+        # 长文档会分块生成，允许比单次请求更长的输入
+        self.max_input_chars = Config.LONG_DOC_MAX_CHARS if Config.LONG_DOC_ENABLED else Config.MAX_INPUT_CHARS
     
-    def validate_input(self, content: str) -> bool:
-        """验证输入内容"""
+    def check_input(self, content: str) -> Optional[Tuple[str, int]]:
+        """检查输入内容，通过时返回None，否则返回 (错误信息, HTTP状态码)"""
         # 检查内容是否为空
         if not content or not content.strip():
-            return False
+            return '输入内容为空', 400
         
         # 检查内容长度
-        if len(content) > 50000:  # 50K字符限制
+        if len(content) > self.max_input_chars:
             logger.warning("输入内容过长")
-            return False
+            return f'输入内容过长（最多 {self.max_input_chars} 个字符）', 413
         
         # 检查敏感词
         if self.contains_sensitive_words(content):
             logger.warning("输入包含敏感词")
-            return False
+            return '输入内容包含不允许的内容', 400
         
         # 检查指令注入
         if self.detect_injection(content):
             logger.warning("检测到潜在的指令注入")
-            return False
+            return '输入内容包含不允许的内容', 400
+        
+        return None
+    
+    def validate_input(self, content: str) -> bool:
+        """验证输入内容"""
+        return self.check_input(content) is None
+    
+    def reload_sensitive_words(self, path: Optional[str] = None) -> int:
+        """从词表文件重新加载敏感词（每行一个，#开头为注释），返回词数
+
+        文件中的词与 Config.SENSITIVE_WORDS 合并，新自动机构建完成后整体替换，
+        扫描中的请求不受影响。
+        """
+        path = path or self.words_file
+        words = list(Config.SENSITIVE_WORDS)
+        mtime = None
+        if path:
+            try:
+                mtime = os.path.getmtime(path)
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        line = line.strip()
+                        if line and not line.startswith('#'):
+                            words.append(line)
+            except OSError as e:
+                logger.error(f"读取敏感词文件失败: {str(e)}")
+                return len(self.word_matcher)
         
-        return True
+        matcher = AhoCorasick(words)
+        with self._reload_lock:
+            self.sensitive_words = words
+            self.word_matcher = matcher
+            self.words_file = path
+            self._words_mtime = mtime
+        logger.info(f"已加载 {len(matcher)} 个敏感词")
+        return len(matcher)
+    
+    def _get_matcher(self) -> AhoCorasick:
+        """获取敏感词自动机，词表文件有更新时在后台重新加载"""
+        if self.words_file:
+            now = time.time()
+            if now - self._last_reload_check >= Config.SENSITIVE_WORDS_RELOAD_INTERVAL:
+                self._last_reload_check = now
+                try:
+                    mtime = os.path.getmtime(self.words_file)
+                except OSError:
+                    mtime = None
+                if mtime is not None and mtime != self._words_mtime:
+                    self._start_reload()
+        return self.word_matcher
+    
+    def _start_reload(self):
+        """在后台线程中重新构建自动机，构建期间请求继续使用旧的自动机"""
+        with self._reload_lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        
+        def _reload():
+            try:
+                self.reload_sensitive_words()
+            except Exception as e:
+                logger.error(f"重新加载敏感词失败: {str(e)}")
+            finally:
+                self._reloading = False
+        
+        threading.Thread(target=_reload, name='sensitive-words-reload', daemon=True).start()
     
     def contains_sensitive_words(self, content: str) -> bool:
-        """检查是否包含敏感词"""
-        content_lower = content.lower()
-        for word in self.sensitive_words:
-            if word.lower() in content_lower:
-                return True
-        return False
+        """检查是否包含敏感词（单遍扫描）"""
+        return self._get_matcher().contains(content)
+    
+    def find_injection(self, content: str) -> Optional[str]:
+        """检测指令注入，返回命中的规则名（线性时间单遍扫描）"""
+        return self.injection_detector.detect(content)
     
     def detect_injection(self, content: str) -> bool:
         """检测指令注入"""
-        for pattern in self.injection_patterns:
-            if re.search(pattern, content):
-                return True
+        rule = self.find_injection(content)
+        if rule is not None:
+            logger.warning(f"指令注入规则命中: {rule}")
+            return True
         return False
     
     def sanitize_output(self, content: str) -> str:
@@ -76,9 +148,9 @@ class SecurityManager:
     
     def filter_response(self, response: str) -> str:
         """过滤响应内容"""
-        # 移除任何敏感词
-        for word in self.sensitive_words:
-            if word in response:
-                response = response.replace(word, '[已过滤]')
-        
-        return response
\ No newline at end of file
+        # 单遍扫描替换所有敏感词
+        return self._get_matcher().replace(response, '[已过滤]')
+    
+    def create_stream_filter(self) -> StreamingReplacer:
+        """创建流式响应过滤器（每个请求一个，使用当前词表）"""
+        return StreamingReplacer(self._get_matcher(), '[已过滤]')
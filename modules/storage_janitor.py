@@ -0,0 +1,199 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class _TrackedFolder:
+    """一个受管理的目录：文件索引（文件名 -> [大小, 最近使用时间]）与配额"""
+
+    def __init__(self, path: str, max_bytes: int, max_age: float):
+        self.path = path
+        self.max_bytes = max_bytes  # 0表示不限
+        self.max_age = max_age  # 秒，0表示不限
+        self.files: Dict[str, List[float]] = {}
+        self.total_bytes = 0
+        self.removed = 0
+        self.bytes_reclaimed = 0
+
+    def add(self, name: str, size: int, last_used: float):
+        old = self.files.get(name)
+        if old is not None:
+            self.total_bytes -= old[0]
+        self.files[name] = [size, last_used]
+        self.total_bytes += size
+
+    def discard(self, name: str) -> int:
+        entry = self.files.pop(name, None)
+        if entry is None:
+            return 0
+        self.total_bytes -= entry[0]
+        return entry[0]
+
+
+class StorageJanitor:
+    """上传目录和输出目录的后台清理
+
+    每个目录维护一份内存中的文件索引，清理时只列目录名（os.scandir 不逐个 stat），
+    新出现的文件才读取一次大小和修改时间，消失的文件从索引移除。
+    超过保留时间的文件被删除；总大小超出配额时按最近使用时间从旧到新删除。
+    创建不足 min_age 秒的文件不会被删除，避免删掉正在写入或刚返回给客户端的文件。
+    """
+
+    def __init__(self, interval: float = Config.STORAGE_SWEEP_INTERVAL,
+                 min_age: float = Config.STORAGE_MIN_AGE):
+        self.interval = interval
+        self.min_age = min_age
+        self._folders: Dict[str, _TrackedFolder] = {}
+        self._callbacks: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sweeps = 0
+        self.errors = 0
+        self.last_sweep_time = None
+
+    def add_folder(self, path: str, max_bytes: int = 0, max_age_hours: float = 0):
+        """登记要管理的目录（只管理目录下的文件，不进入子目录）"""
+        os.makedirs(path, exist_ok=True)
+        key = os.path.abspath(path)
+        with self._lock:
+            self._folders[key] = _TrackedFolder(path, max_bytes, max_age_hours * 3600)
+
+    def add_remove_callback(self, callback: Callable[[str], None]):
+        """文件被删除后调用 callback(文件路径)，用于清理依赖该文件的内存状态"""
+        self._callbacks.append(callback)
+
+    def touch(self, file_path: str):
+        """记录文件刚被使用（新保存或被复用），推迟其过期时间"""
+        folder = self._folders.get(os.path.dirname(os.path.abspath(file_path)))
+        if folder is None:
+            return
+        name = os.path.basename(file_path)
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            return
+        with self._lock:
+            folder.add(name, size, time.time())
+
+    def _refresh(self, folder: _TrackedFolder):
+        """按目录中的文件名同步索引：只 stat 新出现的文件"""
+        try:
+            with os.scandir(folder.path) as entries:
+                names = {entry.name: entry for entry in entries if entry.is_file(follow_symlinks=False)}
+        except OSError as e:
+            logger.error(f"读取目录失败 {folder.path}: {str(e)}")
+            self.errors += 1
+            return
+        with self._lock:
+            for name in [name for name in folder.files if name not in names]:
+                folder.discard(name)
+            for name, entry in names.items():
+                if name in folder.files:
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                folder.add(name, stat.st_size, stat.st_mtime)
+
+    def _select_expired(self, folder: _TrackedFolder, now: float) -> List[str]:
+        """选出超过保留时间或超出配额需要删除的文件"""
+        with self._lock:
+            removable = sorted(
+                ((last_used, name, size) for name, (size, last_used) in folder.files.items()
+                 if now - last_used >= self.min_age)
+            )
+            selected = []
+            remaining = folder.total_bytes
+            for last_used, name, size in removable:
+                # 以 . 开头的是正在写入的临时文件（如分片上传），只按保留时间清理
+                temporary = name.startswith('.')
+                expired = folder.max_age and now - last_used > folder.max_age
+                over_quota = folder.max_bytes and remaining > folder.max_bytes and not temporary
+                if not expired and not over_quota:
+                    if temporary:
+                        continue
+                    break
+                selected.append(name)
+                remaining -= size
+            return selected
+
+    def sweep(self) -> Dict:
+        """执行一次清理，返回本次删除的文件数和释放的字节数"""
+        start = time.time()
+        removed = 0
+        reclaimed = 0
+        for folder in list(self._folders.values()):
+            self._refresh(folder)
+            for name in self._select_expired(folder, time.time()):
+                file_path = os.path.join(folder.path, name)
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"删除文件失败 {file_path}: {str(e)}")
+                    self.errors += 1
+                    continue
+                with self._lock:
+                    size = folder.discard(name)
+                    folder.removed += 1
+                    folder.bytes_reclaimed += size
+                removed += 1
+                reclaimed += size
+                for callback in self._callbacks:
+                    try:
+                        callback(file_path)
+                    except Exception as e:
+                        logger.error(f"文件删除回调执行失败: {str(e)}")
+        self.sweeps += 1
+        self.last_sweep_time = time.time() - start
+        if removed:
+            logger.info(f"存储清理：删除 {removed} 个文件，释放 {reclaimed / 1024 / 1024:.1f} MB")
+        return {'removed': removed, 'bytes_reclaimed': reclaimed}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"存储清理失败: {str(e)}")
+                self.errors += 1
+
+    def start(self):
+        """启动时先清理一次（同时建立索引），之后每 interval 秒清理一次"""
+        if self._thread is not None:
+            return
+        self.sweep()
+        self._thread = threading.Thread(target=self._run, name='storage-janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'sweeps': self.sweeps,
+                'errors': self.errors,
+                'last_sweep_time': round(self.last_sweep_time, 4) if self.last_sweep_time is not None else None,
+                'folders': {
+                    folder.path: {
+                        'files': len(folder.files),
+                        'bytes': folder.total_bytes,
+                        'max_bytes': folder.max_bytes,
+                        'removed': folder.removed,
+                        'bytes_reclaimed': folder.bytes_reclaimed
+                    }
+                    for folder in self._folders.values()
+                }
+            }
@@ -0,0 +1,161 @@
+import os
+import json
+import logging
+from typing import Dict, Iterator, List, Optional
+from config import Config
+from modules.mindmap_stream import IncrementalMindmapParser
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: Dict) -> str:
+    """格式化为SSE消息"""
+    return f"data: {json.dumps(event)}\n\n"
+
+
+def cached_events_valid(events: List[Dict]) -> bool:
+    """检查缓存事件引用的思维导图图片是否仍然存在"""
+    for event in events:
+        image_url = event.get('image_url')
+        if image_url:
+            filename = os.path.basename(image_url)
+            if not os.path.exists(os.path.join(Config.OUTPUT_FOLDER, filename)):
+                return False
+    return True
+
+
+class StreamSession:
+    """单次生成请求的流式事件处理
+
+    同步（Flask）和异步（aiohttp）服务共用：调用方负责从API读取片段，
+    依次调用 feed()/finish() 并把产出的SSE消息写给客户端。
+    """
+
+    def __init__(self, task_type: str, processor, result_cache=None, cache_key: Optional[str] = None,
+                 render_queue=None, output_filter=None):
+        self.task_type = task_type
+        self.processor = processor
+        self.result_cache = result_cache
+        self.cache_key = cache_key
+        # 思维导图渲染队列，为None时在当前线程内渲染
+        self.render_queue = render_queue
+        # 流式输出过滤器（StreamingReplacer），为None时原样输出
+        self.output_filter = output_filter
+        # 存储响应片段（用于思维导图）
+        self._chunks = []
+        # 思维导图JSON随流增量解析，根对象闭合后即可开始渲染
+        self.mindmap_parser = IncrementalMindmapParser() if task_type == 'mindmap' else None
+        self.render_job_id = None
+        # 记录事件序列（用于结果缓存）
+        self.events = []
+        self.cacheable = True
+
+    def _emit(self, event: Dict) -> str:
+        """记录事件并返回SSE消息，相邻的内容片段合并存储"""
+        if 'content' in event and self.events and 'content' in self.events[-1]:
+            self.events[-1] = {'content': self.events[-1]['content'] + event['content']}
+        else:
+            self.events.append(event)
+        return format_sse(event)
+
+    @property
+    def full_response(self) -> str:
+        """目前收到的完整响应"""
+        return ''.join(self._chunks)
+
+    def feed(self, chunk: str) -> List[str]:
+        """处理一个API返回的文本片段"""
+        if self.output_filter is not None:
+            # 过滤器只保留可能跨片段的词前缀，其余部分立即输出
+            chunk = self.output_filter.feed(chunk)
+        return self._process(chunk)
+
+    def _process(self, chunk: str) -> List[str]:
+        """处理过滤后的文本片段"""
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        messages = [self._emit({'content': chunk})]
+
+        if self.mindmap_parser is not None and not self.mindmap_parser.done:
+            # 节点事件用于前端逐步绘制，不记录到缓存
+            for node in self.mindmap_parser.feed(chunk):
+                messages.append(format_sse({'type': 'mindmap_node', 'path': node['path'], 'name': node['name']}))
+            if self.mindmap_parser.done and self.render_queue is not None:
+                messages.append(self._submit_render())
+        return messages
+
+    def _mindmap_source(self) -> str:
+        """渲染用的思维导图文本，优先使用增量解析得到的结构"""
+        if self.mindmap_parser is not None and self.mindmap_parser.done:
+            return json.dumps(self.mindmap_parser.structure, ensure_ascii=False)
+        return self.full_response
+
+    def _submit_render(self) -> str:
+        """提交渲染任务，返回 mindmap_pending 消息（只对本次请求有意义，不记录到缓存）"""
+        self.render_job_id = self.render_queue.submit(self._mindmap_source())
+        logger.info(f"思维导图渲染任务已提交: {self.render_job_id}")
+        return format_sse({'type': 'mindmap_pending', 'job_id': self.render_job_id})
+
+    def finish(self) -> Iterator[str]:
+        """流结束后的收尾（生成思维导图、写入缓存），可能阻塞"""
+        if self.output_filter is not None:
+            yield from self._process(self.output_filter.flush())
+            if self.output_filter.replaced:
+                logger.warning(f"输出中过滤了 {self.output_filter.replaced} 处敏感词")
+
+        if self.task_type == 'mindmap':
+            if self.render_queue is not None:
+                event = yield from self._finish_mindmap_job()
+            else:
+                # 生成思维导图图片
+                logger.info("开始生成思维导图图片")
+                image_path = self.processor.generate_mindmap_image(self._mindmap_source())
+                event = self._mindmap_event(image_path)
+            if event is not None:
+                yield self._emit(event)
+
+        yield self._emit({'type': 'complete'})
+
+        if self.cacheable:
+            self._store(self.events)
+
+    def _finish_mindmap_job(self):
+        """确保渲染任务已提交（流中未解析出完整结构时在此提交），在限定时间内等待结果
+
+        超时未完成时由客户端轮询任务状态，任务完成后再写入缓存。
+        """
+        if self.render_job_id is None:
+            yield self._submit_render()
+        job_id = self.render_job_id
+
+        job = self.render_queue.wait(job_id, Config.MINDMAP_RENDER_WAIT)
+        if job is not None and job['status'] != 'pending':
+            return self._mindmap_event(job['image_url'])
+
+        self.cacheable = False
+        events = list(self.events)
+
+        def _on_rendered(job):
+            if job['image_url']:
+                self._store(events + [self._mindmap_event(job['image_url']), {'type': 'complete'}])
+
+        self.render_queue.add_done_callback(job_id, _on_rendered)
+        return None
+
+    def _mindmap_event(self, image_path: Optional[str]) -> Dict:
+        if image_path:
+            return {'type': 'mindmap_complete', 'image_url': image_path}
+        self.cacheable = False
+        return {'type': 'mindmap_error', 'message': '思维导图生成失败'}
+
+    def _store(self, events: List[Dict]):
+        """写入结果缓存"""
+        if self.result_cache is not None and self.cache_key is not None:
+            self.result_cache.set(self.cache_key, events)
+
+    @staticmethod
+    def error(e: Exception) -> str:
+        """生成过程出错时的SSE消息"""
+        logger.error(f"生成过程错误: {str(e)}")
+        return format_sse({'error': str(e)})
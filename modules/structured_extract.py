@@ -0,0 +1,138 @@
+import re
+import logging
+from typing import Iterator, List, Optional
+import docx
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from pptx import Presentation
+from pptx.shapes.group import GroupShape
+
+logger = logging.getLogger(__name__)
+
+# 把Word/PPT文档提取为带结构标记的文本（Markdown风格的紧凑大纲）：
+# 标题为 "#"（层级即 # 的个数），列表项为 "- "（每级缩进两个空格），表格每行为 "| a | b |"，
+# PPT备注为 "> 备注："，正文原样保留。
+
+# Word标题样式：Heading 1 / 标题 1
+HEADING_STYLE_RE = re.compile(r'^(?:Heading|标题)\s*(\d)$', re.IGNORECASE)
+# 列表样式：List Bullet 2 / List Number（List Paragraph 只有带编号时才是列表项）
+LIST_STYLE_RE = re.compile(r'^List (?:Bullet|Number)(?: (\d))?$', re.IGNORECASE)
+# 节点文字的最大长度（更长的段落只作为正文）
+MAX_HEADING_LENGTH = 80
+
+
+def _table_rows(rows) -> List[str]:
+    """表格逐行输出，合并单元格（相邻重复的文字）只保留一次"""
+    lines = []
+    for row in rows:
+        cells = []
+        for cell in row.cells:
+            text = ' '.join(cell.text.split())
+            if not cells or text != cells[-1]:
+                cells.append(text)
+        if any(cells):
+            lines.append('| ' + ' | '.join(cells) + ' |')
+    return lines
+
+
+def _docx_heading_level(paragraph: Paragraph) -> Optional[int]:
+    style_name = paragraph.style.name if paragraph.style is not None else ''
+    if style_name == 'Title':
+        return 1
+    match = HEADING_STYLE_RE.match(style_name)
+    if match:
+        return min(int(match.group(1)), 6)
+    # 直接设置了大纲级别的段落（级别9表示正文）
+    p_pr = paragraph._p.pPr
+    outline = p_pr.find(qn('w:outlineLvl')) if p_pr is not None else None
+    if outline is not None:
+        try:
+            level = int(outline.get(qn('w:val')))
+        except (TypeError, ValueError):
+            return None
+        if 0 <= level < 9:
+            return min(level + 1, 6)
+    return None
+
+
+def _docx_list_depth(paragraph: Paragraph) -> Optional[int]:
+    p_pr = paragraph._p.pPr
+    if p_pr is not None and p_pr.numPr is not None:
+        ilvl = p_pr.numPr.ilvl
+        return ilvl.val if ilvl is not None else 0
+    style_name = paragraph.style.name if paragraph.style is not None else ''
+    match = LIST_STYLE_RE.match(style_name)
+    if match:
+        return int(match.group(1)) - 1 if match.group(1) else 0
+    return None
+
+
+def iter_docx_blocks(file_path: str) -> Iterator[str]:
+    """按文档顺序产出Word文档的块：标题、正文段落、连续的列表项、表格"""
+    document = docx.Document(file_path)
+    items = []
+    for child in document.element.body.iterchildren():
+        tag = child.tag.rsplit('}', 1)[-1]
+        if tag == 'tbl':
+            if items:
+                yield '\n'.join(items)
+                items = []
+            rows = _table_rows(Table(child, document).rows)
+            if rows:
+                yield '\n'.join(rows)
+            continue
+        if tag != 'p':
+            continue
+
+        paragraph = Paragraph(child, document)
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        depth = _docx_list_depth(paragraph)
+        if depth is not None:
+            items.append('  ' * depth + '- ' + text)
+            continue
+        if items:
+            yield '\n'.join(items)
+            items = []
+        level = _docx_heading_level(paragraph)
+        if level is not None and len(text) <= MAX_HEADING_LENGTH:
+            yield '#' * level + ' ' + text
+        else:
+            yield text
+    if items:
+        yield '\n'.join(items)
+
+
+def _iter_shape_lines(shapes, skip_id: Optional[int]) -> Iterator[str]:
+    """按版面位置（从上到下、从左到右）遍历形状，进入组合形状"""
+    for shape in sorted(shapes, key=lambda s: (s.top or 0, s.left or 0)):
+        if shape.shape_id == skip_id:
+            continue
+        if isinstance(shape, GroupShape):
+            yield from _iter_shape_lines(shape.shapes, skip_id)
+        elif getattr(shape, 'has_table', False):
+            yield from _table_rows(shape.table.rows)
+        elif shape.has_text_frame:
+            for paragraph in shape.text_frame.paragraphs:
+                text = ' '.join(''.join(run.text for run in paragraph.runs).split())
+                if text:
+                    yield '  ' * paragraph.level + '- ' + text
+
+
+def iter_pptx_slides(file_path: str) -> Iterator[str]:
+    """逐张幻灯片产出：标题（二级标题）、各形状中的要点（按段落级别缩进）、表格和演讲者备注"""
+    presentation = Presentation(file_path)
+    for slide_num, slide in enumerate(presentation.slides):
+        title_shape = slide.shapes.title
+        title = ' '.join(title_shape.text.split()) if title_shape is not None and title_shape.has_text_frame else ''
+        lines = list(_iter_shape_lines(slide.shapes, title_shape.shape_id if title_shape is not None else None))
+        if slide.has_notes_slide:
+            notes = slide.notes_slide.notes_text_frame
+            notes_text = ' '.join(notes.text.split()) if notes is not None else ''
+            if notes_text:
+                lines.append(f"> 备注：{notes_text}")
+        if not title and not lines:
+            continue
+        yield '\n'.join([f"## {title or f'幻灯片 {slide_num + 1}'}"] + lines)
@@ -0,0 +1,225 @@
+import re
+import logging
+from typing import Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AhoCorasick:
+    """Aho–Corasick多模式匹配自动机
+
+    构建一次后对任意文本单遍扫描即可找出所有词的出现位置，
+    耗时与文本长度成正比，与词表大小无关。默认忽略大小写。
+    """
+
+    def __init__(self, words: Iterable[str], ignore_case: bool = True):
+        self.ignore_case = ignore_case
+        self.words = sorted({self._fold(w) for w in words if w and w.strip()})
+        self.max_length = max((len(w) for w in self.words), default=0)
+
+        # goto[state] 只包含字典树的边，缺少的转移沿失败指针查找
+        self._goto = [{}]
+        self._fail = [0]
+        self._depth = [0]
+        self._outputs = [()]  # 每个状态上结束的词的长度（含后缀链上的词）
+        self._build()
+
+        # 状态0时直接跳到下一个可能作为词首的字符，跳过无关文本
+        first_chars = ''.join(sorted({w[0] for w in self.words}))
+        self._first_char_re = re.compile(f"[{re.escape(first_chars)}]") if first_chars else None
+
+    def _fold(self, text: str) -> str:
+        """统一大小写，保证结果与原文逐字符对齐"""
+        if not self.ignore_case:
+            return text
+        folded = text.lower()
+        if len(folded) == len(text):
+            return folded
+        # 少数字符小写后长度会变化，逐字符处理以保持位置对应
+        return ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+    def _build(self):
+        # 构建字典树
+        own_outputs = [[]]
+        for word in self.words:
+            state = 0
+            for ch in word:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._depth.append(self._depth[state] + 1)
+                    own_outputs.append([])
+                    self._goto[state][ch] = next_state
+                state = next_state
+            own_outputs[state].append(len(word))
+        self._outputs = [()] * len(self._goto)
+
+        # 广度优先计算失败指针（状态的输出包含失败链上的词）
+        goto = self._goto
+        fail = self._fail
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            self._outputs[state] = tuple(own_outputs[state]) + self._outputs[fail[state]]
+            for ch, child in goto[state].items():
+                target = fail[state]
+                while target and ch not in goto[target]:
+                    target = fail[target]
+                fail[child] = goto[target].get(ch, 0) if state != 0 else 0
+                queue.append(child)
+
+    def __len__(self):
+        return len(self.words)
+
+    def step(self, state: int, ch: str) -> int:
+        """从 state 读入一个字符后的状态（流式匹配用）"""
+        if self.ignore_case:
+            folded = ch.lower()
+            if len(folded) == 1:
+                ch = folded
+        goto = self._goto
+        while state and ch not in goto[state]:
+            state = self._fail[state]
+        return goto[state].get(ch, 0)
+
+    def depth(self, state: int) -> int:
+        """状态对应的已匹配前缀长度"""
+        return self._depth[state]
+
+    def outputs(self, state: int) -> Tuple[int, ...]:
+        """在该状态结束的所有词的长度"""
+        return self._outputs[state]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """按结束位置顺序产出所有匹配 (start, end)，包括互相重叠的匹配"""
+        if not self.words:
+            return
+        text = self._fold(text)
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        search = self._first_char_re.search
+        length = len(text)
+        state = 0
+        pos = 0
+        while pos < length:
+            if state == 0:
+                found = search(text, pos)
+                if found is None:
+                    return
+                pos = found.start()
+            ch = text[pos]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            pos += 1
+            for word_length in outputs[state]:
+                yield pos - word_length, pos
+
+    def contains(self, text: str) -> bool:
+        """是否包含任意一个词（找到第一个即返回）"""
+        for _ in self.iter_matches(text):
+            return True
+        return False
+
+    def find_all(self, text: str) -> List[str]:
+        """返回文本中出现的所有词（按出现位置，可重复）"""
+        return [text[start:end] for start, end in self.iter_matches(text)]
+
+    @staticmethod
+    def select_matches(matches: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """从可能重叠的匹配中选出最左最长、互不重叠的一组"""
+        selected = []
+        last_end = 0
+        for start, end in sorted(matches, key=lambda m: (m[0], -m[1])):
+            if start >= last_end:
+                selected.append((start, end))
+                last_end = end
+        return selected
+
+    def replace(self, text: str, replacement: str) -> str:
+        """把所有匹配替换为 replacement（最左最长、不重叠）"""
+        selected = self.select_matches(self.iter_matches(text))
+        if not selected:
+            return text
+        parts = []
+        last = 0
+        for start, end in selected:
+            parts.append(text[last:start])
+            parts.append(replacement)
+            last = end
+        parts.append(text[last:])
+        return ''.join(parts)
+
+
+class StreamingReplacer:
+    """流式文本的敏感词替换
+
+    文本分片到达时立即输出已确定的部分，只保留自动机当前已匹配的前缀
+    （最多为最长词长度减一），以捕获被切分在两个分片之间的词。
+    替换结果与对完整文本调用 AhoCorasick.replace 一致。
+    """
+
+    def __init__(self, matcher: AhoCorasick, replacement: str):
+        self.matcher = matcher
+        self.replacement = replacement
+        self._state = 0
+        self._pending = ''  # 尚未输出的文本
+        self._base = 0  # _pending 首字符在整个流中的位置
+        self._pos = 0  # 已读入的字符数
+        self._matches = []  # 起点尚未确定输出的匹配 (start, end)
+        self.replaced = 0
+
+    def feed(self, chunk: str) -> str:
+        """读入一个分片，返回可以立即输出的文本"""
+        if not chunk:
+            return ''
+        matcher = self.matcher
+        state = self._state
+        pos = self._pos
+        base = self._base
+        for ch in chunk:
+            state = matcher.step(state, ch)
+            pos += 1
+            for word_length in matcher.outputs(state):
+                # 起点落在已输出文本中的匹配不再参与选择
+                if pos - word_length >= base:
+                    self._matches.append((pos - word_length, pos))
+        self._state = state
+        self._pos = pos
+        self._pending += chunk
+        # 仍在匹配中的词最早从 pos - depth 开始，之前的文本已可确定
+        return self._release(pos - matcher.depth(state))
+
+    def flush(self) -> str:
+        """流结束时输出剩余文本"""
+        self._state = 0
+        return self._release(self._pos)
+
+    def _release(self, boundary: int) -> str:
+        if boundary <= self._base and not self._matches:
+            return ''
+        parts = []
+        cursor = self._base
+        # 起点在边界之前的匹配不会再出现更长的候选，可以确定取舍
+        resolved = [m for m in self._matches if m[0] < boundary]
+        remaining = [m for m in self._matches if m[0] >= boundary]
+        for start, end in AhoCorasick.select_matches(resolved):
+            if start < cursor:
+                continue
+            parts.append(self._pending[cursor - self._base:start - self._base])
+            parts.append(self.replacement)
+            self.replaced += 1
+            cursor = end
+
+        # 已替换的词可能越过边界，输出位置随之延伸，与其重叠的后续匹配作废
+        emit_to = max(boundary, cursor)
+        parts.append(self._pending[cursor - self._base:emit_to - self._base])
+        self._matches = [m for m in remaining if m[0] >= emit_to]
+        self._pending = self._pending[emit_to - self._base:]
+        self._base = emit_to
+        return ''.join(parts)
@@ -0,0 +1,132 @@
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+from config import Config
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # 可选：使用模型自带的 tokenizer.json 精确计数
+    Tokenizer = None
+
+logger = logging.getLogger(__name__)
+
+# 中日韩文字及全角符号
+CJK_RE = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef]")
+# 截断时优先停在这些字符之后
+SENTENCE_BOUNDARY_RE = re.compile(r'[。！？!?；;\n]|\.(?=\s)')
+
+# 估算系数（DeepSeek官方给出的经验值）：中文字符约0.6个token，英文字符约0.3个token
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.3
+
+
+class TokenEstimator:
+    """token计数
+
+    配置了 TOKENIZER_FILE 且安装了 tokenizers 时使用真实分词器，
+    否则按字符类别估算（中文与英文的token密度相差约一倍）。
+    """
+
+    def __init__(self, tokenizer_file: str = Config.TOKENIZER_FILE):
+        self._tokenizer = None
+        if tokenizer_file:
+            if Tokenizer is None:
+                logger.warning("未安装 tokenizers，使用估算的token数")
+            else:
+                try:
+                    self._tokenizer = Tokenizer.from_file(tokenizer_file)
+                except Exception as e:
+                    logger.error(f"加载分词器失败，使用估算的token数: {str(e)}")
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        cjk = len(CJK_RE.findall(text))
+        return int(cjk * CJK_TOKENS_PER_CHAR + (len(text) - cjk) * OTHER_TOKENS_PER_CHAR + 0.5)
+
+
+_default_estimator = None
+
+
+def estimate_tokens(text: str) -> int:
+    """使用默认计数器估算token数"""
+    global _default_estimator
+    if _default_estimator is None:
+        _default_estimator = TokenEstimator()
+    return _default_estimator.count(text)
+
+
+class PromptBudget:
+    """按模型上下文窗口分配提示词和输出的token预算
+
+    上下文窗口 = 系统提示词 + 任务模板 + 内容 + 输出 + 余量。
+    内容预算另受 PROMPT_CONTENT_MAX_TOKENS 限制（控制单次请求成本）。
+    """
+
+    def __init__(self, estimator: Optional[TokenEstimator] = None,
+                 context_window: int = Config.MODEL_CONTEXT_WINDOW,
+                 max_output: int = Config.MAX_TOKENS,
+                 content_cap: int = Config.PROMPT_CONTENT_MAX_TOKENS,
+                 safety_margin: int = 256):
+        self.estimator = estimator or TokenEstimator()
+        self.context_window = context_window
+        self.max_output = max_output
+        self.content_cap = content_cap
+        self.safety_margin = safety_margin
+
+    def count(self, text: str) -> int:
+        return self.estimator.count(text)
+
+    def content_budget(self, template: str, system_prompt: str = '') -> int:
+        """给定空内容时的提示词模板，返回内容可用的token数"""
+        overhead = self.count(template) + self.count(system_prompt)
+        available = self.context_window - overhead - self.max_output - self.safety_margin
+        return max(0, min(available, self.content_cap))
+
+    def completion_budget(self, prompt: str, system_prompt: str = '') -> int:
+        """提示词确定后，输出可用的token数（不超过 MAX_TOKENS）"""
+        used = self.count(prompt) + self.count(system_prompt) + self.safety_margin
+        return max(1, min(self.max_output, self.context_window - used))
+
+    def trim(self, text: str, max_tokens: int) -> Tuple[str, bool]:
+        """把文本截断到 max_tokens 以内，尽量停在句子边界，返回 (文本, 是否截断)"""
+        if self.count(text) <= max_tokens:
+            return text, False
+
+        # 二分查找不超过预算的最长前缀
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        prefix = text[:low]
+
+        # 在前缀的最后20%内寻找句子边界，找不到则直接在字符处截断
+        boundary = None
+        for match in SENTENCE_BOUNDARY_RE.finditer(prefix, int(len(prefix) * 0.8)):
+            boundary = match.end()
+        if boundary:
+            prefix = prefix[:boundary]
+        return prefix.rstrip(), True
+
+    def usage_event(self, prompts: List[str], system_prompt: str, content_tokens: int, trimmed: bool) -> Dict:
+        """请求的token估算（作为SSE事件发给前端），长文档分块时 prompts 为各分块的提示词"""
+        system_tokens = self.count(system_prompt)
+        return {
+            'type': 'usage_estimate',
+            'prompt_tokens': sum(self.count(prompt) + system_tokens for prompt in prompts),
+            'content_tokens': content_tokens,
+            'max_completion_tokens': sum(self.completion_budget(prompt, system_prompt) for prompt in prompts),
+            'context_window': self.context_window,
+            'requests': len(prompts),
+            'trimmed': trimmed,
+            'exact': self.estimator.exact
+        }
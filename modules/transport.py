@@ -0,0 +1,249 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+try:
+    import httpx
+except ImportError:  # HTTP/2 为可选功能
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+class TransportError(Exception):
+    """HTTP请求失败
+
+    status_code 为HTTP状态码（连接失败、超时等为None），
+    retry_after 为服务端 Retry-After 头给出的等待秒数。
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（只支持秒数形式）"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+class _PoolMetrics:
+    """连接池使用统计（线程安全）"""
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        # 发起请求时占用连接数已达池上限的次数（池饱和，需要等待或新建连接）
+        self.saturated = 0
+        self._ttfb_total = 0.0
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.requests += 1
+            if self.in_flight >= self.pool_size:
+                self.saturated += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def record_ttfb(self, seconds: float):
+        with self._lock:
+            self._ttfb_total += seconds
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'requests': self.requests,
+                'errors': self.errors,
+                'saturated_requests': self.saturated,
+                'avg_ttfb': round(self._ttfb_total / self.requests, 4) if self.requests else 0.0
+            }
+
+
+class RequestsTransport:
+    """基于 requests 的HTTP/1.1传输层
+
+    按主机维护大小为 pool_size 的keep-alive连接池，连接（含TLS会话）在请求间复用。
+    """
+
+    http_version = 'HTTP/1.1'
+
+    def __init__(self, headers: Dict[str, str], pool_size: int = Config.API_POOL_SIZE,
+                 connect_timeout: float = Config.API_CONNECT_TIMEOUT, pool_block: bool = Config.API_POOL_BLOCK):
+        self.connect_timeout = connect_timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        # pool_connections 为缓存的主机数，pool_maxsize 为每个主机的连接数
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=pool_block)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.metrics = _PoolMetrics(pool_size)
+
+    def _post(self, url: str, payload: Dict, read_timeout: float, stream: bool,
+              headers: Optional[Dict[str, str]]) -> requests.Response:
+        start = time.time()
+        try:
+            response = self.session.post(url, json=payload, stream=stream, headers=headers,
+                                         timeout=(self.connect_timeout, read_timeout))
+        except requests.exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+        self.metrics.record_ttfb(time.time() - start)
+        if response.status_code >= 400:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            response.close()
+            raise TransportError(f"HTTP {response.status_code}: {response.reason}",
+                                 status_code=response.status_code, retry_after=retry_after)
+        return response
+
+    def post_json(self, url: str, payload: Dict, read_timeout: float,
+                  headers: Optional[Dict[str, str]] = None) -> Dict:
+        """发送请求并返回JSON响应，headers 为本次请求附加的请求头"""
+        with self.metrics.track():
+            response = self._post(url, payload, read_timeout, stream=False, headers=headers)
+            try:
+                return response.json()
+            except ValueError as e:
+                raise TransportError(f"响应不是有效的JSON: {str(e)}") from e
+
+    def stream_lines(self, url: str, payload: Dict, read_timeout: float,
+                     headers: Optional[Dict[str, str]] = None) -> Iterator[str]:
+        """发送请求并逐行产出响应内容，read_timeout 为两次读取之间的最长间隔"""
+        with self.metrics.track():
+            response = self._post(url, payload, read_timeout, stream=True, headers=headers)
+            try:
+                for line in response.iter_lines():
+                    if line:
+                        yield line.decode('utf-8')
+            except requests.exceptions.RequestException as e:
+                raise TransportError(str(e)) from e
+            finally:
+                response.close()
+
+    def _connections_created(self) -> int:
+        """已建立的连接总数，与请求数对比可看出连接复用情况"""
+        created = 0
+        try:
+            pools = self.adapter.poolmanager.pools
+            for key in pools.keys():
+                created += getattr(pools[key], 'num_connections', 0)
+        except Exception:
+            pass
+        return created
+
+    def stats(self) -> Dict:
+        stats = self.metrics.stats()
+        stats['http_version'] = self.http_version
+        stats['connections_created'] = self._connections_created()
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+class HttpxTransport:
+    """基于 httpx 的HTTP/2传输层，并发请求在同一连接上多路复用"""
+
+    http_version = 'HTTP/2'
+
+    def __init__(self, headers: Dict[str, str], pool_size: int = Config.API_POOL_SIZE,
+                 connect_timeout: float = Config.API_CONNECT_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self.client = httpx.Client(
+            http2=True,
+            headers=headers,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                                keepalive_expiry=Config.API_KEEPALIVE_EXPIRY)
+        )
+        self.metrics = _PoolMetrics(pool_size)
+
+    def _timeout(self, read_timeout: float):
+        return httpx.Timeout(read_timeout, connect=self.connect_timeout)
+
+    @staticmethod
+    def _raise_for_status(response):
+        if response.status_code >= 400:
+            raise TransportError(f"HTTP {response.status_code}: {response.reason_phrase}",
+                                 status_code=response.status_code,
+                                 retry_after=parse_retry_after(response.headers.get('Retry-After')))
+
+    def post_json(self, url: str, payload: Dict, read_timeout: float,
+                  headers: Optional[Dict[str, str]] = None) -> Dict:
+        with self.metrics.track():
+            start = time.time()
+            try:
+                response = self.client.post(url, json=payload, headers=headers,
+                                            timeout=self._timeout(read_timeout))
+            except httpx.HTTPError as e:
+                raise TransportError(str(e)) from e
+            self.metrics.record_ttfb(time.time() - start)
+            self._raise_for_status(response)
+            try:
+                return response.json()
+            except ValueError as e:
+                raise TransportError(f"响应不是有效的JSON: {str(e)}") from e
+
+    def stream_lines(self, url: str, payload: Dict, read_timeout: float,
+                     headers: Optional[Dict[str, str]] = None) -> Iterator[str]:
+        with self.metrics.track():
+            start = time.time()
+            try:
+                with self.client.stream('POST', url, json=payload, headers=headers,
+                                        timeout=self._timeout(read_timeout)) as response:
+                    self.metrics.record_ttfb(time.time() - start)
+                    if response.status_code >= 400:
+                        response.read()
+                        self._raise_for_status(response)
+                    for line in response.iter_lines():
+                        if line:
+                            yield line
+            except httpx.HTTPError as e:
+                raise TransportError(str(e)) from e
+
+    def stats(self) -> Dict:
+        stats = self.metrics.stats()
+        stats['http_version'] = self.http_version
+        return stats
+
+    def close(self):
+        self.client.close()
+
+
+def create_transport(headers: Dict[str, str]):
+    """按配置创建传输层，启用HTTP/2但未安装 httpx[http2] 时退回 requests"""
+    if Config.API_HTTP2:
+        if httpx is None:
+            logger.warning("未安装 httpx，HTTP/2 不可用，使用 requests")
+        else:
+            try:
+                return HttpxTransport(headers)
+            except ImportError as e:
+                # 缺少 h2 依赖
+                logger.warning(f"HTTP/2 不可用，使用 requests: {str(e)}")
+    return RequestsTransport(headers)
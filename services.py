@@ -0,0 +1,146 @@
+import os
+import logging
+from config import Config
+from modules.api_client import SYSTEM_PROMPT
+from modules.content_processor import ContentProcessor
+from modules.generators import MindMapGenerator, NoteGenerator, QuizGenerator
+from modules.security import SecurityManager
+from modules.file_handler import FileHandler
+from modules.result_cache import ResultCache
+from modules.stream_session import cached_events_valid
+from modules.render_queue import MindmapRenderQueue
+from modules.storage_janitor import StorageJanitor
+from modules.chunked_upload import ChunkedUploadManager
+from modules.extraction_jobs import ExtractionJobManager
+
+# 同步（app.py）和异步（async_app.py）服务共用的模块实例和请求处理辅助函数，
+# 不依赖具体的Web框架
+
+logger = logging.getLogger(__name__)
+
+# 初始化模块
+content_processor = ContentProcessor()
+security_manager = SecurityManager()
+file_handler = FileHandler(Config.UPLOAD_FOLDER)
+chunked_uploads = ChunkedUploadManager(file_handler)
+# 上传文件的内容提取任务（独立线程池，限制PDF/OCR解析的并发数）
+extraction_jobs = ExtractionJobManager()
+mindmap_generator = MindMapGenerator()
+note_generator = NoteGenerator()
+quiz_generator = QuizGenerator()
+result_cache = ResultCache(
+    Config.RESULT_CACHE_MAX_BYTES,
+    Config.RESULT_CACHE_TTL,
+    Config.RESULT_CACHE_DB if Config.RESULT_CACHE_DISK else None,
+    Config.RESULT_CACHE_DISK_MAX_BYTES
+) if Config.RESULT_CACHE_ENABLED else None
+# SVG渲染只需几毫秒，直接在请求线程中完成，不使用渲染进程池
+render_queue = MindmapRenderQueue(Config.MINDMAP_RENDER_WORKERS) \
+    if Config.MINDMAP_RENDER_POOL and Config.MINDMAP_RENDERER != 'svg' else None
+
+# 确保上传文件夹存在
+os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(Config.OUTPUT_FOLDER, exist_ok=True)
+
+# 上传文件和思维导图图片的后台清理（由服务启动时调用 start_background_tasks 启动）
+storage_janitor = None
+if Config.STORAGE_JANITOR_ENABLED:
+    storage_janitor = StorageJanitor()
+    storage_janitor.add_folder(Config.UPLOAD_FOLDER, Config.UPLOAD_MAX_BYTES, Config.UPLOAD_MAX_AGE_HOURS)
+    storage_janitor.add_folder(Config.OUTPUT_FOLDER, Config.OUTPUT_MAX_BYTES, Config.OUTPUT_MAX_AGE_HOURS)
+    storage_janitor.add_remove_callback(file_handler.forget)
+
+def start_background_tasks():
+    """启动后台任务（存储清理）"""
+    if storage_janitor is not None:
+        storage_janitor.start()
+
+def select_task(task_type, processed_content, difficulty):
+    """根据任务类型构建提示词，返回 (prompt, processor)"""
+    if task_type == 'mindmap':
+        return mindmap_generator.build_prompt(processed_content), mindmap_generator
+    elif task_type == 'quiz':
+        return quiz_generator.build_prompt(processed_content, difficulty), quiz_generator
+    else:  # notes
+        return note_generator.build_prompt(processed_content), note_generator
+
+def content_budget(task_type, difficulty):
+    """按任务模板计算内容可用的token数"""
+    template, _ = select_task(task_type, '', difficulty)
+    return content_processor.budget.content_budget(template, SYSTEM_PROMPT)
+
+def prepare_mindmap_outline(content, limit, allow_trim=True):
+    """思维导图：使用文档自带的大纲（标题层级、列表缩进）作为骨架
+
+    返回 (用于缓存键的内容, 提示词, 是否截断)；大纲已覆盖全部内容时提示词为None（本地生成，不调用模型）。
+    内容没有大纲结构、骨架去掉细节层级后仍超出预算，或正文需要截断而 allow_trim 为False
+    （交给长文档分块处理）时返回None。
+    """
+    outline = mindmap_generator.build_skeleton(content)
+    if outline is None:
+        return None
+    if outline.complete:
+        return outline.to_json(), None, False
+    # 骨架最多占内容预算的 MINDMAP_OUTLINE_MAX_SHARE，超出时从最深一层开始逐层去掉
+    skeleton_limit = int(limit * Config.MINDMAP_OUTLINE_MAX_SHARE)
+    depth = outline.depth
+    skeleton = outline.to_json(compact=True)
+    while content_processor.count_tokens(skeleton) > skeleton_limit:
+        depth -= 1
+        if depth < 1:
+            logger.info("文档大纲超出token预算，不使用骨架")
+            return None
+        skeleton = outline.to_json(max_depth=depth, compact=True)
+    # 骨架已包含标题和列表项，提示词中的正文只保留其余部分
+    body, trimmed = content_processor.prepare(outline.body, limit - content_processor.count_tokens(skeleton))
+    if trimmed and not allow_trim:
+        return None
+    return skeleton + '\n\n' + body, mindmap_generator.build_outline_prompt(skeleton, body), trimmed
+
+def build_chunk_prompts(task_type, chunks, difficulty):
+    """为长文档的每个分块构建提示词，返回 (prompts, processor)"""
+    prompts = []
+    processor = None
+    for index, chunk in enumerate(chunks):
+        part = f"（以下是一篇长文档的第 {index + 1}/{len(chunks)} 部分）\n{chunk}"
+        prompt, processor = select_task(task_type, part, difficulty)
+        prompts.append(prompt)
+    return prompts, processor
+
+def lookup_cache(processed_content, task_type, difficulty):
+    """查询结果缓存，返回 (cache_key, cached_events)"""
+    if result_cache is None:
+        return None, None
+    cache_key = ResultCache.make_key(processed_content, task_type, difficulty, Config.MODEL_NAME)
+    return cache_key, result_cache.get(cache_key, validator=cached_events_valid)
+
+def extract_uploaded(file_path, budgeted, progress=None):
+    """提取已保存文件的内容（可选只提取预处理会保留的部分）"""
+    if storage_janitor is not None:
+        storage_janitor.touch(file_path)
+    if budgeted:
+        return file_handler.extract_content(
+            file_path,
+            max_length=content_processor.max_tokens,
+            length_fn=lambda chunk: content_processor.count_tokens(content_processor.clean_text(chunk)),
+            progress=progress
+        )
+    return file_handler.extract_content(file_path, progress=progress)
+
+def submit_extraction(file_path, filename, budgeted):
+    """提交后台提取任务，返回 (响应体, 状态码)"""
+    # 任务可能排队一段时间，先记录文件刚被使用，避免被存储清理提前删除
+    if storage_janitor is not None:
+        storage_janitor.touch(file_path)
+    job_id = extraction_jobs.submit(filename, lambda progress: extract_uploaded(file_path, budgeted, progress))
+    if job_id is None:
+        return {'error': '文件处理任务过多，请稍后重试'}, 503
+    return {'success': True, 'job_id': job_id, 'filename': filename, 'budgeted': budgeted}, 202
+
+def extraction_event(job):
+    """提取任务状态对应的SSE事件"""
+    if job['status'] == 'done':
+        return {'type': 'extract_complete', 'content': job['content'], 'filename': job['filename']}
+    if job['status'] == 'failed':
+        return {'type': 'extract_error', 'error': f"文件处理失败: {job['error']}"}
+    return {'type': 'extract_progress', 'status': job['status'], 'done': job['done'], 'total': job['total']}
@@ -0,0 +1,57 @@
+import threading
+
+from modules.coalescer import StreamCoalescer
+
+
+def test_request_joining_while_flight_stops_starts_new_flight():
+    """所有订阅者断开、生成正在停止时到达的相同请求应发起新的生成，而不是读到截断的消息流"""
+    coalescer = StreamCoalescer()
+    proceed = threading.Event()
+    closing = threading.Event()
+    release = threading.Event()
+
+    def first():
+        try:
+            yield 'a'
+            proceed.wait(5)
+            yield 'b'
+            yield 'c'
+        finally:
+            # 关闭上游较慢时，停止中的生成会在较长时间内可见
+            closing.set()
+            release.wait(5)
+
+    stream = coalescer.subscribe('key', first)
+    assert next(stream) == 'a'
+    stream.close()
+    proceed.set()
+    assert closing.wait(5)
+
+    try:
+        second = coalescer.subscribe('key', lambda: iter(['fresh', 'complete']))
+        assert list(second) == ['fresh', 'complete']
+    finally:
+        release.set()
+    assert coalescer.stats()['flights'] == 2
+
+
+def test_concurrent_requests_share_one_flight():
+    coalescer = StreamCoalescer()
+    started = threading.Event()
+    proceed = threading.Event()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        started.set()
+        proceed.wait(5)
+        yield 'x'
+        yield 'y'
+
+    first = coalescer.subscribe('key', factory)
+    assert started.wait(5)
+    second = coalescer.subscribe('key', factory)
+    proceed.set()
+    assert list(first) == ['x', 'y']
+    assert list(second) == ['x', 'y']
+    assert len(calls) == 1